@@ -0,0 +1,265 @@
+"""
+admision.py - Control de admisión y descarte de carga
+=====================================================
+
+Cuando un colegio entero pulsa "Jugar" a la vez, todas las peticiones se
+ponen a esperar detrás del cerrojo de escritura de SQLite. La cola crece
+sin límite y la latencia se dispara PARA TODOS, incluso para quien solo
+quería ver la lista de temas.
+
+Este módulo pone un "portero" delante de las rutas de Flask:
+
+  - Cada tipo de petición tiene un MÁXIMO de peticiones a la vez
+  - Si no hay hueco, la petición espera en una COLA LIMITADA
+  - Si la cola está llena, o se espera demasiado, se responde enseguida
+    503 con "Retry-After" (mejor un "vuelve en 1 segundo" rápido que un
+    "espera 30 segundos" que acaba igual)
+  - Las lecturas baratas tienen PRIORIDAD sobre las operaciones caras:
+    cuando se libera un hueco entra primero la petición de más prioridad,
+    y si la cola está llena una lectura puede desplazar a una partida nueva
+
+CLASES DE PETICIÓN (menor número = más prioridad):
+-------------------------------------------------
+    lectura    0   /, /api/temas, /api/estadisticas, GET /api/examenes/<id>
+    respuesta  1   /api/responder (partidas ya empezadas: no queremos cortarlas)
+                   /api/resultados/lote (partidas ya jugadas sin conexión)
+    partida    2   /api/jugar, /api/mazos, POST /api/examenes (elegir mazos)
+    historial  3   /api/estadisticas/historial (lee archivos comprimidos: lo más caro)
+                   /api/examenes/<id>/hojas (corrige miles de hojas de una vez)
+                   /api/analitica (la primera consulta carga todo el historial)
+
+Las rutas que no aparecen en RUTAS (diagnóstico, ficheros estáticos...)
+no pasan por el portero.
+
+Nota: el portero solo ve las peticiones que ya tiene el proceso. Con
+gunicorn, las conexiones que esperan un hilo libre no cuentan, así que
+conviene que --hilos sea mayor que los límites de aquí.
+
+CONFIGURACIÓN (variables de entorno):
+------------------------------------
+    QUIZ_ADMISION=0               Desactiva el portero
+    QUIZ_ADMISION_TOTAL=32        Peticiones a la vez en total
+    QUIZ_ADMISION_COLA=64         Peticiones esperando como máximo
+    QUIZ_ADMISION_ESPERA=2.0      Segundos máximos en la cola
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import itertools
+import os
+import threading
+
+from flask import g, jsonify, request
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+# clase -> (prioridad, máximo de peticiones a la vez)
+CLASES = {
+    'lectura': (0, 32),
+    'respuesta': (1, 16),
+    'partida': (2, 8),
+    'historial': (3, 2),
+}
+
+# endpoint de Flask (nombre de la función de la ruta) -> clase
+RUTAS = {
+    'index': 'lectura',
+    'obtener_temas': 'lectura',
+    'obtener_estadisticas': 'lectura',
+    'ver_examen': 'lectura',
+    'responder': 'respuesta',
+    'guardar_resultados': 'respuesta',
+    'iniciar_juego': 'partida',
+    'obtener_mazos': 'partida',
+    'crear_examen': 'partida',
+    'historial_estadisticas': 'historial',
+    'corregir_hojas': 'historial',
+    'analitica_partidas': 'historial',
+}
+
+REINTENTAR_EN = 1      # Segundos del Retry-After
+
+
+# =============================================================================
+# PORTERO
+# =============================================================================
+
+class _Espera:
+    """Una petición en la cola."""
+
+    __slots__ = ('prioridad', 'orden', 'clase', 'listo', 'admitida')
+
+    def __init__(self, prioridad, orden, clase):
+        self.prioridad = prioridad
+        self.orden = orden
+        self.clase = clase
+        self.listo = threading.Event()
+        self.admitida = False
+
+    def clave(self):
+        return (self.prioridad, self.orden)
+
+
+class ControlAdmision:
+    """
+    Limita las peticiones simultáneas por clase y en total, con una cola
+    de espera limitada y ordenada por prioridad.
+
+    Args:
+        clases (dict): clase -> (prioridad, límite)
+        max_total (int): Peticiones admitidas a la vez entre todas las clases
+        max_cola (int): Peticiones esperando como máximo
+        espera_max (float): Segundos máximos que una petición espera en la cola
+    """
+
+    def __init__(self, clases=CLASES, max_total=32, max_cola=64, espera_max=2.0):
+        self.clases = clases
+        self.max_total = max_total
+        self.max_cola = max_cola
+        self.espera_max = espera_max
+        self._cerrojo = threading.Lock()
+        self._orden = itertools.count()
+        self._cola = []                       # Lista de _Espera (pequeña)
+        self._activas = {clase: 0 for clase in clases}
+        self._total_activas = 0
+        self._contadores = {clase: {'admitidas': 0, 'encoladas': 0, 'rechazadas': 0,
+                                    'expiradas': 0, 'desplazadas': 0}
+                            for clase in clases}
+
+    # -------------------------------------------------------------------------
+    # Internos (siempre con el cerrojo cogido)
+    # -------------------------------------------------------------------------
+
+    def _hay_hueco(self, clase):
+        return (self._total_activas < self.max_total
+                and self._activas[clase] < self.clases[clase][1])
+
+    def _ocupar(self, clase):
+        self._activas[clase] += 1
+        self._total_activas += 1
+        self._contadores[clase]['admitidas'] += 1
+
+    def _despachar(self):
+        """Da los huecos libres a los que esperan, de más a menos prioridad."""
+        self._cola.sort(key=_Espera.clave)
+        for espera in list(self._cola):
+            if self._total_activas >= self.max_total:
+                break
+            if self._hay_hueco(espera.clase):
+                self._cola.remove(espera)
+                self._ocupar(espera.clase)
+                espera.admitida = True
+                espera.listo.set()
+
+    # -------------------------------------------------------------------------
+    # API
+    # -------------------------------------------------------------------------
+
+    def entrar(self, clase):
+        """
+        Pide paso para una petición de la clase indicada.
+
+        Returns:
+            bool: True si puede continuar (¡luego hay que llamar a salir()!),
+                  False si hay que rechazarla con 503
+        """
+        prioridad = self.clases[clase][0]
+        with self._cerrojo:
+            # Primero pasan los que ya esperaban y caben ahora. Los que siguen
+            # en la cola no caben (su clase o el total están llenos), así que
+            # no pueden usar el hueco de esta clase: si lo hay, entra directamente
+            self._despachar()
+            if self._hay_hueco(clase):
+                self._ocupar(clase)
+                return True
+
+            if len(self._cola) >= self.max_cola:
+                # Cola llena: solo entramos si desplazamos a alguien de menos prioridad
+                peor = max(self._cola, key=_Espera.clave)
+                if peor.prioridad <= prioridad:
+                    self._contadores[clase]['rechazadas'] += 1
+                    return False
+                self._cola.remove(peor)
+                self._contadores[peor.clase]['desplazadas'] += 1
+                peor.listo.set()       # Se despierta sin admitir: 503
+
+            espera = _Espera(prioridad, next(self._orden), clase)
+            self._cola.append(espera)
+            self._contadores[clase]['encoladas'] += 1
+
+        espera.listo.wait(self.espera_max)
+
+        with self._cerrojo:
+            if espera.admitida:
+                return True
+            if espera in self._cola:           # Se acabó el tiempo
+                self._cola.remove(espera)
+                self._contadores[clase]['expiradas'] += 1
+            return False
+
+    def salir(self, clase):
+        """Libera el hueco de una petición admitida."""
+        with self._cerrojo:
+            self._activas[clase] -= 1
+            self._total_activas -= 1
+            self._despachar()
+
+    def estado(self):
+        """Peticiones activas, en cola y contadores por clase."""
+        with self._cerrojo:
+            en_cola = {clase: 0 for clase in self.clases}
+            for espera in self._cola:
+                en_cola[espera.clase] += 1
+            return {
+                'total_activas': self._total_activas,
+                'max_total': self.max_total,
+                'max_cola': self.max_cola,
+                'clases': {
+                    clase: {
+                        'activas': self._activas[clase],
+                        'limite': self.clases[clase][1],
+                        'en_cola': en_cola[clase],
+                        **self._contadores[clase],
+                    }
+                    for clase in self.clases
+                },
+            }
+
+
+# =============================================================================
+# INTEGRACIÓN CON FLASK
+# =============================================================================
+
+def instalar(app, control):
+    """Pone el portero delante de las rutas de RUTAS."""
+
+    @app.before_request
+    def _admitir():
+        clase = RUTAS.get(request.endpoint)
+        if clase is None:
+            return None
+        if not control.entrar(clase):
+            respuesta = jsonify({'error': 'Servidor ocupado, vuelve a intentarlo en un momento'})
+            respuesta.status_code = 503
+            respuesta.headers['Retry-After'] = str(REINTENTAR_EN)
+            return respuesta
+        g._clase_admision = clase
+        return None
+
+    @app.teardown_request
+    def _liberar(_error=None):
+        clase = g.pop('_clase_admision', None)
+        if clase is not None:
+            control.salir(clase)
+
+
+def desde_entorno():
+    """Crea el ControlAdmision con la configuración de las variables de entorno."""
+    return ControlAdmision(
+        max_total=int(os.environ.get('QUIZ_ADMISION_TOTAL', 32)),
+        max_cola=int(os.environ.get('QUIZ_ADMISION_COLA', 64)),
+        espera_max=float(os.environ.get('QUIZ_ADMISION_ESPERA', 2.0)),
+    )
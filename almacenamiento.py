@@ -0,0 +1,879 @@
+"""
+almacenamiento.py - Dónde se guardan el catálogo y las partidas
+===============================================================
+
+Hasta ahora todo el código hablaba directamente con SQLite (get_db() y
+SQL con ?). SQLite es un único fichero con UN escritor a la vez: perfecto
+para un servidor, pero con varios servidores cada uno tendría su quiz.db
+y no se podrían repartir las escrituras.
+
+Este módulo separa QUÉ se guarda de DÓNDE se guarda. Las operaciones que
+hace el juego con la base de datos están aquí, con dos implementaciones:
+
+    AlmacenSQLite     quiz.db, como siempre (por defecto)
+    AlmacenPostgres   Un servidor PostgreSQL compartido por todos los nodos,
+                      con un pool de conexiones por proceso
+
+OPERACIONES:
+------------
+    Catálogo     temas(), ids_tema(tema), preguntas(ids), version_catalogo()
+    Partidas     guardar_partida(...), guardar_resultados(filas)
+    Estadísticas ultimas_partidas(n), partidas(desde, hasta, tema)
+    Exámenes     guardar_examen(...), leer_examen(id)
+    Jugadores    vistas(jugador, tema), olvidar_jugadores(antes_de)
+
+La semántica es la misma en las dos: el mazo aleatorio sin repetir de
+mazo.py (ids del tema + lectura por id), las 10 últimas partidas por
+fecha, y los resultados con cliente_id que no se duplican al reenviarlos.
+
+¿QUÉ SIGUE EN SQLITE?
+---------------------
+Lo que es de cada nodo o propio de SQLite: los histogramas de bocetos.py
+(ya están pensados para copiarse entre nodos con exportar/importar), el
+archivado y el vacío incremental de retencion.py, el espejo en memoria de
+espejo.py, y las herramientas (generador.py, plan_consultas.py...).
+
+CÓMO USARLO:
+------------
+    from almacenamiento import get_almacen
+    temas = get_almacen().temas()
+
+    # Con PostgreSQL (uv sync --extra postgres):
+    QUIZ_BD=postgresql://quiz@localhost/quiz QUIZ_BD_POOL=10 uv run python app.py
+
+    # Con QUIZ_CENTROS=1 get_almacen() devuelve el del centro de la
+    # petición (un AlmacenSQLite por centro, ver centros.py)
+
+    # Comprobar un PostgreSQL (en un esquema temporal que se borra al acabar)
+    uv run python almacenamiento.py postgresql://quiz@localhost/quiz
+
+Las consultas de los dos pasan por los observadores de database.py
+(trazas.py, presupuesto_sql.py): con PostgreSQL, a través de
+database.cursor_postgres().
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import contextvars
+import os
+import random
+import sys
+import tempfile
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+from database import (COLUMNAS_PREGUNTA, TABLAS_CATALOGO, Pregunta, avisar_conexion,
+                      cursor_postgres, get_db, init_db, tablas_vacias, version_catalogo)
+from espejo import get_db_lectura
+from preguntas import (CAMPOS_INSERCION, COLUMNAS_INSERCION, PREGUNTAS_POR_TEMA, TEMAS,
+                       cargar_todas_las_preguntas)
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+TAMANO_POOL = 10           # Conexiones a PostgreSQL por proceso como máximo
+TAMANO_BLOQUE = 500        # Ids por consulta IN (...) al buscar cliente_id
+
+ERROR_POSTGRES = 'PostgreSQL necesita psycopg y psycopg-pool: uv sync --extra postgres'
+
+# Columnas de un resultado para guardar_resultados(): fecha None = ahora
+#   (cliente_id, fecha, tema, correctas, total, porcentaje)
+
+# Columnas de una partida al leerlas (/api/estadisticas, historial). Sin
+# cliente_id: lleva el id del navegador o el alumno de un examen
+COLUMNAS_PARTIDA = 'id, fecha, tema, correctas, total, porcentaje'
+
+
+# =============================================================================
+# SQLITE (por defecto)
+# =============================================================================
+
+class AlmacenSQLite:
+    """
+    El quiz.db de siempre. Las lecturas del catálogo pasan por
+    get_db_lectura(), así que el espejo en memoria sigue funcionando.
+
+    Con `ruta` trabaja sobre otro fichero (sin espejo); lo usan
+    retencion.py y las herramientas con bases de datos sintéticas.
+    """
+
+    nombre = 'sqlite'
+    centro = None       # Nombre del centro (ver centros.py); None = catálogo principal
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+
+    def _conexion(self):
+        return get_db(self.ruta)
+
+    def _lectura(self):
+        return get_db_lectura() if self.ruta is None else get_db(self.ruta)
+
+    def _soltar(self, conn):
+        """Cada operación devuelve aquí su conexión (centros.py las reutiliza)."""
+        conn.close()
+
+    def cerrar(self):
+        pass            # Cada operación abre y cierra su conexión
+
+    def inicializar(self):
+        """Crea las tablas. Devuelve True si el catálogo está vacío."""
+        init_db(self.ruta)
+        return tablas_vacias(self.ruta)
+
+    def cargar_catalogo(self):
+        """Carga las preguntas de preguntas.py en esta base de datos."""
+        return cargar_todas_las_preguntas(self.ruta)
+
+    # -- Catálogo -------------------------------------------------------------
+
+    def version_catalogo(self):
+        if self.ruta is None:
+            return version_catalogo()
+        conn = self._conexion()
+        version = version_catalogo(conn)
+        self._soltar(conn)
+        return version
+
+    def temas(self):
+        conn = self._lectura()
+        temas = [dict(fila) for fila in conn.execute('SELECT * FROM temas')]
+        self._soltar(conn)
+        return temas
+
+    def ids_tema(self, tema):
+        conn = self._lectura()
+        if tema == 'todos':
+            cursor = conn.execute('SELECT id FROM preguntas ORDER BY id')
+        else:
+            cursor = conn.execute('''
+                SELECT p.id FROM preguntas p
+                JOIN temas t ON p.tema_id = t.id
+                WHERE t.nombre = ?
+                ORDER BY p.id
+            ''', (tema,))
+        # array('q'): los ids "en crudo" (8 bytes cada uno), ver mazo.py
+        ids = array('q', (fila[0] for fila in cursor))
+        self._soltar(conn)
+        return ids
+
+    def preguntas(self, ids):
+        """
+        Preguntas por id (database.Pregunta), en el orden de `ids` (las
+        que no existen se saltan).
+        """
+        if not ids:
+            return []
+        conn = self._lectura()
+        conn.row_factory = Pregunta.de_cursor   # Sin sqlite3.Row intermedio
+        marcadores = ', '.join('?' * len(ids))
+        filas = conn.execute(
+            f'SELECT {COLUMNAS_PREGUNTA} FROM preguntas WHERE id IN ({marcadores})', list(ids)
+        ).fetchall()
+        self._soltar(conn)
+        # IN (...) no respeta el orden: lo recuperamos
+        por_id = {fila.id: fila for fila in filas}
+        return [por_id[i] for i in ids if i in por_id]
+
+    # -- Partidas -------------------------------------------------------------
+
+    def guardar_partida(self, tema, correctas, total, porcentaje):
+        conn = self._conexion()
+        conn.execute('''
+            INSERT INTO estadisticas (tema, correctas, total, porcentaje)
+            VALUES (?, ?, ?, ?)
+        ''', (tema, correctas, total, porcentaje))
+        conn.commit()
+        self._soltar(conn)
+
+    def guardar_resultados(self, filas):
+        """
+        Guarda resultados con cliente_id en UNA transacción, sin duplicar.
+
+        Los cliente_id ya guardados se buscan por bloques en el índice único
+        y solo se insertan los nuevos (con un solo executemany).
+
+        Args:
+            filas (list): (cliente_id, fecha o None, tema, correctas, total, porcentaje)
+
+        Returns:
+            list: Las filas que eran nuevas
+        """
+        conn = self._conexion()
+        conn.isolation_level = None      # Las transacciones las abrimos nosotros
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            guardados = set()
+            ids = [fila[0] for fila in filas]
+            for inicio in range(0, len(ids), TAMANO_BLOQUE):
+                bloque = ids[inicio:inicio + TAMANO_BLOQUE]
+                marcadores = ', '.join('?' * len(bloque))
+                guardados.update(fila[0] for fila in conn.execute(
+                    f'SELECT cliente_id FROM estadisticas WHERE cliente_id IN ({marcadores})', bloque))
+            nuevas = []
+            for fila in filas:
+                if fila[0] not in guardados:
+                    guardados.add(fila[0])       # Repetida dentro del mismo lote
+                    nuevas.append(fila)
+            conn.executemany('''
+                INSERT INTO estadisticas (cliente_id, fecha, tema, correctas, total, porcentaje)
+                VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?)
+            ''', nuevas)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._soltar(conn)
+        return nuevas
+
+    # -- Estadísticas ---------------------------------------------------------
+
+    def ultimas_partidas(self, n=10):
+        conn = self._conexion()
+        filas = conn.execute(f'''
+            SELECT {COLUMNAS_PARTIDA} FROM estadisticas
+            ORDER BY fecha DESC
+            LIMIT ?
+        ''', (n,)).fetchall()
+        self._soltar(conn)
+        return [dict(fila) for fila in filas]
+
+    def partidas(self, desde=None, hasta=None, tema=None, limite=None):
+        """
+        Partidas de la tabla entre dos fechas (hasta NO incluida), por
+        (fecha, id). Con `limite`, solo las primeras: el índice de fechas (o
+        el de tema y fecha) ya da ese orden y SQLite para al llegar al límite.
+        """
+        condiciones, parametros = _condiciones(desde, hasta, tema, '?')
+        sql = f'SELECT {COLUMNAS_PARTIDA} FROM estadisticas'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+        sql += ' ORDER BY fecha, id'
+        if limite is not None:
+            sql += ' LIMIT ?'
+            parametros.append(limite)
+        conn = self._conexion()
+        filas = [dict(fila) for fila in conn.execute(sql, parametros)]
+        self._soltar(conn)
+        return filas
+
+    def partidas_por_id(self, despues_de, limite):
+        """
+        Partidas con id > despues_de, por orden de id, como tuplas
+        (id, fecha, tema, correctas, total, porcentaje). Las usa analitica.py
+        para cargar la tabla a trozos y luego solo lo nuevo.
+        """
+        conn = self._conexion()
+        conn.row_factory = None         # Tuplas: millones de sqlite3.Row sobran
+        filas = conn.execute('''
+            SELECT id, fecha, tema, correctas, total, porcentaje FROM estadisticas
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (despues_de, limite)).fetchall()
+        self._soltar(conn)
+        return filas
+
+    def fecha_minima(self):
+        """Fecha de la partida más antigua de la tabla (None si está vacía)."""
+        conn = self._conexion()
+        fecha = conn.execute('SELECT MIN(fecha) FROM estadisticas').fetchone()[0]
+        self._soltar(conn)
+        return fecha
+
+    # -- Exámenes -------------------------------------------------------------
+
+    def guardar_examen(self, nombre, tema, preguntas_json, clave):
+        conn = self._conexion()
+        with conn:
+            cursor = conn.execute('''
+                INSERT INTO examenes (nombre, tema, preguntas, clave)
+                VALUES (?, ?, ?, ?)
+            ''', (nombre, tema, preguntas_json, clave))
+        self._soltar(conn)
+        return cursor.lastrowid
+
+    def leer_examen(self, examen_id):
+        conn = self._conexion()
+        fila = conn.execute('SELECT * FROM examenes WHERE id = ?', (examen_id,)).fetchone()
+        self._soltar(conn)
+        return dict(fila) if fila else None
+
+    # -- Preguntas vistas (mazo.py) -------------------------------------------
+
+    @contextmanager
+    def vistas(self, jugador, tema):
+        """
+        Bitset de preguntas vistas de un jugador en un tema, en exclusiva.
+
+        Da un dict {'version', 'bits', 'vistas'} (vacío si no hay nada
+        guardado) que se puede modificar; al salir del `with` se guarda.
+        BEGIN IMMEDIATE impide que otro proceso lo lea y lo cambie a la vez.
+        """
+        conn = self._conexion()
+        conn.isolation_level = None      # Las transacciones las abrimos nosotros
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            fila = conn.execute('''
+                SELECT version, bits, vistas FROM vistas_jugador
+                WHERE jugador = ? AND tema = ?
+            ''', (jugador, tema)).fetchone()
+            registro = ({} if fila is None else
+                        {'version': fila[0], 'bits': bytearray(fila[1]), 'vistas': fila[2]})
+            yield registro
+            if registro:
+                conn.execute('''
+                    INSERT OR REPLACE INTO vistas_jugador (jugador, tema, version, bits, vistas, usado)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (jugador, tema, registro['version'], bytes(registro['bits']), registro['vistas']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._soltar(conn)
+
+    def olvidar_jugadores(self, antes_de):
+        """Borra los bitsets sin usar desde `antes_de` ('AAAA-MM-DD HH:MM:SS')."""
+        conn = self._conexion()
+        borrados = conn.execute('DELETE FROM vistas_jugador WHERE usado < ?', (antes_de,)).rowcount
+        conn.commit()
+        self._soltar(conn)
+        return borrados
+
+
+def _condiciones(desde, hasta, tema, marcador, fecha='fecha'):
+    """Filtros de partidas(): (['fecha >= ?', ...], [valores])"""
+    condiciones, parametros = [], []
+    if desde is not None:
+        condiciones.append(f'{fecha} >= {marcador}')
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append(f'{fecha} < {marcador}')
+        parametros.append(hasta)
+    if tema is not None:
+        condiciones.append(f'tema = {marcador}')
+        parametros.append(tema)
+    return condiciones, parametros
+
+
+# =============================================================================
+# POSTGRESQL
+# =============================================================================
+
+# Mismo esquema que init_db(), en el dialecto de PostgreSQL. Las fechas son
+# TIMESTAMP en UTC (como CURRENT_TIMESTAMP en SQLite) y se leen como texto
+# 'AAAA-MM-DD HH:MM:SS' para que el JSON sea idéntico con los dos motores.
+ESQUEMA_POSTGRES = '''
+    CREATE TABLE IF NOT EXISTS temas (
+        id SERIAL PRIMARY KEY,
+        nombre TEXT UNIQUE NOT NULL,
+        descripcion TEXT,
+        icono TEXT
+    );
+    CREATE TABLE IF NOT EXISTS preguntas (
+        id SERIAL PRIMARY KEY,
+        tema_id INTEGER NOT NULL REFERENCES temas(id),
+        pregunta TEXT NOT NULL,
+        opcion_a TEXT NOT NULL,
+        opcion_b TEXT NOT NULL,
+        opcion_c TEXT NOT NULL,
+        respuesta_correcta TEXT NOT NULL CHECK (respuesta_correcta IN ('a', 'b', 'c')),
+        explicacion TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_preguntas_tema ON preguntas(tema_id);
+    CREATE TABLE IF NOT EXISTS estadisticas (
+        id BIGSERIAL PRIMARY KEY,
+        fecha TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+        tema TEXT,
+        correctas INTEGER,
+        total INTEGER,
+        porcentaje DOUBLE PRECISION,
+        cliente_id TEXT UNIQUE
+    );
+    CREATE INDEX IF NOT EXISTS idx_estadisticas_fecha ON estadisticas(fecha);
+    CREATE INDEX IF NOT EXISTS idx_estadisticas_tema_fecha ON estadisticas(tema, fecha);
+    CREATE TABLE IF NOT EXISTS examenes (
+        id SERIAL PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        tema TEXT NOT NULL,
+        fecha TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+        preguntas TEXT NOT NULL,
+        clave TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS vistas_jugador (
+        jugador TEXT NOT NULL,
+        tema TEXT NOT NULL,
+        version BIGINT NOT NULL,
+        bits BYTEA NOT NULL,
+        vistas INTEGER NOT NULL,
+        usado TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+        PRIMARY KEY (jugador, tema)
+    );
+    CREATE INDEX IF NOT EXISTS idx_vistas_jugador_usado ON vistas_jugador(usado);
+    CREATE TABLE IF NOT EXISTS catalogo_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL
+    );
+    INSERT INTO catalogo_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING;
+    CREATE OR REPLACE FUNCTION subir_version_catalogo() RETURNS trigger AS $$
+    BEGIN
+        UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    CREATE OR REPLACE TRIGGER temas_version AFTER INSERT OR UPDATE OR DELETE ON temas
+        FOR EACH STATEMENT EXECUTE FUNCTION subir_version_catalogo();
+    CREATE OR REPLACE TRIGGER preguntas_version AFTER INSERT OR UPDATE OR DELETE ON preguntas
+        FOR EACH STATEMENT EXECUTE FUNCTION subir_version_catalogo();
+'''
+
+FECHA_TEXTO = "to_char(fecha, 'YYYY-MM-DD HH24:MI:SS') AS fecha"
+COLUMNAS_ESTADISTICAS = f'id, {FECHA_TEXTO}, tema, correctas, total, porcentaje'   # Como COLUMNAS_PARTIDA
+
+# Número cualquiera, igual en todos los nodos: solo uno crea el esquema a la vez
+CERROJO_ESQUEMA = 4_172_025
+
+
+class AlmacenPostgres:
+    """
+    Un servidor PostgreSQL compartido por todos los nodos.
+
+    Cada PROCESO tiene su propio pool de conexiones (psycopg_pool): con
+    gunicorn, el pool del proceso principal no sirve en los trabajadores
+    creados con fork(), así que cada uno abre el suyo la primera vez.
+    """
+
+    nombre = 'postgresql'
+    centro = None
+
+    def __init__(self, url, tamano_pool=TAMANO_POOL, esquema=None):
+        try:
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            raise RuntimeError(ERROR_POSTGRES) from None
+        self.url = url
+        self.tamano_pool = tamano_pool
+        self.esquema = esquema      # Otro esquema que 'public' (ver comprobar_aparte())
+        # Cursores que avisan a los observadores de database.py, como en SQLite
+        opciones = {'row_factory': dict_row, 'cursor_factory': cursor_postgres()}
+        if esquema is not None:
+            opciones['options'] = f'-c search_path={esquema}'
+        self._crear_pool = lambda: ConnectionPool(
+            url, min_size=1, max_size=tamano_pool, kwargs=opciones, open=True)
+        self._pool = None
+        self._pid = None
+        self._cerrojo = threading.Lock()
+
+    def _conexion(self):
+        """Conexión del pool de este proceso (with: COMMIT al salir, ROLLBACK si falla)."""
+        if self._pid != os.getpid():
+            with self._cerrojo:
+                if self._pid != os.getpid():
+                    self._pool = self._crear_pool()
+                    self._pid = os.getpid()
+        avisar_conexion()
+        return self._pool.connection()
+
+    def cerrar(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.close()
+            self._pool = self._pid = None
+
+    def inicializar(self):
+        with self._conexion() as conn:
+            conn.execute('SELECT pg_advisory_xact_lock(%s)', (CERROJO_ESQUEMA,))
+            if self.esquema is not None:
+                conn.execute(f'CREATE SCHEMA IF NOT EXISTS {self.esquema}')
+            conn.execute(ESQUEMA_POSTGRES)
+            fila = conn.execute('SELECT NOT EXISTS (SELECT 1 FROM preguntas) AS vacio').fetchone()
+        return fila['vacio']
+
+    def cargar_catalogo(self):
+        """Carga los temas y preguntas de preguntas.py (si no hay preguntas)."""
+        with self._conexion() as conn:
+            conn.execute('SELECT pg_advisory_xact_lock(%s)', (CERROJO_ESQUEMA,))
+            if conn.execute('SELECT 1 FROM preguntas LIMIT 1').fetchone():
+                return False
+            with conn.cursor() as cursor:
+                # executemany() ejecuta una sentencia por fila, y los triggers
+                # de versión van por sentencia: se desactivan en esta
+                # transacción y la versión sube una vez al final
+                for tabla in TABLAS_CATALOGO:
+                    cursor.execute(f'ALTER TABLE {tabla} DISABLE TRIGGER {tabla}_version')
+                cursor.executemany('''
+                    INSERT INTO temas (nombre, descripcion, icono) VALUES (%s, %s, %s)
+                    ON CONFLICT (nombre) DO NOTHING
+                ''', TEMAS)
+                ids = {fila['nombre']: fila['id']
+                       for fila in cursor.execute('SELECT id, nombre FROM temas')}
+                cursor.executemany(f'''
+                    INSERT INTO preguntas ({COLUMNAS_INSERCION})
+                    VALUES ({', '.join(['%s'] * len(CAMPOS_INSERCION))})
+                ''', [pregunta
+                      for nombre, generar in PREGUNTAS_POR_TEMA.items() if nombre in ids
+                      for pregunta in generar(ids[nombre])])
+                cursor.execute('UPDATE catalogo_version SET version = version + 1 WHERE id = 1')
+                for tabla in TABLAS_CATALOGO:
+                    cursor.execute(f'ALTER TABLE {tabla} ENABLE TRIGGER {tabla}_version')
+        return True
+
+    # -- Catálogo -------------------------------------------------------------
+
+    def version_catalogo(self):
+        with self._conexion() as conn:
+            fila = conn.execute('SELECT version FROM catalogo_version WHERE id = 1').fetchone()
+        return fila['version'] if fila else 0
+
+    def temas(self):
+        with self._conexion() as conn:
+            return conn.execute('SELECT * FROM temas ORDER BY id').fetchall()
+
+    def ids_tema(self, tema):
+        with self._conexion() as conn:
+            if tema == 'todos':
+                filas = conn.execute('SELECT id FROM preguntas ORDER BY id').fetchall()
+            else:
+                filas = conn.execute('''
+                    SELECT p.id FROM preguntas p
+                    JOIN temas t ON p.tema_id = t.id
+                    WHERE t.nombre = %s
+                    ORDER BY p.id
+                ''', (tema,)).fetchall()
+        return array('q', (fila['id'] for fila in filas))
+
+    def preguntas(self, ids):
+        if not ids:
+            return []
+        from psycopg.rows import args_row
+        with self._conexion() as conn:
+            filas = conn.cursor(row_factory=args_row(Pregunta)).execute(
+                f'SELECT {COLUMNAS_PREGUNTA} FROM preguntas WHERE id = ANY(%s)', (list(ids),)
+            ).fetchall()
+        por_id = {fila.id: fila for fila in filas}
+        return [por_id[i] for i in ids if i in por_id]
+
+    # -- Partidas -------------------------------------------------------------
+
+    def guardar_partida(self, tema, correctas, total, porcentaje):
+        with self._conexion() as conn:
+            conn.execute('''
+                INSERT INTO estadisticas (tema, correctas, total, porcentaje)
+                VALUES (%s, %s, %s, %s)
+            ''', (tema, correctas, total, porcentaje))
+
+    def guardar_resultados(self, filas):
+        """
+        Igual que en SQLite, en una sola sentencia: unnest() convierte las
+        columnas en filas y ON CONFLICT se salta los cliente_id ya guardados.
+        """
+        if not filas:
+            return []
+        columnas = list(zip(*filas))
+        with self._conexion() as conn:
+            nuevos = {fila['cliente_id'] for fila in conn.execute('''
+                INSERT INTO estadisticas (cliente_id, fecha, tema, correctas, total, porcentaje)
+                SELECT c, COALESCE(f, now() AT TIME ZONE 'utc'), t, n, k, p
+                FROM unnest(%s::text[], %s::timestamp[], %s::text[], %s::int[],
+                            %s::int[], %s::float8[]) AS lote(c, f, t, n, k, p)
+                ON CONFLICT (cliente_id) DO NOTHING
+                RETURNING cliente_id
+            ''', [list(columna) for columna in columnas])}
+        nuevas = []
+        for fila in filas:
+            if fila[0] in nuevos:
+                nuevos.discard(fila[0])          # Repetida dentro del mismo lote
+                nuevas.append(fila)
+        return nuevas
+
+    # -- Estadísticas ---------------------------------------------------------
+
+    def ultimas_partidas(self, n=10):
+        with self._conexion() as conn:
+            return conn.execute(f'''
+                SELECT {COLUMNAS_ESTADISTICAS} FROM estadisticas
+                ORDER BY estadisticas.fecha DESC
+                LIMIT %s
+            ''', (n,)).fetchall()
+
+    def partidas(self, desde=None, hasta=None, tema=None, limite=None):
+        # estadisticas.fecha: la columna, no el texto de la lista de columnas
+        condiciones, parametros = _condiciones(desde, hasta, tema, '%s', 'estadisticas.fecha')
+        sql = f'SELECT {COLUMNAS_ESTADISTICAS} FROM estadisticas'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+        sql += ' ORDER BY estadisticas.fecha, id'
+        if limite is not None:
+            sql += ' LIMIT %s'
+            parametros.append(limite)
+        with self._conexion() as conn:
+            return conn.execute(sql, parametros).fetchall()
+
+    def partidas_por_id(self, despues_de, limite):
+        from psycopg.rows import tuple_row
+        with self._conexion() as conn:
+            return conn.cursor(row_factory=tuple_row).execute(f'''
+                SELECT id, {FECHA_TEXTO}, tema, correctas, total, porcentaje FROM estadisticas
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            ''', (despues_de, limite)).fetchall()
+
+    def fecha_minima(self):
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT to_char(MIN(fecha), 'YYYY-MM-DD HH24:MI:SS') AS fecha FROM estadisticas"
+            ).fetchone()
+        return fila['fecha']
+
+    # -- Exámenes -------------------------------------------------------------
+
+    def guardar_examen(self, nombre, tema, preguntas_json, clave):
+        with self._conexion() as conn:
+            fila = conn.execute('''
+                INSERT INTO examenes (nombre, tema, preguntas, clave)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            ''', (nombre, tema, preguntas_json, clave)).fetchone()
+        return fila['id']
+
+    def leer_examen(self, examen_id):
+        with self._conexion() as conn:
+            return conn.execute(f'''
+                SELECT id, nombre, tema, {FECHA_TEXTO}, preguntas, clave
+                FROM examenes WHERE id = %s
+            ''', (examen_id,)).fetchone()
+
+
+    # -- Preguntas vistas (mazo.py) -------------------------------------------
+
+    @contextmanager
+    def vistas(self, jugador, tema):
+        # FOR UPDATE bloquea la fila hasta el final de la transacción. La
+        # primera vez no hay fila que bloquear: si dos partidas del mismo
+        # jugador empiezan a la vez, la última en guardar gana (como mucho
+        # se repite alguna pregunta)
+        with self._conexion() as conn:
+            fila = conn.execute('''
+                SELECT version, bits, vistas FROM vistas_jugador
+                WHERE jugador = %s AND tema = %s
+                FOR UPDATE
+            ''', (jugador, tema)).fetchone()
+            registro = ({} if fila is None else
+                        {'version': fila['version'], 'bits': bytearray(fila['bits']),
+                         'vistas': fila['vistas']})
+            yield registro
+            if registro:
+                conn.execute('''
+                    INSERT INTO vistas_jugador (jugador, tema, version, bits, vistas, usado)
+                    VALUES (%s, %s, %s, %s, %s, now() AT TIME ZONE 'utc')
+                    ON CONFLICT (jugador, tema) DO UPDATE
+                    SET version = EXCLUDED.version, bits = EXCLUDED.bits,
+                        vistas = EXCLUDED.vistas, usado = EXCLUDED.usado
+                ''', (jugador, tema, registro['version'], bytes(registro['bits']),
+                      registro['vistas']))
+
+    def olvidar_jugadores(self, antes_de):
+        with self._conexion() as conn:
+            return conn.execute('DELETE FROM vistas_jugador WHERE usado < %s',
+                                (antes_de,)).rowcount
+
+
+# =============================================================================
+# ALMACÉN EN USO
+# =============================================================================
+
+_almacen = None
+
+# Almacén de la petición en curso cuando no es el principal: lo pone
+# centros.py para las peticiones de un centro. Es una ContextVar y no una
+# variable global porque cada hilo (o tarea de asyncio) atiende su petición.
+_almacen_peticion = contextvars.ContextVar('almacen_peticion', default=None)
+
+
+def configurar(url=None, tamano_pool=TAMANO_POOL):
+    """
+    Elige el almacén: None o 'sqlite' -> quiz.db; 'postgresql://...' -> PostgreSQL.
+
+    Returns:
+        El almacén elegido (también lo devuelve get_almacen() a partir de ahora)
+    """
+    global _almacen
+    if _almacen is not None:
+        _almacen.cerrar()
+    if url and url.startswith(('postgresql://', 'postgres://')):
+        _almacen = AlmacenPostgres(url, tamano_pool)
+    elif url in (None, '', 'sqlite'):
+        _almacen = AlmacenSQLite()
+    else:
+        raise ValueError(f'Almacén desconocido: {url!r} (sqlite o postgresql://...)')
+    return _almacen
+
+
+def desde_entorno():
+    """Configura el almacén con QUIZ_BD y QUIZ_BD_POOL."""
+    return configurar(os.environ.get('QUIZ_BD'),
+                      int(os.environ.get('QUIZ_BD_POOL', TAMANO_POOL)))
+
+
+def get_almacen():
+    """
+    El almacén en uso: el del centro de la petición, si lo hay, o el
+    principal (SQLite si nadie ha llamado a configurar()).
+    """
+    return _almacen_peticion.get() or almacen_principal()
+
+
+def almacen_principal():
+    """El almacén principal, aunque la petición sea de un centro."""
+    global _almacen
+    if _almacen is None:
+        _almacen = AlmacenSQLite()
+    return _almacen
+
+
+def usar_en_peticion(almacen):
+    """
+    Hace que get_almacen() devuelva `almacen` en este hilo o tarea.
+
+    Returns:
+        El testigo para devolverlo con dejar_peticion()
+    """
+    return _almacen_peticion.set(almacen)
+
+
+def dejar_peticion(testigo):
+    _almacen_peticion.reset(testigo)
+
+
+def con_centro(clave):
+    """
+    Clave de una caché compartida por todos los centros (histogramas,
+    lecturas agrupadas...): 'centro/clave', o la clave tal cual si la
+    petición es del catálogo principal.
+    """
+    centro = get_almacen().centro
+    return clave if centro is None else f'{centro}/{clave}'
+
+
+# =============================================================================
+# COMPROBACIÓN CONTRA UN SERVIDOR DE VERDAD
+# =============================================================================
+
+def comprobar(almacen):
+    """
+    Ejecuta las operaciones del juego contra un almacén y comprueba que
+    se comportan como con SQLite. ¡Escribe partidas y exámenes de prueba
+    en ese almacén! Para no tocar los datos de verdad, comprobar_aparte().
+
+    Returns:
+        list: Descripción de los fallos (vacía si todo va bien)
+    """
+    fallos = []
+    if almacen.inicializar():
+        almacen.cargar_catalogo()
+
+    temas = almacen.temas()
+    if not temas:
+        return ['temas() está vacío después de cargar el catálogo']
+    tema = temas[0]['nombre']
+
+    # Catálogo: ids ordenados, lectura por id en el orden pedido
+    ids = list(almacen.ids_tema(tema))
+    if not ids or ids != sorted(ids):
+        fallos.append(f'ids_tema({tema!r}) no devuelve ids ordenados')
+    if len(almacen.ids_tema('todos')) < len(ids):
+        fallos.append("ids_tema('todos') tiene menos preguntas que un tema")
+    elegidos = random.sample(ids, min(10, len(ids)))
+    if [fila.id for fila in almacen.preguntas(elegidos)] != elegidos:
+        fallos.append('preguntas(ids) no respeta el orden de los ids')
+    if almacen.ids_tema('Tema que no existe'):
+        fallos.append('ids_tema() de un tema inexistente no está vacío')
+
+    # Partidas: la última guardada aparece la primera
+    almacen.guardar_partida(tema, 7, 10, 70.0)
+    ultimas = almacen.ultimas_partidas(10)
+    if not ultimas or (ultimas[0]['tema'], ultimas[0]['correctas']) != (tema, 7):
+        fallos.append('ultimas_partidas() no empieza por la partida recién guardada')
+    if len(ultimas) > 10 or [p['fecha'] for p in ultimas] != sorted((p['fecha'] for p in ultimas), reverse=True):
+        fallos.append('ultimas_partidas(10) no son 10 como mucho y de la más reciente a la más antigua')
+
+    # Carga incremental por id (analitica.py): la partida recién guardada
+    # es la última y su fecha tiene el mismo formato que en partidas()
+    recien = ultimas[0] if ultimas else None
+    if recien is not None:
+        if almacen.partidas_por_id(recien['id'] - 1, 10) != [
+                (recien['id'], recien['fecha'], tema, 7, 10, 70.0)]:
+            fallos.append('partidas_por_id() no devuelve la partida recién guardada como tupla')
+        if not almacen.fecha_minima() <= recien['fecha']:
+            fallos.append('fecha_minima() es posterior a una partida guardada')
+
+    # Resultados con cliente_id: reenviar no duplica
+    prefijo = f'comprobacion:{uuid.uuid4().hex[:8]}:'
+    filas = [(prefijo + 'a', '2025-01-01 10:00:00', tema, 5, 10, 50.0),
+             (prefijo + 'b', None, tema, 6, 10, 60.0),
+             (prefijo + 'a', '2025-01-01 10:00:00', tema, 5, 10, 50.0)]
+    if len(almacen.guardar_resultados(filas)) != 2:
+        fallos.append('guardar_resultados() no guarda una vez cada cliente_id')
+    if almacen.guardar_resultados(filas):
+        fallos.append('guardar_resultados() duplica al reenviar')
+    encontradas = almacen.partidas('2025-01-01', '2025-01-02', tema)
+    if not any((p['fecha'], p['correctas']) == ('2025-01-01 10:00:00', 5) for p in encontradas):
+        fallos.append("partidas(desde, hasta, tema) no encuentra la partida con su fecha 'AAAA-MM-DD HH:MM:SS'")
+    if any('cliente_id' in p for p in encontradas + ultimas):
+        fallos.append('partidas() o ultimas_partidas() devuelven cliente_id (son públicas)')
+
+    # Exámenes
+    examen_id = almacen.guardar_examen('comprobación', tema, '[1, 2]', 'ab')
+    examen = almacen.leer_examen(examen_id)
+    if examen is None or examen['clave'] != 'ab':
+        fallos.append('leer_examen() no devuelve el examen guardado')
+    if almacen.leer_examen(-1) is not None:
+        fallos.append('leer_examen() de un examen inexistente no es None')
+    return fallos
+
+
+def comprobar_aparte(url=None):
+    """
+    comprobar() sin tocar los datos de verdad: con SQLite, en un fichero
+    temporal; con PostgreSQL, en un esquema temporal de esa base de datos
+    que se borra al acabar (hace falta permiso para crear esquemas).
+
+    Returns:
+        tuple: (nombre del almacén, lista de fallos)
+    """
+    if not url or url == 'sqlite':
+        with tempfile.TemporaryDirectory() as temporal:
+            almacen = AlmacenSQLite(Path(temporal) / 'comprobacion.db')
+            return almacen.nombre, comprobar(almacen)
+
+    esquema = f'quiz_comprobacion_{uuid.uuid4().hex[:8]}'
+    almacen = AlmacenPostgres(url, tamano_pool=2, esquema=esquema)
+    try:
+        return almacen.nombre, comprobar(almacen)
+    finally:
+        with almacen._conexion() as conn:
+            conn.execute(f'DROP SCHEMA IF EXISTS {esquema} CASCADE')
+        almacen.cerrar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Comprueba un almacén en un fichero o esquema temporal.')
+    parser.add_argument('url', nargs='?', default=None,
+                        help='postgresql://usuario@localhost/quiz (por defecto SQLite)')
+    args = parser.parse_args()
+
+    nombre, fallos = comprobar_aparte(args.url)
+    for fallo in fallos:
+        print(f'❌ {fallo}')
+    print(f'✅ {nombre}: todo correcto' if not fallos else f'{len(fallos)} fallos')
+    sys.exit(1 if fallos else 0)
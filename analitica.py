@@ -0,0 +1,511 @@
+"""
+analitica.py - Consultas de análisis sobre el historial de partidas
+===================================================================
+
+Preguntas como "media de aciertos por tema y semana del último año" se
+respondían leyendo `estadisticas` fila a fila: un sqlite3.Row (o un dict)
+por partida, y luego bucles de Python para agrupar. Con millones de
+partidas eso son segundos por consulta.
+
+Este módulo guarda el historial en memoria POR COLUMNAS: un array de numpy
+por campo, en vez de un objeto por fila.
+
+    Por filas (lo de siempre):          Por columnas (aquí):
+    {'fecha': ..., 'tema': 'NumPy',     fecha       [t0, t1, t2, ...]  int64
+     'correctas': 7, ...}               tema        [ 0,  1,  0, ...]  int32 (código)
+    {'fecha': ..., 'tema': 'Pandas',    correctas   [ 7,  5,  9, ...]  int32
+     'correctas': 5, ...}               total       [10, 10, 10, ...]  int32
+    ...                                 porcentaje  [70, 50, 90, ...]  float32
+
+Así una consulta son unas pocas operaciones sobre arrays enteros (filtrar
+con una máscara, numerar y sumar por grupo con np.bincount, ordenar una
+vez para los percentiles), que numpy hace en C.
+Cada partida ocupa 32 bytes: un millón de partidas son unos 32 MB.
+
+Los temas se guardan como códigos (0, 1, 2...): comparar enteros es mucho
+más barato que comparar textos, y ocupan menos.
+
+¿CÓMO SE MANTIENE AL DÍA?
+-------------------------
+- La primera consulta carga la tabla a trozos de TAMANO_CARGA partidas,
+  por orden de id (almacen.partidas_por_id)
+- Después, como mucho cada INTERVALO_ACTUALIZACION segundos, se piden
+  solo las partidas con id mayor que el último cargado y se AÑADEN al
+  final. Los arrays tienen hueco de sobra (crecen al doble cuando se
+  llenan), así que añadir no copia lo que ya había.
+- retencion.py borra de la tabla las partidas antiguas: si la partida más
+  antigua de la tabla (almacen.fecha_minima) es más reciente que las
+  nuestras, se descartan también aquí. El análisis cubre lo que hay en la
+  tabla (DIAS_RETENCION, un año por defecto), no el archivo comprimido.
+- Con PostgreSQL un id puede confirmarse DESPUÉS que otro mayor (dos
+  transacciones a la vez). Por eso se vuelven a pedir los últimos
+  SOLAPE_IDS ids y se descartan los que ya estaban cargados.
+
+Las consultas no esperan a la actualización: si otro hilo está
+actualizando, se responde con lo que ya hay (solo la primera carga hace
+esperar). Cada proceso trabajador tiene su propia copia.
+
+CÓMO USARLO:
+------------
+    GET /api/analitica?agrupar=tema,semana&desde=2024-10-01&percentiles=50,90
+
+    # Desde la terminal, contra quiz.db o una base de datos sintética
+    uv run python analitica.py --agrupar tema,mes --percentiles 50,90
+    uv run python analitica.py --db bench_datos/plan_200000_200000.db --agrupar semana
+
+Necesita numpy (uv sync --extra analitica).
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+from pathlib import Path
+
+import memoria
+from almacenamiento import AlmacenSQLite, almacen_principal
+from database import init_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+INTERVALO_ACTUALIZACION = 2.0   # Segundos entre comprobaciones de partidas nuevas
+TAMANO_CARGA = 100_000          # Partidas por consulta al cargar
+SOLAPE_IDS = 1_000              # Ids que se vuelven a pedir (ver PostgreSQL arriba)
+CAPACIDAD_INICIAL = 1_024
+MAX_GRUPOS = 10_000             # Más grupos no caben en una respuesta razonable
+MAX_CLAVES_DIRECTAS = 1 << 22   # Hasta aquí los grupos se cuentan sin ordenar (ver _numerar)
+
+AGRUPACIONES = ('tema', 'dia', 'semana', 'mes')
+
+# Nombre -> tipo de cada columna
+COLUMNAS = {
+    'id': 'int64',
+    'fecha': 'int64',           # Segundos desde 1970-01-01 (UTC)
+    'tema': 'int32',            # Código del tema (posición en la lista de temas)
+    'correctas': 'int32',
+    'total': 'int32',
+    'porcentaje': 'float32',
+}
+
+ERROR_NUMPY = 'La analítica necesita numpy: uv sync --extra analitica'
+
+SEGUNDOS_DIA = 86_400
+
+
+# =============================================================================
+# CACHÉ POR COLUMNAS
+# =============================================================================
+
+class CacheAnalitica:
+    """
+    Copia por columnas de la tabla estadisticas que se actualiza sola.
+
+    Args:
+        almacen: Almacén del que se lee (None = el principal en cada
+            actualización, aunque la petición sea de un centro)
+    """
+
+    def __init__(self, almacen=None):
+        self.almacen = almacen
+        self._cerrojo = threading.Lock()
+        # (columnas, n, nombres de los temas): se sustituye entero, así que
+        # quien lo lee ve siempre un estado coherente sin cerrojo. Las
+        # partidas nuevas se escriben DETRÁS de la posición n que ya se
+        # publicó, y al crecer o recortar se crean arrays nuevos.
+        self._estado = (None, 0, ())
+        self._codigos = {}              # nombre del tema -> código
+        self._ultimo_id = 0
+        self._ultima_comprobacion = 0.0
+
+    # -- Actualización --------------------------------------------------------
+
+    def actualizar(self, forzar=False):
+        """
+        Añade las partidas nuevas y descarta las que ya no están en la tabla.
+
+        Si ya se comprobó hace menos de INTERVALO_ACTUALIZACION segundos, no
+        hace nada. Si otro hilo está actualizando, no espera (salvo que
+        todavía no se haya cargado nada o se pida forzar).
+        """
+        if not forzar and time.monotonic() - self._ultima_comprobacion < INTERVALO_ACTUALIZACION:
+            return
+        esperar = forzar or self._estado[0] is None
+        if not self._cerrojo.acquire(blocking=esperar):
+            return
+        try:
+            if not forzar and time.monotonic() - self._ultima_comprobacion < INTERVALO_ACTUALIZACION:
+                return          # Otro hilo acaba de actualizar mientras esperábamos
+            almacen = self.almacen or almacen_principal()
+            self._cargar_nuevas(almacen)
+            self._recortar(almacen.fecha_minima())
+            self._ultima_comprobacion = time.monotonic()
+        finally:
+            self._cerrojo.release()
+
+    def _cargar_nuevas(self, almacen):
+        despues_de = max(0, self._ultimo_id - SOLAPE_IDS)
+        while True:
+            filas = almacen.partidas_por_id(despues_de, TAMANO_CARGA)
+            if filas:
+                self._anadir(filas)
+                despues_de = filas[-1][0]
+            if len(filas) < TAMANO_CARGA:
+                break
+        if self._estado[0] is None:
+            self._publicar(self._reservar(None, 0, 0), 0)
+
+    def _codigo(self, tema):
+        codigo = self._codigos.get(tema)
+        if codigo is None:
+            codigo = self._codigos[tema] = len(self._codigos)
+        return codigo
+
+    def _reservar(self, columnas, n, extra):
+        """Columnas con sitio para `extra` partidas más (al doble si no caben)."""
+        import numpy as np
+
+        if columnas is not None and n + extra <= len(columnas['id']):
+            return columnas
+        capacidad = max(CAPACIDAD_INICIAL, 2 * (n + extra))
+        nuevas = {nombre: np.empty(capacidad, dtype=tipo) for nombre, tipo in COLUMNAS.items()}
+        if columnas is not None:
+            for nombre, array in columnas.items():
+                nuevas[nombre][:n] = array[:n]
+        return nuevas
+
+    def _publicar(self, columnas, n):
+        nombres = [None] * len(self._codigos)
+        for tema, codigo in self._codigos.items():
+            nombres[codigo] = tema
+        self._estado = (columnas, n, tuple(nombres))
+
+    def _anadir(self, filas):
+        """Añade un trozo de filas (id, fecha, tema, correctas, total, porcentaje)."""
+        import numpy as np
+
+        columnas, n, _ = self._estado
+        ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+
+        # Solape: fuera las que ya estaban cargadas
+        if n and ids[0] <= self._ultimo_id:
+            cargados = columnas['id'][:n]
+            nuevas = ~np.isin(ids, cargados[cargados >= ids[0]])
+            filas = [fila for fila, nueva in zip(filas, nuevas) if nueva]
+            ids = ids[nuevas]
+            if not filas:
+                return
+
+        m = len(filas)
+        columnas = self._reservar(columnas, n, m)
+        fin = n + m
+        columnas['id'][n:fin] = ids
+        # 'AAAA-MM-DD HH:MM:SS' -> datetime64 -> segundos
+        columnas['fecha'][n:fin] = np.array([fila[1] for fila in filas],
+                                            dtype='datetime64[s]').astype(np.int64)
+        columnas['tema'][n:fin] = [self._codigo(fila[2]) for fila in filas]
+        columnas['correctas'][n:fin] = [fila[3] for fila in filas]
+        columnas['total'][n:fin] = [fila[4] for fila in filas]
+        columnas['porcentaje'][n:fin] = np.array([fila[5] for fila in filas], dtype=np.float64)
+
+        self._ultimo_id = max(self._ultimo_id, int(ids.max()))
+        self._publicar(columnas, fin)
+
+    def _recortar(self, fecha_minima):
+        """Descarta las partidas anteriores a la más antigua de la tabla."""
+        import numpy as np
+
+        columnas, n, _ = self._estado
+        if not n:
+            return
+        if fecha_minima is None:                      # La tabla se ha vaciado
+            self._publicar(self._reservar(None, 0, 0), 0)
+            return
+        quedan = columnas['fecha'][:n] >= np.datetime64(fecha_minima, 's').astype(np.int64)
+        if quedan.all():
+            return
+        recortadas = {nombre: array[:n][quedan] for nombre, array in columnas.items()}
+        self._publicar(recortadas, int(quedan.sum()))
+
+    # -- Información ----------------------------------------------------------
+
+    def __len__(self):
+        return self._estado[1]
+
+    def bytes(self):
+        """Memoria de los arrays (incluido el hueco para crecer)."""
+        columnas = self._estado[0]
+        return sum(array.nbytes for array in columnas.values()) if columnas else 0
+
+    # -- Consultas ------------------------------------------------------------
+
+    def consultar(self, agrupar=(), desde=None, hasta=None, temas=None, percentiles=()):
+        """
+        Agrupa las partidas y calcula sus métricas.
+
+        Args:
+            agrupar (list): Campos de AGRUPACIONES, p. ej. ['tema', 'semana']
+                (vacío = todas las partidas en un solo grupo)
+            desde (str): Fecha inicial incluida (AAAA-MM-DD)
+            hasta (str): Fecha final NO incluida (AAAA-MM-DD)
+            temas (list): Solo estos temas (None = todos)
+            percentiles (list): Percentiles del porcentaje de aciertos (0-100)
+
+        Returns:
+            dict: {'partidas': n, 'grupos': [{'tema': ..., 'semana': ...,
+                   'partidas', 'media', 'correctas', 'preguntas', 'p50'...}]}
+
+        Raises:
+            ValueError: Si una agrupación o un percentil no son válidos, o
+                salen más de MAX_GRUPOS grupos
+        """
+        import numpy as np
+
+        for campo in agrupar:
+            if campo not in AGRUPACIONES:
+                raise ValueError(f"No se puede agrupar por {campo!r}: usa {', '.join(AGRUPACIONES)}")
+        if len(set(agrupar)) != len(agrupar):
+            raise ValueError('Cada agrupación solo puede aparecer una vez')
+        for q in percentiles:
+            if not 0 <= q <= 100:
+                raise ValueError('Los percentiles van de 0 a 100')
+
+        self.actualizar()
+        columnas, n, nombres = self._estado
+
+        # 1. Filtrar: una máscara booleana con todas las condiciones
+        # (sin condiciones no se copia nada: se usan las columnas tal cual)
+        fecha = columnas['fecha'][:n]
+        tema = columnas['tema'][:n]
+        mascara = None
+        if desde is not None:
+            mascara = fecha >= np.datetime64(desde, 's').astype(np.int64)
+        if hasta is not None:
+            mascara = _y(mascara, fecha < np.datetime64(hasta, 's').astype(np.int64))
+        if temas is not None:
+            codigos = [self._codigos[nombre] for nombre in temas if nombre in self._codigos]
+            mascara = _y(mascara, np.isin(tema, codigos))
+
+        # Las posiciones que cumplen se calculan una vez: take() con ellas es
+        # varias veces más rápido que indexar cada columna con la máscara
+        indices = None if mascara is None else np.flatnonzero(mascara)
+
+        def columna(nombre):
+            array = columnas[nombre][:n]
+            return array if indices is None else array.take(indices)
+
+        fecha, tema, porcentaje = columna('fecha'), columna('tema'), columna('porcentaje')
+        m = len(fecha)
+        if not m:
+            return {'partidas': 0, 'grupos': []}
+
+        # 2. Numerar los grupos: cada agrupación es una clave entera y se
+        # combinan en una sola (clave = clave1 * tamaño2 + clave2 ...)
+        rangos = []                     # (campo, mínimo, tamaño) de cada clave
+        combinada = np.zeros(m, dtype=np.int64)
+        for campo in agrupar:
+            clave = _clave(campo, fecha, tema)
+            minimo = int(clave.min())
+            tamano = int(clave.max()) - minimo + 1
+            combinada *= tamano
+            combinada += clave
+            combinada -= minimo
+            rangos.append((campo, minimo, tamano))
+        unicas, grupo, cuentas = _numerar(combinada, math.prod(t for _, _, t in rangos))
+        g = len(cuentas)
+        if g > MAX_GRUPOS:
+            raise ValueError(f'Salen {g} grupos (máximo {MAX_GRUPOS}): filtra más o agrupa por semana o mes')
+
+        # 3. Sumas por grupo en una pasada
+        media = np.bincount(grupo, weights=porcentaje, minlength=g) / cuentas
+        correctas = np.bincount(grupo, weights=columna('correctas'), minlength=g)
+        preguntas = np.bincount(grupo, weights=columna('total'), minlength=g)
+
+        # 4. Percentiles: se ordena UNA vez por (grupo, porcentaje) y cada
+        # grupo queda en un tramo seguido; el percentil q de un tramo está
+        # en inicio + q/100 * (tamaño - 1), interpolando entre vecinos
+        # (lo mismo que np.percentile, pero para todos los grupos a la vez).
+        # Para ordenar por los dos a la vez con un solo np.sort, se suma
+        # grupo * ancho al porcentaje (ancho > rango de porcentajes): así los
+        # tramos no se mezclan, y basta restarlo en las posiciones leídas.
+        valores_percentil = {}
+        if percentiles:
+            base = float(porcentaje.min())
+            ancho = math.floor(float(porcentaje.max()) - base) + 1
+            ordenados = grupo.astype(np.float64)
+            ordenados *= ancho
+            ordenados += porcentaje
+            ordenados.sort()
+            desplazamiento = np.arange(g) * ancho
+            inicios = np.concatenate(([0], np.cumsum(cuentas)[:-1]))
+            for q in percentiles:
+                posicion = inicios + (cuentas - 1) * (q / 100)
+                bajo = np.floor(posicion).astype(np.int64)
+                alto = np.minimum(bajo + 1, inicios + cuentas - 1)
+                peso = posicion - bajo
+                valores_percentil[q] = (ordenados[bajo] * (1 - peso) + ordenados[alto] * peso
+                                        - desplazamiento)
+
+        # 5. Etiquetas: se deshace la clave combinada de cada grupo
+        etiquetas = {}
+        for campo, minimo, tamano in reversed(rangos):
+            unicas, clave = np.divmod(unicas, tamano)
+            etiquetas[campo] = _etiquetas(campo, clave + minimo, nombres)
+        grupos = []
+        for i in range(g):
+            fila = {campo: etiquetas[campo][i] for campo in agrupar}
+            fila.update(partidas=int(cuentas[i]), media=round(float(media[i]), 2),
+                        correctas=int(correctas[i]), preguntas=int(preguntas[i]))
+            for q, valores in valores_percentil.items():
+                fila[f'p{q:g}'] = round(float(valores[i]), 2)
+            grupos.append(fila)
+        return {'partidas': m, 'grupos': grupos}
+
+
+def _y(mascara, condicion):
+    return condicion if mascara is None else mascara & condicion
+
+
+def _numerar(combinada, posibles):
+    """
+    Numera los grupos 0, 1, 2... por orden de clave.
+
+    Returns:
+        tuple: (clave de cada grupo, grupo de cada partida, partidas por grupo)
+    """
+    import numpy as np
+
+    if posibles <= MAX_CLAVES_DIRECTAS:
+        # Pocas claves posibles: se cuentan directamente (sin ordenar)
+        cuentas = np.bincount(combinada, minlength=posibles)
+        unicas = np.flatnonzero(cuentas)
+        numero = np.zeros(posibles, dtype=np.int64)
+        numero[unicas] = np.arange(len(unicas))
+        return unicas, numero[combinada], cuentas[unicas]
+    return np.unique(combinada, return_inverse=True, return_counts=True)
+
+
+def _clave(campo, fecha, tema):
+    """Clave entera de cada partida para una agrupación."""
+    import numpy as np
+
+    if campo == 'tema':
+        return tema.astype(np.int64)
+    dia = fecha // SEGUNDOS_DIA
+    if campo == 'dia':
+        return dia
+    if campo == 'semana':
+        # El 1970-01-01 fue jueves: +3 hace que las semanas empiecen en lunes
+        return (dia + 3) // 7
+    # Mes: convertir millones de fechas a datetime64[M] es lento; se
+    # convierten solo los días distintos del rango y se busca cada partida
+    primero = int(dia.min())
+    meses = np.arange(primero, int(dia.max()) + 1).astype('datetime64[D]').astype('datetime64[M]')
+    return meses.astype(np.int64)[dia - primero]
+
+
+def _etiquetas(campo, claves, nombres):
+    """Texto de cada clave: nombre del tema, 'AAAA-MM-DD' (lunes de la semana) o 'AAAA-MM'."""
+    import numpy as np
+
+    if campo == 'tema':
+        return [nombres[codigo] for codigo in claves]
+    if campo == 'semana':
+        claves = claves * 7 - 3
+    unidad = 'M' if campo == 'mes' else 'D'
+    return np.datetime_as_string(claves.astype(f'datetime64[{unidad}]')).tolist()
+
+
+# =============================================================================
+# API PÚBLICA
+# =============================================================================
+
+# Caché del catálogo principal, compartida por todo el proceso
+cache = CacheAnalitica()
+memoria.registrar('analitica', 'analitica.cache', cache.bytes)
+
+
+def cache_de(almacen):
+    """
+    La caché de un almacén: la principal, o la del centro (ver centros.py),
+    que se crea la primera vez que se consulta y se va con el centro.
+    """
+    if almacen.centro is None:
+        return cache
+    if almacen.analitica is None:
+        almacen.analitica = CacheAnalitica(almacen)
+    return almacen.analitica
+
+
+def precargar():
+    """
+    Carga el historial antes de fork() (ver servidor.py) para que los
+    trabajadores lo hereden y solo tengan que añadir lo nuevo. Sin numpy
+    no hace nada: la analítica es un extra opcional.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return
+    cache.actualizar(forzar=True)
+
+
+def consulta(agrupar=(), desde=None, hasta=None, temas=None, percentiles=(), cache=cache):
+    """
+    Consulta para la ruta /api/analitica (argumentos como en consultar();
+    `cache` es la del centro de la petición, ver cache_de()).
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP). El cuerpo incluye lo que tardó
+               la consulta ('ms') y cuántas partidas hay en memoria.
+    """
+    try:
+        import numpy  # noqa: F401  (solo comprobamos que está instalado)
+    except ImportError:
+        return {'error': ERROR_NUMPY}, 501
+
+    inicio = time.perf_counter()
+    try:
+        cuerpo = cache.consultar(agrupar, desde, hasta, temas, percentiles)
+    except ValueError as error:
+        return {'error': str(error)}, 400
+    cuerpo['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    cuerpo['en_memoria'] = len(cache)
+    return cuerpo, 200
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consultas de análisis sobre las partidas.')
+    parser.add_argument('--db', type=Path, default=None, help='Base de datos SQLite (por defecto quiz.db)')
+    parser.add_argument('--agrupar', default='tema', help=f"Separados por comas: {', '.join(AGRUPACIONES)}")
+    parser.add_argument('--desde', default=None, help='AAAA-MM-DD (incluida)')
+    parser.add_argument('--hasta', default=None, help='AAAA-MM-DD (no incluida)')
+    parser.add_argument('--tema', action='append', default=None)
+    parser.add_argument('--percentiles', default='50,90')
+    args = parser.parse_args()
+
+    init_db(args.db)                    # Por si la base de datos aún no existe
+    if args.db is not None:
+        cache.almacen = AlmacenSQLite(args.db)
+    agrupar = [campo for campo in args.agrupar.split(',') if campo]
+    percentiles = [float(q) for q in args.percentiles.split(',') if q]
+
+    inicio = time.perf_counter()
+    cache.actualizar(forzar=True)
+    print(f'📥 {len(cache)} partidas cargadas en {time.perf_counter() - inicio:.2f} s '
+          f'({cache.bytes() / 2**20:.1f} MB)', file=sys.stderr)
+
+    cuerpo, codigo = consulta(agrupar, args.desde, args.hasta, args.tema, percentiles)
+    json.dump(cuerpo, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    sys.exit(0 if codigo == 200 else 1)
@@ -63,11 +63,30 @@ Autor: Profesor de SAA
 Fecha: 2025
 """
 
+import os
+import random
+from datetime import date
+
 from flask import Flask, render_template, request, jsonify, session
 
 # Importamos funciones de nuestros módulos
-from database import get_db, init_db, tablas_vacias
-from preguntas import cargar_todas_las_preguntas, mostrar_estadisticas
+import admision
+import almacenamiento
+import analitica
+import captura
+import centros
+import examen
+import juego
+import memoria
+import presupuesto_sql
+import retencion
+import trazas
+from almacenamiento import con_centro, get_almacen
+from database import init_db
+from espejo import activar_espejo
+from servidor import comando_servir, instalar_drenaje
+from vuelo_unico import VueloUnico
+from preguntas import mostrar_estadisticas
 
 # =============================================================================
 # CONFIGURACIÓN DE FLASK
@@ -82,6 +101,100 @@ app = Flask(__name__)
 # Esta clave se usa para firmar las cookies de sesión
 app.secret_key = 'quiz_game_secret_key_2025'
 
+# Dónde se guardan el catálogo y las partidas (ver almacenamiento.py)
+# SQLite (quiz.db) por defecto; PostgreSQL compartido entre nodos con:
+#   QUIZ_BD=postgresql://quiz@localhost/quiz   QUIZ_BD_POOL=10
+almacenamiento.desde_entorno()
+
+# Espejo en memoria del catálogo (ver espejo.py)
+# Se activa con la variable de entorno QUIZ_ESPEJO=1:
+#   QUIZ_ESPEJO=1 uv run python app.py
+app.config['ESPEJO_LECTURA'] = os.environ.get('QUIZ_ESPEJO') == '1'
+
+# Lecturas agrupadas (ver vuelo_unico.py)
+# QUIZ_SWR_SEGUNDOS > 0 sirve resultados de hasta esos segundos de antigüedad
+# mientras se refrescan en segundo plano. Por defecto 0: solo se agrupan las
+# lecturas que coinciden en el tiempo.
+#   QUIZ_SWR_FRESCO=1                      -> segundos en que un resultado se sirve
+#                                             sin refrescarlo (con QUIZ_SWR_SEGUNDOS)
+# Guardar una partida invalida las últimas partidas (ver partidas_guardadas())
+_ventana_swr = float(os.environ.get('QUIZ_SWR_SEGUNDOS', 0))
+lecturas = VueloUnico(
+    fresco=float(os.environ.get('QUIZ_SWR_FRESCO', 1.0)) if _ventana_swr > 0 else 0.0,
+    ventana_obsoleta=_ventana_swr,
+)
+memoria.registrar('respuestas', 'app.lecturas', lambda: memoria.tamano(lecturas.guardados()))
+
+# Trazas de peticiones muestreadas (ver trazas.py)
+#   QUIZ_TRAZAS=trazas.ndjson              -> archivo donde se escriben
+#   QUIZ_TRAZAS_MUESTREO=0.01              -> fracción de peticiones escritas
+#   QUIZ_TRAZAS_UMBRAL_MS=500              -> las más lentas se escriben siempre
+if os.environ.get('QUIZ_TRAZAS'):
+    trazas.instalar(
+        app,
+        os.environ['QUIZ_TRAZAS'],
+        muestreo=float(os.environ.get('QUIZ_TRAZAS_MUESTREO', trazas.MUESTREO_POR_DEFECTO)),
+        umbral_ms=float(os.environ.get('QUIZ_TRAZAS_UMBRAL_MS', trazas.UMBRAL_MS_POR_DEFECTO)),
+    )
+
+# Presupuesto de SQL por petición y detector de N+1 (ver presupuesto_sql.py)
+#   QUIZ_PRESUPUESTO=1                     -> activarlo
+#   QUIZ_PRESUPUESTO_MUESTREO=0.01         -> fracción de peticiones observadas
+if os.environ.get('QUIZ_PRESUPUESTO') == '1':
+    presupuesto_sql.instalar(
+        app,
+        muestreo=float(os.environ.get('QUIZ_PRESUPUESTO_MUESTREO', presupuesto_sql.MUESTREO_POR_DEFECTO)),
+        consultas=int(os.environ.get('QUIZ_PRESUPUESTO_CONSULTAS', presupuesto_sql.MAX_CONSULTAS)),
+        conexiones=int(os.environ.get('QUIZ_PRESUPUESTO_CONEXIONES', presupuesto_sql.MAX_CONEXIONES)),
+        repeticiones=int(os.environ.get('QUIZ_PRESUPUESTO_REPETICIONES', presupuesto_sql.MAX_REPETICIONES)),
+    )
+
+# Captura de tráfico real para reproducirlo después (ver captura.py)
+#   QUIZ_CAPTURA=captura.ndjson            -> archivo donde se escribe
+#   QUIZ_CAPTURA_MUESTREO=0.1              -> fracción de jugadores capturados
+#   QUIZ_REPRODUCCION=1                    -> aceptar X-Quiz-Semilla en /api/jugar
+#                                             (solo en servidores de pruebas)
+if os.environ.get('QUIZ_CAPTURA'):
+    captura.instalar(
+        app,
+        os.environ['QUIZ_CAPTURA'],
+        muestreo=float(os.environ.get('QUIZ_CAPTURA_MUESTREO', captura.MUESTREO_POR_DEFECTO)),
+    )
+app.config['SEMILLAS_REPRODUCCION'] = os.environ.get('QUIZ_REPRODUCCION') == '1'
+
+# Contabilidad de memoria e instantáneas de tracemalloc (ver memoria.py)
+#   QUIZ_MEMORIA=1                         -> activar tracemalloc y /api/diagnostico/memoria
+#   QUIZ_MEMORIA_MARCOS=10                 -> marcos de pila apuntados por reserva
+app.config['DIAGNOSTICO_MEMORIA'] = os.environ.get('QUIZ_MEMORIA') == '1'
+if app.config['DIAGNOSTICO_MEMORIA']:
+    memoria.activar(int(os.environ.get('QUIZ_MEMORIA_MARCOS', memoria.MARCOS_POR_DEFECTO)))
+
+# Máximo de partidas que devuelve /api/estadisticas/historial
+MAX_HISTORIAL = 10_000
+
+# Servidor de producción (ver servidor.py):
+#   uv run flask --app app servir --workers 4 --hilos 8
+app.cli.add_command(comando_servir)
+instalar_drenaje(app)
+
+# Control de admisión (ver admision.py): límites de peticiones simultáneas
+# por tipo de ruta, cola limitada y 503 rápido cuando hay sobrecarga.
+# Se desactiva con QUIZ_ADMISION=0
+admision_control = admision.desde_entorno()
+if os.environ.get('QUIZ_ADMISION', '1') != '0':
+    admision.instalar(app, admision_control)
+
+# Catálogos por centro (ver centros.py): cada centro su fichero SQLite,
+# elegido por la cabecera X-Quiz-Centro o por el subdominio
+#   QUIZ_CENTROS=1                         -> activarlo
+#   QUIZ_DOMINIO=quiz.example.com          -> <centro>.quiz.example.com
+#   QUIZ_CENTROS_MAX=256                   -> centros abiertos a la vez (LRU)
+#   QUIZ_CENTROS_INACTIVIDAD=300           -> segundos sin uso antes de cerrarlo
+centros_abiertos = None
+if os.environ.get('QUIZ_CENTROS') == '1':
+    centros_abiertos = centros.desde_entorno()
+    centros.instalar(app, centros_abiertos, os.environ.get('QUIZ_DOMINIO'))
+
 
 # =============================================================================
 # INICIALIZACIÓN
@@ -95,6 +208,8 @@ def inicializar_app():
     ----------
     1. Crea las tablas en la base de datos (si no existen)
     2. Si las tablas están vacías, carga las preguntas iniciales
+    3. Si está configurado, crea el espejo en memoria del catálogo
+       (solo con SQLite: copia las tablas de quiz.db)
     
     ¿Cuándo se ejecuta?
     -------------------
@@ -104,17 +219,72 @@ def inicializar_app():
     Nota: Con debug=True, Flask reinicia el servidor cuando detecta
     cambios en el código. Por eso verás este mensaje dos veces al inicio.
     """
-    # Paso 1: Asegurar que las tablas existen
-    init_db()
+    almacen = get_almacen()
+    
+    # Paso 1: Asegurar que las tablas existen. quiz.db se crea siempre:
+    # aunque las partidas vayan a PostgreSQL, los histogramas de bocetos.py
+    # son de cada nodo
+    if almacen.nombre != 'sqlite':
+        init_db()
+    catalogo_vacio = almacen.inicializar()
     
     # Paso 2: Si no hay datos, cargarlos
-    if tablas_vacias():
+    if catalogo_vacio:
         print("📝 Cargando preguntas iniciales...")
-        cargar_todas_las_preguntas()
-        print("✅ Base de datos inicializada con preguntas")
-        mostrar_estadisticas()
+        almacen.cargar_catalogo()
+        print(f"✅ Base de datos inicializada con preguntas ({almacen.nombre})")
+        if almacen.nombre == 'sqlite':
+            mostrar_estadisticas()
     else:
-        print("✅ Base de datos ya inicializada")
+        print(f"✅ Base de datos ya inicializada ({almacen.nombre})")
+    
+    # Paso 3: Espejo en memoria para las lecturas del catálogo
+    if app.config['ESPEJO_LECTURA']:
+        if almacen.nombre == 'sqlite':
+            activar_espejo()
+            print("✅ Catálogo copiado a memoria (espejo de lectura)")
+        else:
+            print("⚠️  QUIZ_ESPEJO solo funciona con SQLite: se ignora")
+
+
+# =============================================================================
+# LECTURAS COMPARTIDAS
+# =============================================================================
+# Consultas que muchas peticiones hacen a la vez con el mismo resultado.
+# Las rutas las llaman a través de lectura_compartida(clave, funcion), así
+# que las peticiones simultáneas comparten una sola consulta.
+# Devuelven diccionarios (no sqlite3.Row) porque el resultado se comparte
+# entre hilos y se usa después de cerrar la conexión.
+
+def leer_temas(almacen):
+    """Devuelve la lista de temas como diccionarios."""
+    # Solo lectura del catálogo: con SQLite vale el espejo en memoria
+    return almacen.temas()
+
+
+def leer_ultimas_partidas(almacen):
+    """Devuelve las 10 partidas más recientes como diccionarios."""
+    return almacen.ultimas_partidas(10)
+
+
+def lectura_compartida(clave, funcion):
+    """
+    lecturas.ejecutar() con el almacén de la petición.
+
+    La clave lleva el centro (cada uno tiene sus temas y sus partidas) y
+    el almacén se pasa ya elegido: con QUIZ_SWR_SEGUNDOS la función puede
+    acabar ejecutándose en otro hilo, que no sabe de qué centro es.
+    """
+    almacen = get_almacen()
+    return lecturas.ejecutar(con_centro(clave), lambda: funcion(almacen))
+
+
+def partidas_guardadas():
+    """
+    Avisa de que se han guardado partidas en el centro de la petición:
+    /api/estadisticas deja de servir las últimas partidas guardadas.
+    """
+    lecturas.invalidar(con_centro('estadisticas'))
 
 
 # =============================================================================
@@ -133,9 +303,8 @@ def index():
     
     ¿Qué hace?
     ----------
-    1. Conecta a la base de datos
-    2. Obtiene la lista de temas disponibles
-    3. Renderiza el template HTML pasándole los temas
+    1. Obtiene la lista de temas disponibles (lectura agrupada)
+    2. Renderiza el template HTML pasándole los temas
     
     render_template():
     -----------------
@@ -146,16 +315,8 @@ def index():
     Returns:
         str: HTML de la página principal
     """
-    # Conectar a la base de datos
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Obtener todos los temas
-    cursor.execute('SELECT * FROM temas')
-    temas = cursor.fetchall()  # Lista de todos los temas
-    
-    # Cerrar conexión (buena práctica)
-    conn.close()
+    # Obtener todos los temas (una sola consulta para peticiones simultáneas)
+    temas = lectura_compartida('temas', leer_temas)
     
     # Renderizar el template con los datos
     return render_template('index.html', temas=temas)
@@ -194,14 +355,8 @@ def obtener_temas():
     Returns:
         Response: JSON con la lista de temas
     """
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM temas')
-    
-    # Convertir cada fila a diccionario para que jsonify funcione
-    temas = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
+    # leer_temas() ya convierte cada fila a diccionario
+    temas = lectura_compartida('temas', leer_temas)
     
     # jsonify() convierte el diccionario a JSON y establece headers correctos
     return jsonify(temas)
@@ -231,10 +386,11 @@ def iniciar_juego():
     Guardamos las preguntas y el progreso del usuario aquí.
     Cada usuario tiene su propia sesión (no se mezclan).
     
-    ORDER BY RANDOM() LIMIT 10:
-    --------------------------
-    Selecciona 10 preguntas aleatorias del tema elegido.
-    Así cada partida es diferente.
+    Selección del mazo (ver mazo.py):
+    --------------------------------
+    Selecciona 10 preguntas aleatorias del tema elegido, evitando las
+    que este jugador ya vio en partidas anteriores del mismo tema.
+    El jugador se identifica con session['jugador'].
     
     Ejemplo de respuesta:
         {
@@ -251,47 +407,12 @@ def iniciar_juego():
     datos = request.json
     tema = datos.get('tema', 'todos')  # Si no se especifica, juega con todos
     
-    conn = get_db()
-    cursor = conn.cursor()
+    # Al reproducir una captura, el mazo sale de la semilla de la petición
+    rng = captura.generador(request.headers) if app.config['SEMILLAS_REPRODUCCION'] else random
     
-    # Seleccionar 10 preguntas aleatorias
-    if tema == 'todos':
-        # De todos los temas
-        cursor.execute('SELECT * FROM preguntas ORDER BY RANDOM() LIMIT 10')
-    else:
-        # Solo del tema especificado (usamos JOIN para filtrar por nombre)
-        cursor.execute('''
-            SELECT p.* FROM preguntas p
-            JOIN temas t ON p.tema_id = t.id
-            WHERE t.nombre = ?
-            ORDER BY RANDOM() LIMIT 10
-        ''', (tema,))
-    
-    preguntas = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    # Guardar estado del juego en la sesión del usuario
-    session['preguntas'] = preguntas       # Lista de preguntas de esta partida
-    session['tema'] = tema                  # Tema elegido
-    session['pregunta_actual'] = 0          # Índice de la pregunta actual
-    session['correctas'] = 0                # Contador de aciertos
-    
-    # Si hay preguntas, devolver la primera
-    if preguntas:
-        pregunta = preguntas[0]
-        return jsonify({
-            'pregunta_num': 1,                    # Número de pregunta (1 de 10)
-            'total': len(preguntas),              # Total de preguntas
-            'pregunta': pregunta['pregunta'],     # Texto de la pregunta
-            'opciones': {                         # Las 3 opciones
-                'a': pregunta['opcion_a'],
-                'b': pregunta['opcion_b'],
-                'c': pregunta['opcion_c']
-            }
-        })
-    else:
-        # No hay preguntas para ese tema
-        return jsonify({'error': 'No hay preguntas disponibles'}), 404
+    # La lógica de la partida está en juego.py (la comparte el modo ASGI)
+    cuerpo, codigo = juego.nueva_partida(session, tema, rng=rng)
+    return jsonify(cuerpo), codigo
 
 
 @app.route('/api/responder', methods=['POST'])
@@ -355,71 +476,11 @@ def responder():
     datos = request.json
     respuesta_usuario = datos.get('respuesta')
     
-    # Recuperar el estado del juego de la sesión
-    preguntas = session.get('preguntas', [])
-    idx = session.get('pregunta_actual', 0)  # Índice de la pregunta actual
-    
-    # Validación: ¿hay pregunta para responder?
-    if idx >= len(preguntas):
-        return jsonify({'error': 'No hay más preguntas'}), 400
-    
-    # Obtener la pregunta actual y verificar la respuesta
-    pregunta_actual = preguntas[idx]
-    es_correcta = respuesta_usuario == pregunta_actual['respuesta_correcta']
-    
-    # Si es correcta, incrementar contador
-    if es_correcta:
-        session['correctas'] = session.get('correctas', 0) + 1
-    
-    # Avanzar a la siguiente pregunta
-    session['pregunta_actual'] = idx + 1
-    
-    # Preparar respuesta base
-    resultado = {
-        'correcta': es_correcta,                           # ¿Acertó?
-        'respuesta_correcta': pregunta_actual['respuesta_correcta'],  # Cuál era
-        'explicacion': pregunta_actual['explicacion'],     # Por qué
-        'correctas_acumuladas': session['correctas']       # Aciertos totales
-    }
-    
-    # ¿Hay más preguntas?
-    if idx + 1 < len(preguntas):
-        # Sí hay más: incluir la siguiente pregunta
-        siguiente = preguntas[idx + 1]
-        resultado['siguiente'] = {
-            'pregunta_num': idx + 2,
-            'total': len(preguntas),
-            'pregunta': siguiente['pregunta'],
-            'opciones': {
-                'a': siguiente['opcion_a'],
-                'b': siguiente['opcion_b'],
-                'c': siguiente['opcion_c']
-            }
-        }
-    else:
-        # Era la última pregunta: fin del juego
-        total = len(preguntas)
-        correctas = session['correctas']
-        porcentaje = (correctas / total) * 100 if total > 0 else 0
-        
-        # Guardar en la tabla de estadísticas para historial
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO estadisticas (tema, correctas, total, porcentaje)
-            VALUES (?, ?, ?, ?)
-        ''', (session.get('tema', 'todos'), correctas, total, porcentaje))
-        conn.commit()
-        conn.close()
-        
-        # Incluir resumen final
-        resultado['fin'] = {
-            'correctas': correctas,
-            'total': total,
-            'porcentaje': porcentaje
-        }
-    
-    return jsonify(resultado)
+    # Corregir, avanzar y (si era la última) guardar estadísticas: juego.py
+    cuerpo, codigo = juego.responder(session, respuesta_usuario)
+    if 'fin' in cuerpo:
+        partidas_guardadas()
+    return jsonify(cuerpo), codigo
 
 
 @app.route('/api/estadisticas')
@@ -451,19 +512,292 @@ def obtener_estadisticas():
     Returns:
         Response: JSON con las últimas 10 partidas
     """
-    conn = get_db()
-    cursor = conn.cursor()
+    stats = lectura_compartida('estadisticas', leer_ultimas_partidas)
     
-    cursor.execute('''
-        SELECT * FROM estadisticas 
-        ORDER BY fecha DESC 
-        LIMIT 10
-    ''')
+    return jsonify(stats)
+
+
+@app.route('/api/estadisticas/historial')
+def historial_estadisticas():
+    """
+    API: Partidas entre dos fechas, incluidas las ya archivadas.
     
-    stats = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    URL: GET /api/estadisticas/historial?desde=2025-01-01&hasta=2025-02-01&tema=NumPy
     
-    return jsonify(stats)
+    Las partidas antiguas ya no están en la tabla estadisticas: se han movido
+    a ficheros comprimidos (ver retencion.py). Esta ruta lee de los dos sitios.
+    
+    Parámetros (todos opcionales):
+        desde   Fecha inicial incluida (AAAA-MM-DD)
+        hasta   Fecha final NO incluida (AAAA-MM-DD)
+        tema    Solo ese tema
+        limite  Máximo de partidas (por defecto y como mucho 10000)
+    
+    Returns:
+        Response: JSON con las partidas, de la más antigua a la más reciente
+    """
+    fechas = {}
+    for campo in ('desde', 'hasta'):
+        valor = request.args.get(campo)
+        if valor is not None:
+            try:
+                fechas[campo] = date.fromisoformat(valor).isoformat()
+            except ValueError:
+                return jsonify({'error': f'{campo} debe tener el formato AAAA-MM-DD'}), 400
+    limite = max(0, min(request.args.get('limite', MAX_HISTORIAL, type=int), MAX_HISTORIAL))
+    
+    partidas = retencion.historial(tema=request.args.get('tema'), limite=limite, **fechas)
+    return jsonify(partidas)
+
+
+@app.route('/api/analitica')
+def analitica_partidas():
+    """
+    API: Métricas de las partidas agrupadas por tema y/o periodo (ver analitica.py).
+    
+    URL: GET /api/analitica?agrupar=tema,semana&desde=2025-01-01&percentiles=50,90
+    
+    Las cuentas se hacen en memoria sobre arrays de numpy (uno por columna),
+    no recorriendo la tabla estadisticas fila a fila.
+    
+    Parámetros (todos opcionales):
+        agrupar      tema, dia, semana y/o mes, separados por comas
+        desde        Fecha inicial incluida (AAAA-MM-DD)
+        hasta        Fecha final NO incluida (AAAA-MM-DD)
+        tema         Solo ese tema (se puede repetir: ?tema=NumPy&tema=Pandas)
+        percentiles  Percentiles del porcentaje de aciertos (p. ej. 50,90)
+    
+    Ejemplo de respuesta:
+        {"partidas": 1520, "ms": 3.1, "en_memoria": 1520, "grupos": [
+         {"tema": "NumPy", "semana": "2025-03-10", "partidas": 87, "media": 64.4,
+          "correctas": 560, "preguntas": 870, "p50": 70.0, "p90": 90.0}, ...]}
+    """
+    fechas = {}
+    for campo in ('desde', 'hasta'):
+        valor = request.args.get(campo)
+        if valor is not None:
+            try:
+                fechas[campo] = date.fromisoformat(valor).isoformat()
+            except ValueError:
+                return jsonify({'error': f'{campo} debe tener el formato AAAA-MM-DD'}), 400
+    try:
+        percentiles = [float(q) for q in request.args.get('percentiles', '').split(',') if q]
+    except ValueError:
+        return jsonify({'error': 'percentiles debe ser una lista de números (50,90)'}), 400
+    agrupar = [campo for campo in request.args.get('agrupar', '').split(',') if campo]
+    
+    cuerpo, codigo = analitica.consulta(agrupar, temas=request.args.getlist('tema') or None,
+                                        percentiles=percentiles,
+                                        cache=analitica.cache_de(get_almacen()), **fechas)
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/sw.js')
+def service_worker():
+    """
+    Service worker del modo sin conexión (static/sw.js).
+    
+    Se sirve desde la raíz (y no desde /static/) porque un service worker
+    solo controla las páginas que están bajo su propia URL.
+    """
+    respuesta = app.send_static_file('sw.js')
+    respuesta.headers['Cache-Control'] = 'no-cache'   # Que el navegador vea las versiones nuevas
+    return respuesta
+
+
+@app.route('/api/mazos', methods=['POST'])
+def obtener_mazos():
+    """
+    API: Descarga varios mazos para jugar sin conexión.
+    
+    URL: POST /api/mazos
+    Body: {"tema": "NumPy", "cantidad": 3}
+    
+    A diferencia de /api/jugar, cada pregunta incluye la respuesta correcta
+    y la explicación: el navegador corrige solo (ver juego.py).
+    
+    Ejemplo de respuesta:
+        {"tema": "NumPy", "mazos": [[{"id": 7, "pregunta": "...",
+         "opciones": {...}, "respuesta_correcta": "b", "explicacion": "..."}, ...]]}
+    """
+    datos = request.json
+    cantidad = datos.get('cantidad', 3)
+    if isinstance(cantidad, bool) or not isinstance(cantidad, int):
+        return jsonify({'error': 'cantidad debe ser un número'}), 400
+    
+    cuerpo, codigo = juego.mazos_sin_conexion(session, datos.get('tema', 'todos'), cantidad)
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/api/resultados/lote', methods=['POST'])
+def guardar_resultados():
+    """
+    API: Recibe las partidas jugadas sin conexión.
+    
+    URL: POST /api/resultados/lote
+    Body: {"resultados": [{"id": "3f2a...", "tema": "NumPy", "correctas": 7,
+                           "total": 10, "fecha": "2025-12-03T10:30:00Z",
+                           "preguntas": [7, 12, ...]}, ...]}
+    
+    Las preguntas del mazo se marcan entonces como vistas por el jugador.
+    Se puede reenviar el mismo lote sin duplicar partidas (ver juego.guardar_lote).
+    
+    Ejemplo de respuesta:
+        {"aceptados": ["3f2a..."], "nuevos": 1, "rechazados": []}
+    """
+    datos = request.json
+    cuerpo, codigo = juego.guardar_lote(datos.get('resultados'), session.get('jugador'))
+    if cuerpo.get('nuevos'):
+        partidas_guardadas()
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/api/examenes', methods=['POST'])
+def crear_examen():
+    """
+    API: Crea un examen con un mazo fijo de preguntas (ver examen.py).
+    
+    URL: POST /api/examenes
+    Body: {"nombre": "Parcial 1", "tema": "NumPy", "preguntas": 20}
+          o {"nombre": "Parcial 1", "tema": "NumPy", "ids": [4, 8, 15]}
+    
+    Returns:
+        Response: JSON con el examen (preguntas sin la clave), como GET
+    """
+    datos = request.json
+    cuerpo, codigo = examen.crear_examen(
+        datos.get('nombre'), datos.get('tema', 'todos'),
+        datos.get('preguntas', examen.PREGUNTAS_POR_PARTIDA), datos.get('ids'))
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/api/examenes/<int:examen_id>')
+def ver_examen(examen_id):
+    """
+    API: Preguntas de un examen, para imprimirlo (sin las respuestas).
+    
+    URL: GET /api/examenes/7
+    
+    Ejemplo de respuesta:
+        {"id": 7, "nombre": "Parcial 1", "tema": "NumPy", "fecha": "...",
+         "preguntas": [{"numero": 1, "id": 15, "pregunta": "...", "opciones": {...}}, ...]}
+    """
+    cuerpo, codigo = examen.ver_examen(examen_id)
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/api/examenes/<int:examen_id>/hojas', methods=['POST'])
+def corregir_hojas(examen_id):
+    """
+    API: Corrige de una vez un fichero de hojas de respuestas.
+    
+    URL: POST /api/examenes/7/hojas
+    Body: el fichero tal cual (Content-Type: text/csv o application/x-ndjson)
+          o un formulario multipart con el fichero en el campo 'hojas'
+    
+    Ejemplo de respuesta:
+        {"examen": 7, "hojas": 250, "nuevas": 250, "rechazadas": [],
+         "media": 6.4, "kr20": 0.71,
+         "notas": [{"alumno": "ana", "correctas": 8, "total": 10}, ...],
+         "items": [{"numero": 1, "correcta": "b", "acierto": 0.82,
+                    "discriminacion": 0.35, "opciones": {"a": 20, "b": 205, "c": 21},
+                    "sin_responder": 4}, ...]}
+    """
+    fichero = request.files.get('hojas')
+    if fichero is not None:
+        texto = fichero.read().decode('utf-8-sig', errors='replace')
+        nombre = (fichero.filename or '').lower()
+        formato = 'csv' if nombre.endswith('.csv') or fichero.mimetype == 'text/csv' else 'ndjson'
+    else:
+        texto = request.get_data(as_text=True)
+        formato = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    
+    cuerpo, codigo = examen.corregir_hojas(examen_id, texto, formato)
+    if cuerpo.get('nuevas'):
+        partidas_guardadas()
+    return jsonify(cuerpo), codigo
+
+
+@app.route('/api/diagnostico/lecturas')
+def diagnostico_lecturas():
+    """
+    API: Contadores de las lecturas agrupadas (ver vuelo_unico.py).
+    
+    URL: GET /api/diagnostico/lecturas
+    
+    Ejemplo de respuesta:
+        {"llamadas": 300, "consultas": 4, "agrupadas": 296, ...}
+    """
+    return jsonify(lecturas.contadores())
+
+
+@app.route('/api/diagnostico/presupuesto')
+def diagnostico_presupuesto():
+    """
+    API: Peticiones que se han pasado del presupuesto de SQL (ver presupuesto_sql.py).
+    
+    URL: GET /api/diagnostico/presupuesto
+    
+    Ejemplo de respuesta:
+        {"observadas": 120, "limites": {...}, "avisos": {"iniciar_juego":
+         {"avisos": 3, "ultimo": {"excesos": ["repeticiones"], ...}}}}
+    """
+    return jsonify(presupuesto_sql.estado())
+
+
+@app.route('/api/diagnostico/admision')
+def diagnostico_admision():
+    """
+    API: Estado del control de admisión (ver admision.py).
+    
+    URL: GET /api/diagnostico/admision
+    
+    Ejemplo de respuesta:
+        {"total_activas": 3, "clases": {"partida": {"activas": 2,
+         "en_cola": 5, "rechazadas": 40, ...}, ...}}
+    """
+    return jsonify(admision_control.estado())
+
+
+@app.route('/api/diagnostico/memoria')
+def diagnostico_memoria():
+    """
+    API: Memoria de este proceso por subsistema (ver memoria.py).
+    
+    URL: GET /api/diagnostico/memoria
+         GET /api/diagnostico/memoria?base=1   (compara desde aquí en adelante)
+    
+    Solo existe con QUIZ_MEMORIA=1: tomar una instantánea de tracemalloc
+    cuesta tiempo y enseña el código por dentro.
+    
+    Ejemplo de respuesta:
+        {"pid": 4242, "rss_bytes": 91226112, "contabilidad": {"preguntas":
+         {"bytes": 5120000, "partes": {"mazo.ids_por_tema": 5120000}}, ...},
+         "tracemalloc": {"subsistemas": {"partidas": {"bytes": 6400000,
+         "desde_anterior": 81920, "desde_base": 1048576}, ...},
+         "crecimiento": [{"lugar": "mazo.py:190", "diferencia": 40960, ...}]}}
+    """
+    if not app.config['DIAGNOSTICO_MEMORIA']:
+        return jsonify({'error': 'Diagnóstico de memoria desactivado (QUIZ_MEMORIA=1)'}), 404
+    if request.args.get('base') == '1':
+        memoria.reiniciar_base()
+    return jsonify(memoria.informe())
+
+
+@app.route('/api/diagnostico/centros')
+def diagnostico_centros():
+    """
+    API: Centros abiertos en este proceso (ver centros.py).
+    
+    URL: GET /api/diagnostico/centros
+    
+    Ejemplo de respuesta:
+        {"abiertos": 120, "conexiones_libres": 180, "aciertos": 90412,
+         "aperturas": 2310, "desconocidos": 3, "expulsados": 1950, "inactivos": 240}
+    """
+    if centros_abiertos is None:
+        return jsonify({'error': 'Catálogos por centro desactivados (QUIZ_CENTROS=1)'}), 404
+    return jsonify(centros_abiertos.contadores())
 
 
 # =============================================================================
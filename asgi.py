@@ -0,0 +1,310 @@
+"""
+asgi.py - Modo asyncio (ASGI) del Quiz
+======================================
+
+El servidor de Flask (WSGI) dedica un hilo a cada petición, y ese hilo se
+queda bloqueado mientras SQLite trabaja. Con muchos jugadores conectados
+a la vez (la mayoría pensando su respuesta, sin hacer nada) el número de
+hilos limita cuántos podemos atender.
+
+Este módulo sirve LAS MISMAS rutas con asyncio:
+
+    GET  /                    Página principal
+    GET  /api/temas           Lista de temas
+    POST /api/jugar           Iniciar partida
+    POST /api/responder       Enviar respuesta
+    GET  /api/estadisticas    Historial de partidas
+
+Un solo hilo con un "bucle de eventos" atiende todas las conexiones; solo
+el trabajo con la base de datos (que es bloqueante) se manda a un grupo
+LIMITADO de hilos (ThreadPoolExecutor). Mientras SQLite trabaja, el bucle
+sigue atendiendo a los demás.
+
+¿QUÉ ES ASGI?
+-------------
+Es el equivalente asíncrono de WSGI: una función
+    async def aplicacion(scope, receive, send)
+que un servidor ASGI (por ejemplo uvicorn) llama con cada conexión.
+Aquí la escribimos "a mano", sin framework, para no añadir dependencias.
+
+COMPATIBILIDAD CON app.py:
+--------------------------
+- La lógica de la partida es la de juego.py, la misma que usa Flask
+- La cookie de sesión se firma con el mismo serializador y la misma clave
+  que Flask, así que una partida empezada en un modo sigue en el otro
+- El JSON se genera con el mismo conversor que jsonify()
+
+CÓMO EJECUTAR:
+--------------
+    uv sync --extra asgi
+    QUIZ_ASGI_HILOS=16 uv run python asgi.py --port 8000
+
+    # o con cualquier servidor ASGI:
+    uv run uvicorn asgi:aplicacion --port 8000
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.cookies import SimpleCookie
+
+import captura
+import centros
+import juego
+from almacenamiento import dejar_peticion, usar_en_peticion
+from app import (app as app_flask, centros_abiertos, lectura_compartida, leer_temas,
+                 leer_ultimas_partidas, partidas_guardadas)
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+# Hilos para el trabajo con la base de datos
+HILOS_BD = int(os.environ.get('QUIZ_ASGI_HILOS', 16))
+
+# Tareas de base de datos que pueden esperar en cola además de las que se
+# están ejecutando. Más allá, las peticiones esperan sin ocupar memoria del
+# ejecutor (así la cola del ThreadPoolExecutor no crece sin límite)
+MAX_PENDIENTES_BD = HILOS_BD * 4
+
+# Tamaño máximo del cuerpo de una petición (los nuestros ocupan bytes)
+MAX_CUERPO = 64 * 1024
+
+_ejecutor = ThreadPoolExecutor(max_workers=HILOS_BD, thread_name_prefix='quiz-bd')
+_semaforo_bd = None     # asyncio.Semaphore, se crea dentro del bucle de eventos
+
+# Firmado de la cookie de sesión idéntico al de Flask
+_serializador = app_flask.session_interface.get_signing_serializer(app_flask)
+_nombre_cookie = app_flask.config['SESSION_COOKIE_NAME']
+
+
+async def en_hilo(funcion, *args):
+    """
+    Ejecuta una función bloqueante (SQLite) en el grupo de hilos y espera
+    su resultado sin bloquear el bucle de eventos.
+
+    La función se ejecuta con las ContextVar de la tarea (como
+    asyncio.to_thread()): así get_almacen() sabe de qué centro es la petición.
+    """
+    global _semaforo_bd
+    if _semaforo_bd is None:
+        _semaforo_bd = asyncio.Semaphore(HILOS_BD + MAX_PENDIENTES_BD)
+    async with _semaforo_bd:
+        bucle = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()
+        return await bucle.run_in_executor(_ejecutor, contexto.run, partial(funcion, *args))
+
+
+# =============================================================================
+# SESIÓN (cookie firmada compatible con Flask)
+# =============================================================================
+
+def _cargar_sesion(cabeceras):
+    """Lee y verifica la cookie de sesión. Devuelve {} si no hay o no es válida."""
+    cookie = SimpleCookie()
+    cookie.load(cabeceras.get(b'cookie', b'').decode('latin-1'))
+    if _nombre_cookie not in cookie:
+        return {}
+    try:
+        max_edad = int(app_flask.permanent_session_lifetime.total_seconds())
+        return _serializador.loads(cookie[_nombre_cookie].value, max_age=max_edad)
+    except Exception:
+        return {}
+
+
+def _cabecera_sesion(sesion):
+    """Genera la cabecera Set-Cookie con la sesión firmada."""
+    valor = _serializador.dumps(dict(sesion))
+    return (b'set-cookie',
+            f'{_nombre_cookie}={valor}; HttpOnly; Path=/; SameSite=Lax'.encode('latin-1'))
+
+
+# =============================================================================
+# RESPUESTAS
+# =============================================================================
+
+async def _leer_cuerpo(receive):
+    """Lee el cuerpo completo de la petición (puede llegar en trozos)."""
+    partes = []
+    tamano = 0
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'http.disconnect':
+            return None
+        trozo = mensaje.get('body', b'')
+        tamano += len(trozo)
+        if tamano > MAX_CUERPO:
+            return None
+        partes.append(trozo)
+        if not mensaje.get('more_body', False):
+            return b''.join(partes)
+
+
+async def _enviar(send, codigo, cuerpo, tipo=b'application/json', extra=()):
+    if not isinstance(cuerpo, bytes):
+        cuerpo = (app_flask.json.dumps(cuerpo) + '\n').encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': codigo,
+        'headers': [
+            (b'content-type', tipo),
+            (b'content-length', str(len(cuerpo)).encode()),
+            *extra,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': cuerpo})
+
+
+def _renderizar_index(temas):
+    with app_flask.app_context():
+        return app_flask.jinja_env.get_template('index.html').render(temas=temas)
+
+
+# =============================================================================
+# RUTAS
+# =============================================================================
+
+async def _index(_datos, _sesion, _cabeceras):
+    temas = await en_hilo(lectura_compartida, 'temas', leer_temas)
+    html = await en_hilo(_renderizar_index, temas)
+    return 200, html.encode('utf-8')
+
+
+async def _temas(_datos, _sesion, _cabeceras):
+    return 200, await en_hilo(lectura_compartida, 'temas', leer_temas)
+
+
+async def _estadisticas(_datos, _sesion, _cabeceras):
+    return 200, await en_hilo(lectura_compartida, 'estadisticas', leer_ultimas_partidas)
+
+
+async def _jugar(datos, sesion, cabeceras):
+    # Al reproducir una captura, el mazo sale de la semilla (ver captura.py)
+    rng = random
+    if app_flask.config['SEMILLAS_REPRODUCCION']:
+        semilla = cabeceras.get(captura.CABECERA_SEMILLA.lower().encode(), b'').decode('latin-1')
+        rng = captura.generador({captura.CABECERA_SEMILLA: semilla})
+    cuerpo, codigo = await en_hilo(juego.nueva_partida, sesion, datos.get('tema', 'todos'), rng)
+    return codigo, cuerpo
+
+
+async def _responder(datos, sesion, _cabeceras):
+    cuerpo, codigo = await en_hilo(juego.responder, sesion, datos.get('respuesta'))
+    if 'fin' in cuerpo:
+        partidas_guardadas()
+    return codigo, cuerpo
+
+
+# (método, ruta) -> (función, ¿necesita cuerpo JSON?)
+RUTAS = {
+    ('GET', '/'): (_index, False),
+    ('GET', '/api/temas'): (_temas, False),
+    ('GET', '/api/estadisticas'): (_estadisticas, False),
+    ('POST', '/api/jugar'): (_jugar, True),
+    ('POST', '/api/responder'): (_responder, True),
+}
+
+
+# =============================================================================
+# APLICACIÓN ASGI
+# =============================================================================
+
+async def aplicacion(scope, receive, send):
+    """Punto de entrada ASGI: el servidor la llama con cada petición."""
+    if scope['type'] == 'lifespan':
+        # Arranque y parada del servidor. La base de datos ya se inicializó
+        # al importar app.py; al parar liberamos los hilos.
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                _ejecutor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    ruta = RUTAS.get((scope['method'], scope['path']))
+    if ruta is None:
+        await _enviar(send, 404, {'error': 'No encontrado'})
+        return
+    funcion, necesita_json = ruta
+
+    cuerpo = await _leer_cuerpo(receive)
+    if cuerpo is None:
+        await _enviar(send, 413, {'error': 'Petición demasiado grande'})
+        return
+
+    datos = {}
+    if necesita_json:
+        try:
+            datos = json.loads(cuerpo or b'null')
+        except ValueError:
+            datos = None
+        if not isinstance(datos, dict):
+            await _enviar(send, 400, {'error': 'Se esperaba un cuerpo JSON'})
+            return
+
+    cabeceras = dict(scope['headers'])
+
+    # Centro de la petición (ver centros.py), como en app.py
+    testigo = None
+    if centros_abiertos is not None:
+        nombre = centros.nombre_peticion({
+            centros.CABECERA: cabeceras.get(centros.CABECERA.lower().encode(), b'').decode('latin-1'),
+            'Host': cabeceras.get(b'host', b'').decode('latin-1'),
+        }, os.environ.get('QUIZ_DOMINIO'))
+        if nombre is not None:
+            try:
+                almacen = await en_hilo(centros_abiertos.abrir, nombre)
+            except ValueError as error:
+                await _enviar(send, 400, {'error': str(error)})
+                return
+            if almacen is None:
+                await _enviar(send, 404, {'error': f'Centro desconocido: {nombre}'})
+                return
+            testigo = usar_en_peticion(almacen)
+
+    sesion = _cargar_sesion(cabeceras)
+    antes = dict(sesion)
+
+    try:
+        codigo, respuesta = await funcion(datos, sesion, cabeceras)
+    finally:
+        if testigo is not None:
+            dejar_peticion(testigo)
+
+    # Como Flask: solo se reenvía la cookie si la sesión ha cambiado
+    extra = [_cabecera_sesion(sesion)] if sesion != antes else []
+    if isinstance(respuesta, bytes):
+        await _enviar(send, codigo, respuesta, b'text/html; charset=utf-8', extra)
+    else:
+        await _enviar(send, codigo, respuesta, extra=extra)
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sirve el quiz en modo asyncio (ASGI).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('❌ El modo ASGI necesita uvicorn: uv sync --extra asgi')
+
+    uvicorn.run(aplicacion, host=args.host, port=args.port, log_level='warning')
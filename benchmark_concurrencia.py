@@ -0,0 +1,256 @@
+"""
+benchmark_concurrencia.py - WSGI (Flask) contra ASGI (asyncio)
+==============================================================
+
+Compara cuántos jugadores simultáneos aguanta cada modo de servir el quiz:
+
+  - wsgi: app.py con el servidor de Flask (un hilo por petición)
+  - asgi: asgi.py con uvicorn (bucle de eventos + hilos limitados para SQLite)
+
+¿CÓMO SE MIDE?
+--------------
+1. Se arranca cada servidor en un subproceso, en un puerto libre
+2. Se abren M conexiones "ociosas": jugadores que han conectado pero aún
+   no han terminado de enviar su petición (ocupan una conexión sin hacer
+   nada, como quien está pensando la respuesta)
+3. Con esas conexiones abiertas, N jugadores virtuales juegan a la vez
+   una partida completa cada uno (/api/jugar + 10 x /api/responder)
+4. Se repite con N cada vez mayor y se anotan peticiones por segundo,
+   latencias (p50, p99) y errores
+
+El "techo de concurrencia" es el N a partir del cual aparecen errores o
+la latencia p99 se dispara.
+
+Los dos servidores juegan en igualdad de condiciones:
+  - Cada uno usa una COPIA temporal de quiz.db (las partidas del
+    benchmark no acaban en la base de datos de verdad, y el segundo modo
+    no hereda las filas que escribió el primero)
+  - El control de admisión de app.py (admision.py) se desactiva con
+    QUIZ_ADMISION=0: asgi.py no lo tiene, y sus 503 contarían como errores
+    solo en el lado WSGI
+
+CÓMO USARLO:
+------------
+    uv sync --extra asgi
+    uv run python benchmark_concurrencia.py --niveles 10 50 100 500 --ociosas 200
+
+Escribe el resultado en JSON por la salida estándar (o en --salida).
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DIRECTORIO = Path(__file__).parent
+
+# Antes de importar la aplicación, la base de datos pasa a ser la copia
+PREAMBULO = 'import database, pathlib; database.DB_PATH = pathlib.Path({db}); '
+
+# Comando que arranca cada servidor; {puerto} y {db} se sustituyen
+SERVIDORES = {
+    'wsgi': [sys.executable, '-c', PREAMBULO +
+             'from app import app; app.run(host="127.0.0.1", port={puerto}, threaded=True)'],
+    'asgi': [sys.executable, '-c', PREAMBULO +
+             'import runpy, sys; sys.argv = ["asgi.py", "--port", "{puerto}"]; '
+             'runpy.run_path("asgi.py", run_name="__main__")'],
+}
+
+# Sin control de admisión (asgi.py no lo tiene): ver arriba
+ENTORNO = {**os.environ, 'QUIZ_ADMISION': '0'}
+
+TIEMPO_ESPERA = 10.0     # Segundos máximos por petición antes de darla por fallida
+
+
+# =============================================================================
+# CLIENTE HTTP MÍNIMO (asyncio)
+# =============================================================================
+
+async def peticion(puerto, metodo, ruta, cuerpo=None, cookie=None):
+    """
+    Hace una petición HTTP/1.1 con una conexión nueva ("Connection: close").
+
+    Returns:
+        tuple: (código, cabeceras dict, cuerpo bytes)
+    """
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    try:
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else b''
+        cabeceras = [
+            f'{metodo} {ruta} HTTP/1.1',
+            f'Host: 127.0.0.1:{puerto}',
+            'Connection: close',
+            f'Content-Length: {len(datos)}',
+        ]
+        if cuerpo is not None:
+            cabeceras.append('Content-Type: application/json')
+        if cookie:
+            cabeceras.append(f'Cookie: {cookie}')
+        escritor.write(('\r\n'.join(cabeceras) + '\r\n\r\n').encode() + datos)
+        await escritor.drain()
+
+        respuesta = await lector.read()
+    finally:
+        escritor.close()
+
+    cabecera, _, resto = respuesta.partition(b'\r\n\r\n')
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    codigo = int(lineas[0].split()[1])
+    campos = {}
+    for linea in lineas[1:]:
+        nombre, _, valor = linea.partition(':')
+        campos[nombre.strip().lower()] = valor.strip()
+    return codigo, campos, resto
+
+
+async def partida(puerto, latencias):
+    """Un jugador virtual juega una partida completa. Devuelve nº de errores."""
+    cookie = None
+    errores = 0
+    pasos = [('POST', '/api/jugar', {'tema': 'todos'})]
+    pasos += [('POST', '/api/responder', {'respuesta': 'a'})] * 10
+    for metodo, ruta, cuerpo in pasos:
+        inicio = time.perf_counter()
+        try:
+            codigo, cabeceras, _ = await asyncio.wait_for(
+                peticion(puerto, metodo, ruta, cuerpo, cookie), TIEMPO_ESPERA)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            errores += 1
+            continue
+        latencias.append(time.perf_counter() - inicio)
+        if codigo >= 500:
+            errores += 1
+        if 'set-cookie' in cabeceras:
+            cookie = cabeceras['set-cookie'].split(';', 1)[0]
+    return errores
+
+
+async def abrir_ociosas(puerto, cantidad):
+    """Abre conexiones que envían media petición y se quedan esperando."""
+    conexiones = []
+    for _ in range(cantidad):
+        try:
+            _, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+        except OSError:
+            break
+        escritor.write(f'GET /api/temas HTTP/1.1\r\nHost: 127.0.0.1:{puerto}\r\n'.encode())
+        conexiones.append(escritor)
+    return conexiones
+
+
+async def medir_nivel(puerto, jugadores, ociosas):
+    """Mide un nivel de concurrencia: `jugadores` partidas simultáneas."""
+    conexiones = await abrir_ociosas(puerto, ociosas)
+    latencias = []
+    inicio = time.perf_counter()
+    errores = await asyncio.gather(*(partida(puerto, latencias) for _ in range(jugadores)))
+    duracion = time.perf_counter() - inicio
+    for escritor in conexiones:
+        escritor.close()
+
+    latencias.sort()
+    return {
+        'jugadores': jugadores,
+        'ociosas': len(conexiones),
+        'peticiones_ok': len(latencias),
+        'errores': sum(errores),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1),
+        'p50_ms': round(statistics.median(latencias) * 1000, 2) if latencias else None,
+        'p99_ms': round(latencias[int(0.99 * (len(latencias) - 1))] * 1000, 2) if latencias else None,
+    }
+
+
+# =============================================================================
+# SERVIDORES
+# =============================================================================
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar_puerto(puerto, limite=15.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'El servidor no arrancó en el puerto {puerto}')
+
+
+def _copiar_base(destino):
+    """
+    Copia quiz.db a `destino` con la API de copias de SQLite (incluye lo
+    que aún esté en el WAL). Sin quiz.db, el servidor crea la copia vacía.
+    """
+    origen = DIRECTORIO / 'quiz.db'
+    if not origen.exists():
+        return
+    fuente = sqlite3.connect(origen)
+    copia = sqlite3.connect(destino)
+    fuente.backup(copia)
+    fuente.close()
+    copia.close()
+
+
+def comparar(niveles, ociosas, modos=('wsgi', 'asgi')):
+    """Arranca cada servidor, mide todos los niveles y devuelve los resultados."""
+    resultados = {}
+    for modo in modos:
+        temporal = tempfile.TemporaryDirectory()
+        base = Path(temporal.name) / 'quiz.db'
+        _copiar_base(base)
+        puerto = _puerto_libre()
+        comando = [parte.replace('{puerto}', str(puerto)).replace('{db}', repr(str(base)))
+                   for parte in SERVIDORES[modo]]
+        servidor = subprocess.Popen(comando, cwd=DIRECTORIO, env=ENTORNO,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _esperar_puerto(puerto)
+            resultados[modo] = []
+            for jugadores in niveles:
+                punto = asyncio.run(medir_nivel(puerto, jugadores, ociosas))
+                resultados[modo].append(punto)
+                print(f"   {modo} {jugadores:>6} jugadores: {punto['peticiones_por_segundo']:>8} pet/s "
+                      f"p99={punto['p99_ms']} ms errores={punto['errores']}", file=sys.stderr)
+        finally:
+            servidor.terminate()
+            servidor.wait()
+            temporal.cleanup()
+    return resultados
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara la concurrencia de WSGI y ASGI.')
+    parser.add_argument('--niveles', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--ociosas', type=int, default=100,
+                        help='Conexiones ociosas abiertas durante cada medida')
+    parser.add_argument('--modos', nargs='+', default=['wsgi', 'asgi'], choices=SERVIDORES)
+    parser.add_argument('--salida', default=None)
+    args = parser.parse_args()
+
+    texto = json.dumps({'ociosas': args.ociosas,
+                        'resultados': comparar(args.niveles, args.ociosas, args.modos)},
+                       indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+    else:
+        print(texto)
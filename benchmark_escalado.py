@@ -0,0 +1,196 @@
+"""
+benchmark_escalado.py - Cómo escalan las consultas con el tamaño de los datos
+=============================================================================
+
+Mide el tiempo de cada operación que toca la base de datos (las funciones
+de database.py y las rutas de app.py) con bases de datos sintéticas de
+distintos tamaños, y guarda las "curvas de escalado" en JSON.
+
+¿POR QUÉ?
+---------
+Con 100 preguntas todo va rápido. Lo que queremos saber es cómo crece
+el tiempo cuando hay 10 mil, 1 millón o 10 millones de filas:
+  - ¿ORDER BY RANDOM() en /api/jugar crece linealmente?
+  - ¿ORDER BY fecha en /api/estadisticas recorre toda la tabla?
+  - ¿El LEFT JOIN + GROUP BY de contar_preguntas() aguanta?
+
+CÓMO FUNCIONA:
+--------------
+1. Para cada tamaño N genera (o reutiliza) bench_datos/quiz_N.db con
+   generador.py: N preguntas y N partidas
+2. Apunta database.DB_PATH a ese archivo
+3. Ejecuta cada operación varias veces y guarda mínimo, mediana y p95
+4. Escribe un JSON con una curva (lista de puntos) por operación
+
+Las rutas de app.py se miden con el cliente de pruebas de Flask
+(app.test_client()), que ejecuta la vista completa sin abrir un
+servidor HTTP. Así medimos SQL + lógica + JSON, sin ruido de red.
+
+CÓMO USARLO:
+------------
+    uv run python benchmark_escalado.py
+    uv run python benchmark_escalado.py --tamanos 10000 100000 1000000 10000000 \\
+        --repeticiones 20 --salida curvas.json
+
+Formato de salida:
+    {
+      "meta": {"repeticiones": 10, "temas": 50, ...},
+      "operaciones": {
+        "api_jugar_todos": [
+          {"preguntas": 10000, "partidas": 10000, "min_ms": 1.2,
+           "mediana_ms": 1.4, "p95_ms": 2.0},
+          ...
+        ],
+        ...
+      }
+    }
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import database
+from generador import generar_datos
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+TAMANOS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+DIR_DATOS = Path(__file__).parent / 'bench_datos'
+TEMAS_SINTETICOS = 50
+
+
+# =============================================================================
+# MEDICIÓN
+# =============================================================================
+
+def _medir(funcion, repeticiones):
+    """
+    Ejecuta funcion() varias veces y devuelve estadísticas en milisegundos.
+
+    Se hace una ejecución de calentamiento que no cuenta: la primera
+    vez SQLite tiene que leer páginas del disco que luego quedan en caché.
+    """
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'min_ms': round(tiempos[0], 3),
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[int(0.95 * (len(tiempos) - 1))], 3),
+    }
+
+
+def _operaciones(cliente):
+    """
+    Devuelve un diccionario {nombre: función sin argumentos} con todas
+    las operaciones a medir.
+
+    Args:
+        cliente: Cliente de pruebas de Flask (app.test_client())
+    """
+    def partida_completa():
+        # /api/jugar + 10 x /api/responder (incluye el INSERT final)
+        respuesta = cliente.post('/api/jugar', json={'tema': 'Tema 0001'})
+        total = respuesta.get_json().get('total', 0)
+        for _ in range(total):
+            cliente.post('/api/responder', json={'respuesta': 'a'})
+
+    return {
+        # database.py
+        'tablas_vacias': database.tablas_vacias,
+        'obtener_id_tema': lambda: database.obtener_id_tema('Tema 0001'),
+        'contar_preguntas': database.contar_preguntas,
+        # app.py
+        'index': lambda: cliente.get('/'),
+        'api_temas': lambda: cliente.get('/api/temas'),
+        'api_jugar_todos': lambda: cliente.post('/api/jugar', json={'tema': 'todos'}),
+        'api_jugar_tema': lambda: cliente.post('/api/jugar', json={'tema': 'Tema 0001'}),
+        'partida_completa': partida_completa,
+        'api_estadisticas': lambda: cliente.get('/api/estadisticas'),
+    }
+
+
+def preparar_base(tamano, directorio=DIR_DATOS):
+    """
+    Devuelve la ruta de una base de datos sintética con `tamano`
+    preguntas y partidas, generándola solo si no existe ya.
+    """
+    directorio.mkdir(exist_ok=True)
+    ruta = directorio / f'quiz_{tamano}.db'
+    if not ruta.exists():
+        print(f"🔧 Generando {ruta.name}...", file=sys.stderr)
+        generar_datos(ruta, n_preguntas=tamano, n_partidas=tamano,
+                      n_temas=TEMAS_SINTETICOS)
+    return ruta
+
+
+def ejecutar_benchmark(tamanos=TAMANOS_POR_DEFECTO, repeticiones=10):
+    """
+    Mide todas las operaciones para cada tamaño.
+
+    Returns:
+        dict: Resultado con el formato descrito en la cabecera del módulo
+    """
+    rutas = {tamano: preparar_base(tamano) for tamano in tamanos}
+
+    # app.py inicializa la base de datos al importarse, así que solo lo
+    # importamos cuando DB_PATH ya apunta a una base de datos con datos
+    database.DB_PATH = rutas[tamanos[0]]
+    from app import app
+    cliente = app.test_client()
+
+    curvas = {}
+    for tamano in tamanos:
+        database.DB_PATH = rutas[tamano]
+        for nombre, funcion in _operaciones(cliente).items():
+            punto = {'preguntas': tamano, 'partidas': tamano}
+            punto.update(_medir(funcion, repeticiones))
+            curvas.setdefault(nombre, []).append(punto)
+            print(f"   {tamano:>10} {nombre:<20} {punto['mediana_ms']:>10.3f} ms",
+                  file=sys.stderr)
+
+    return {
+        'meta': {
+            'repeticiones': repeticiones,
+            'temas': TEMAS_SINTETICOS,
+            'sqlite': database.sqlite3.sqlite_version,
+        },
+        'operaciones': curvas,
+    }
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Mide cómo escalan las operaciones de base de datos.'
+    )
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO,
+                        help='Número de preguntas (y de partidas) de cada base de datos')
+    parser.add_argument('--repeticiones', type=int, default=10)
+    parser.add_argument('--salida', default=None,
+                        help='Archivo JSON de salida (por defecto, la consola)')
+    args = parser.parse_args()
+
+    resultado = ejecutar_benchmark(sorted(args.tamanos), args.repeticiones)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto, encoding='utf-8')
+        print(f"✅ Curvas guardadas en {args.salida}", file=sys.stderr)
+    else:
+        print(texto)
@@ -0,0 +1,125 @@
+"""
+benchmark_preguntas.py - Memoria y tiempo de cada forma de leer preguntas
+=========================================================================
+
+Compara tres formas de tener en memoria las filas de la tabla preguntas:
+
+  - sqlite3.Row: lo que devuelve get_db() por defecto
+  - dict:        dict(row), lo que se guardaba antes en la sesión
+  - Pregunta:    el registro con __slots__ de database.py (row_factory
+                 Pregunta.de_cursor, sin Row intermedio)
+
+Para cada una mide:
+  - bytes_por_pregunta: memoria reservada por pregunta (tracemalloc),
+    incluidos los textos, que cuestan lo mismo en las tres
+  - us_por_pregunta: tiempo de leer y convertir cada pregunta (mediana)
+  - sesion_bytes: tamaño en JSON de una pregunta tal como iría en la
+    cookie de sesión (solo dict y Pregunta, Row no es serializable)
+
+CÓMO USARLO:
+------------
+    uv run python benchmark_preguntas.py
+    uv run python benchmark_preguntas.py --preguntas 100000 --repeticiones 20
+
+Usa (o genera) bench_datos/quiz_N.db, como benchmark_escalado.py.
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import json
+import sys
+import tracemalloc
+
+from benchmark_escalado import _medir, preparar_base
+from database import COLUMNAS_PREGUNTA, Pregunta, get_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+PREGUNTAS_POR_DEFECTO = 10_000
+SQL = f'SELECT {COLUMNAS_PREGUNTA} FROM preguntas'
+
+
+# =============================================================================
+# FORMAS DE LEER
+# =============================================================================
+
+def _leer_row(ruta):
+    conn = get_db(ruta)
+    filas = conn.execute(SQL).fetchall()
+    conn.close()
+    return filas
+
+
+def _leer_dict(ruta):
+    return [dict(fila) for fila in _leer_row(ruta)]
+
+
+def _leer_pregunta(ruta):
+    conn = get_db(ruta)
+    conn.row_factory = Pregunta.de_cursor
+    filas = conn.execute(SQL).fetchall()
+    conn.close()
+    return filas
+
+
+FORMAS = {
+    'sqlite3.Row': (_leer_row, None),
+    'dict': (_leer_dict, lambda fila: fila),
+    'Pregunta': (_leer_pregunta, Pregunta.a_sesion),
+}
+
+
+# =============================================================================
+# MEDICIÓN
+# =============================================================================
+
+def _memoria(leer, ruta):
+    """Bytes reservados por la lista de filas y todo lo que cuelga de ella."""
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    filas = leer(ruta)
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return despues - antes, len(filas), filas
+
+
+def ejecutar_benchmark(n_preguntas=PREGUNTAS_POR_DEFECTO, repeticiones=10):
+    ruta = preparar_base(n_preguntas)
+    resultado = {
+        'meta': {'base': ruta.name, 'repeticiones': repeticiones},
+        'formas': {},
+    }
+    for nombre, (leer, a_sesion) in FORMAS.items():
+        print(f"📏 {nombre}...", file=sys.stderr)
+        reservado, n, filas = _memoria(leer, ruta)
+        tiempos = _medir(lambda: leer(ruta), repeticiones)
+        datos = {
+            'filas': n,
+            'bytes_por_pregunta': round(reservado / n, 1),
+            'us_por_pregunta': round(tiempos['mediana_ms'] * 1000 / n, 3),
+            'mediana_ms': tiempos['mediana_ms'],
+        }
+        if a_sesion is not None:
+            muestra = filas[:1000]
+            texto = json.dumps([a_sesion(fila) for fila in muestra], ensure_ascii=False)
+            datos['sesion_bytes'] = round(len(texto.encode('utf-8')) / len(muestra), 1)
+        resultado['formas'][nombre] = datos
+        del filas
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compara sqlite3.Row, dict y Pregunta en memoria y tiempo.'
+    )
+    parser.add_argument('--preguntas', type=int, default=PREGUNTAS_POR_DEFECTO,
+                        help='Tamaño de la base sintética (preguntas y partidas)')
+    parser.add_argument('--repeticiones', type=int, default=10)
+    args = parser.parse_args()
+
+    print(json.dumps(ejecutar_benchmark(args.preguntas, args.repeticiones),
+                     indent=2, ensure_ascii=False))
@@ -0,0 +1,458 @@
+"""
+bocetos.py - Distribución de puntuaciones por tema ("mejor que el X%")
+======================================================================
+
+Al terminar una partida queremos decirle al jugador algo como
+"Has superado al 83% de las partidas de NumPy". Hacerlo exacto supondría
+contar TODAS las filas de estadisticas con un porcentaje menor en cada
+partida terminada, y además con varios servidores cada uno solo ve las
+suyas.
+
+En su lugar guardamos un BOCETO (resumen) de la distribución:
+
+    Histograma de 101 casillas: conteos[p] = partidas con un p% de aciertos
+
+  - Cabe en memoria (101 enteros por tema), se actualiza en O(1)
+  - El percentil sale en tiempo constante: sumar como mucho 101 casillas
+  - Es EXACTO para nuestras partidas (porcentajes enteros con 10
+    preguntas); con otros totales se redondea al entero más cercano
+  - Se puede FUSIONAR: sumando casilla a casilla los histogramas de dos
+    servidores, o de dos días, sale el histograma de la unión
+
+¿CÓMO SE GUARDA?
+----------------
+Tabla bocetos_puntuacion: un histograma por (día, tema, nodo). Cada
+servidor ("nodo") acumula en memoria lo que pasa desde el último guardado
+y cada INTERVALO_GUARDADO segundos lo SUMA a su fila del día. Después
+relee y fusiona las filas de TODOS los nodos de los últimos VENTANA_DIAS
+días: así cada nodo ve también las partidas de los demás.
+
+Guardar y releer lo hace un hilo de cada proceso (lo arranca el primer
+registrar() del proceso), no las peticiones: una partida terminada solo
+toca la memoria.
+
+Cada centro (centros.py) tiene sus histogramas en SU fichero, en un
+BocetosPuntuacion propio que se crea al usarlo (bocetos_de()) y se guarda
+y desaparece cuando se cierra el centro. Un proceso solo tiene en memoria
+los histogramas de los centros abiertos.
+
+Con bases de datos separadas por nodo, las filas se pueden llevar de una a
+otra con exportar()/importar(). Cada nodo exporta solo SUS filas, y al
+importar cada fila (día, tema, nodo) SUSTITUYE a la que hubiera: importar
+dos veces lo mismo, o sincronizar en los dos sentidos, no cuenta nada dos
+veces:
+
+    uv run python bocetos.py exportar > nodo1.json
+    uv run python bocetos.py importar nodo1.json     # en el otro nodo
+
+Para crear los histogramas a partir de las partidas que ya había (con el
+servidor parado):
+
+    uv run python bocetos.py reconstruir
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import atexit
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta, timezone
+
+import memoria
+from database import get_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+CASILLAS = 101               # Porcentajes enteros de 0 a 100
+INTERVALO_GUARDADO = 30.0    # Segundos entre guardados en la base de datos
+VENTANA_DIAS = 90            # El percentil se calcula con los últimos N días
+
+# Identificador de este servidor en la tabla. Los procesos de un mismo
+# servidor comparten fila (sus sumas se acumulan igual)
+NODO = os.environ.get('QUIZ_NODO') or socket.gethostname()
+
+
+def _hoy():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _casilla(porcentaje):
+    return min(CASILLAS - 1, max(0, round(porcentaje)))
+
+
+# =============================================================================
+# HISTOGRAMA
+# =============================================================================
+
+class Histograma:
+    """Conteo de partidas por porcentaje entero de aciertos (0..100)."""
+
+    __slots__ = ('conteos', 'total')
+
+    def __init__(self, conteos=None):
+        self.conteos = list(conteos) if conteos else [0] * CASILLAS
+        self.total = sum(self.conteos)
+
+    def anadir(self, porcentaje, veces=1):
+        self.conteos[_casilla(porcentaje)] += veces
+        self.total += veces
+
+    def fusionar(self, otro):
+        """Suma otro histograma a este (casilla a casilla)."""
+        for i, conteo in enumerate(otro.conteos):
+            self.conteos[i] += conteo
+        self.total += otro.total
+
+    def rango_percentil(self, porcentaje):
+        """
+        Porcentaje de partidas con MENOS aciertos que `porcentaje`.
+
+        Returns:
+            float o None: De 0 a 100, o None si no hay ninguna partida
+        """
+        if not self.total:
+            return None
+        menores = sum(self.conteos[:_casilla(porcentaje)])
+        return menores / self.total * 100
+
+
+# =============================================================================
+# BOCETOS DE TODOS LOS TEMAS
+# =============================================================================
+
+# Todas las instancias vivas de este proceso: las guarda el hilo de guardado
+_instancias = weakref.WeakSet()
+_cerrojo_instancias = threading.Lock()
+_pid_guardado = None            # Proceso en el que corre el hilo de guardado
+
+
+class BocetosPuntuacion:
+    """
+    Histogramas por tema: los fusionados de la base de datos (todos los
+    nodos, últimos VENTANA_DIAS días) más lo registrado aquí desde entonces.
+
+    Args:
+        ruta (Path o str, opcional): Base de datos SQLite de la tabla (por
+            defecto quiz.db; la de un centro, ver bocetos_de())
+    """
+
+    def __init__(self, nodo=NODO, intervalo=INTERVALO_GUARDADO, ventana_dias=VENTANA_DIAS,
+                 ruta=None):
+        self.nodo = nodo
+        self.intervalo = intervalo
+        self.ventana_dias = ventana_dias
+        self.ruta = ruta
+        self._cerrojo = threading.Lock()
+        self._guardando = threading.Lock()
+        self._vista = None              # tema -> Histograma (se carga la primera vez)
+        self._pendientes = {}           # (día, tema) -> Histograma aún sin guardar
+        self._ultimo_guardado = time.monotonic()
+        with _cerrojo_instancias:
+            _instancias.add(self)
+
+    def _vista_cargada(self):
+        if self._vista is None:
+            self._vista = self._leer()
+        return self._vista
+
+    def _leer(self):
+        """Fusiona las filas de todos los nodos de los últimos días."""
+        desde = (datetime.now(timezone.utc) - timedelta(days=self.ventana_dias)).strftime('%Y-%m-%d')
+        vista = {}
+        conn = get_db(self.ruta)
+        for fila in conn.execute(
+                'SELECT tema, conteos FROM bocetos_puntuacion WHERE ventana >= ?', (desde,)):
+            vista.setdefault(fila['tema'], Histograma()).fusionar(Histograma(json.loads(fila['conteos'])))
+        conn.close()
+        return vista
+
+    def registrar(self, tema, porcentaje):
+        """
+        Anota una partida terminada y devuelve su rango percentil.
+
+        El rango se calcula ANTES de contar esta partida: "mejor que el X%
+        de las partidas anteriores".
+
+        Returns:
+            float o None: Porcentaje de partidas del tema con menos aciertos
+        """
+        with self._cerrojo:
+            histograma = self._vista_cargada().setdefault(tema, Histograma())
+            rango = histograma.rango_percentil(porcentaje)
+            histograma.anadir(porcentaje)
+            self._pendientes.setdefault((_hoy(), tema), Histograma()).anadir(porcentaje)
+        if _pid_guardado != os.getpid():
+            iniciar_guardado()
+        return rango
+
+    def rango_percentil(self, tema, porcentaje):
+        """Rango percentil de un porcentaje sin registrar ninguna partida."""
+        with self._cerrojo:
+            histograma = self._vista_cargada().get(tema)
+            return histograma.rango_percentil(porcentaje) if histograma else None
+
+    def guardar_si_toca(self):
+        """Guarda si han pasado `intervalo` segundos (lo llama el hilo de guardado)."""
+        if time.monotonic() - self._ultimo_guardado < self.intervalo:
+            return
+        # Sin cargar ni nada pendiente no hay nada que guardar ni releer
+        if self._vista is None and not self._pendientes:
+            return
+        # Solo un hilo guarda; los demás siguen sin esperar
+        if self._guardando.acquire(blocking=False):
+            try:
+                self.guardar()
+            finally:
+                self._guardando.release()
+
+    def guardar(self, releer=True):
+        """
+        Suma lo pendiente a las filas de este nodo y relee los demás nodos.
+
+        Args:
+            releer (bool): False al cerrar (nadie va a consultar la vista)
+        """
+        with self._cerrojo:
+            pendientes, self._pendientes = self._pendientes, {}
+            self._ultimo_guardado = time.monotonic()
+        if pendientes:
+            sumar(self.nodo, ((dia, tema, h) for (dia, tema), h in pendientes.items()),
+                  self.ruta)
+        if not releer:
+            return
+        vista = self._leer()
+        with self._cerrojo:
+            # Lo registrado mientras leíamos aún no está en la tabla
+            for (_dia, tema), histograma in self._pendientes.items():
+                vista.setdefault(tema, Histograma()).fusionar(histograma)
+            self._vista = vista
+
+
+def iniciar_guardado():
+    """
+    Arranca el hilo que guarda todas las instancias cada INTERVALO_GUARDADO
+    segundos. Uno por proceso (con servidor.py nace en el trabajador,
+    después del fork()); lo llama registrar(), no hace falta llamarlo a mano.
+    """
+    global _pid_guardado
+    with _cerrojo_instancias:
+        if _pid_guardado == os.getpid():
+            return
+        _pid_guardado = os.getpid()
+    threading.Thread(target=_guardar_periodicamente, name='bocetos-guardado',
+                     daemon=True).start()
+
+
+def _guardar_periodicamente():
+    while True:
+        time.sleep(INTERVALO_GUARDADO)
+        with _cerrojo_instancias:
+            instancias = list(_instancias)
+        for instancia in instancias:
+            try:
+                instancia.guardar_si_toca()
+            except Exception as error:      # Que un fichero roto no pare el hilo
+                print(f'⚠️  bocetos: no se pudo guardar ({error})', file=sys.stderr)
+
+
+def bocetos_de(almacen):
+    """
+    Los histogramas de un almacén: los principales, o los del centro (ver
+    centros.py), que se crean la primera vez y se van con el centro.
+    """
+    if almacen.centro is None:
+        return bocetos
+    if almacen.bocetos is None:
+        nuevo = BocetosPuntuacion(ruta=almacen.ruta)
+        with _cerrojo_instancias:
+            if almacen.bocetos is None:     # Si otro hilo se adelantó, vale el suyo
+                almacen.bocetos = nuevo
+    return almacen.bocetos
+
+
+def sumar(nodo, filas, ruta=None):
+    """
+    Suma histogramas a las filas (día, tema, nodo) de la tabla.
+
+    Leer + sumar + escribir en UNA transacción con BEGIN IMMEDIATE: si
+    varios procesos del mismo nodo guardan a la vez, se esperan en vez de
+    pisarse las sumas.
+
+    Args:
+        nodo (str): Nodo al que se suman
+        filas (iterable): (día, tema, Histograma)
+        ruta (Path o str, opcional): Base de datos (por defecto quiz.db)
+    """
+    conn = get_db(ruta)
+    conn.isolation_level = None      # Las transacciones las abrimos nosotros
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for dia, tema, histograma in filas:
+            fila = conn.execute('''
+                SELECT conteos FROM bocetos_puntuacion
+                WHERE ventana = ? AND tema = ? AND nodo = ?
+            ''', (dia, tema, nodo)).fetchone()
+            if fila is not None:
+                histograma = Histograma(histograma.conteos)
+                histograma.fusionar(Histograma(json.loads(fila['conteos'])))
+            conn.execute('''
+                INSERT OR REPLACE INTO bocetos_puntuacion (ventana, tema, nodo, conteos)
+                VALUES (?, ?, ?, ?)
+            ''', (dia, tema, nodo, json.dumps(histograma.conteos)))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+
+# =============================================================================
+# HERRAMIENTAS (varios nodos, datos antiguos)
+# =============================================================================
+
+def exportar(nodo=NODO, ruta=None):
+    """
+    Las filas de un nodo: [{'ventana', 'tema', 'nodo', 'conteos'}, ...]
+
+    Solo las suyas, no las importadas de otros nodos: cada nodo es el
+    único que exporta sus filas. `ruta`: otra base de datos (la de un centro).
+    """
+    conn = get_db(ruta)
+    filas = [{**dict(fila), 'conteos': json.loads(fila['conteos'])}
+             for fila in conn.execute('SELECT * FROM bocetos_puntuacion WHERE nodo = ?', (nodo,))]
+    conn.close()
+    return filas
+
+
+def importar(filas, nodo=NODO, ruta=None):
+    """
+    Copia filas exportadas en otros nodos. Es IDEMPOTENTE.
+
+    Cada fila (día, tema, nodo) sustituye a la que hubiera, sin sumar: la
+    fila de un nodo solo crece, así que la exportación más reciente ya lo
+    incluye todo. Si la que hay tiene más partidas (se importa un fichero
+    antiguo) se deja como está. Las filas del propio `nodo` no se tocan:
+    las escribe este servidor. `ruta`: otra base de datos (la de un centro).
+
+    Returns:
+        int: Filas copiadas
+    """
+    conn = get_db(ruta)
+    conn.isolation_level = None      # Las transacciones las abrimos nosotros
+    conn.execute('BEGIN IMMEDIATE')
+    copiadas = 0
+    try:
+        for fila in filas:
+            if fila['nodo'] == nodo:
+                continue
+            histograma = Histograma(fila['conteos'])
+            actual = conn.execute('''
+                SELECT conteos FROM bocetos_puntuacion
+                WHERE ventana = ? AND tema = ? AND nodo = ?
+            ''', (fila['ventana'], fila['tema'], fila['nodo'])).fetchone()
+            if actual is not None and Histograma(json.loads(actual['conteos'])).total >= histograma.total:
+                continue
+            conn.execute('''
+                INSERT OR REPLACE INTO bocetos_puntuacion (ventana, tema, nodo, conteos)
+                VALUES (?, ?, ?, ?)
+            ''', (fila['ventana'], fila['tema'], fila['nodo'], json.dumps(histograma.conteos)))
+            copiadas += 1
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return copiadas
+
+
+def reconstruir(nodo='historico', ruta=None):
+    """
+    Rehace la tabla entera a partir de las partidas de estadisticas.
+
+    Borra TODAS las filas (de todos los nodos) y las sustituye por las
+    calculadas desde estadisticas, con un nodo propio ('historico'). Así
+    se puede ejecutar más de una vez sin contar nada dos veces. Mejor con
+    el servidor parado: lo que tuviera pendiente de guardar se sumaría
+    otra vez. Las partidas ya archivadas (retencion.py) no cuentan.
+    `ruta`: otra base de datos (la de un centro).
+    """
+    conn = get_db(ruta)
+    with conn:
+        conn.execute('DELETE FROM bocetos_puntuacion')
+        histogramas = {}
+        for fila in conn.execute('''
+            SELECT date(fecha) AS dia, tema, CAST(ROUND(porcentaje) AS INTEGER) AS casilla,
+                   COUNT(*) AS partidas
+            FROM estadisticas
+            GROUP BY dia, tema, casilla
+        '''):
+            histograma = histogramas.setdefault((fila['dia'], fila['tema']), Histograma())
+            histograma.anadir(fila['casilla'], fila['partidas'])
+        conn.executemany('''
+            INSERT INTO bocetos_puntuacion (ventana, tema, nodo, conteos) VALUES (?, ?, ?, ?)
+        ''', [(dia, tema, nodo, json.dumps(h.conteos)) for (dia, tema), h in histogramas.items()])
+    conn.close()
+    return len(histogramas)
+
+
+# Instancia del catálogo principal (quiz.db)
+bocetos = BocetosPuntuacion()
+
+
+def _bytes():
+    with _cerrojo_instancias:
+        instancias = list(_instancias)
+    return memoria.tamano([(instancia._vista, instancia._pendientes) for instancia in instancias])
+
+
+memoria.registrar('bocetos', 'bocetos.bocetos', _bytes)
+
+
+@atexit.register
+def _guardar_al_salir():
+    """Lo pendiente se guarda también al apagar el proceso."""
+    with _cerrojo_instancias:
+        instancias = list(_instancias)
+    for instancia in instancias:
+        if instancia._pendientes:
+            instancia.guardar(releer=False)
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Histogramas de puntuación por tema.')
+    parser.add_argument('--db', default=None,
+                        help='Base de datos (por defecto quiz.db; centros/<nombre>.db para un centro)')
+    subcomandos = parser.add_subparsers(dest='accion', required=True)
+    subcomandos.add_parser('reconstruir', help='Crear los histogramas desde estadisticas')
+    exportar_args = subcomandos.add_parser(
+        'exportar', help='Escribir las filas de este nodo en JSON (salida estándar)')
+    exportar_args.add_argument('--nodo', default=NODO,
+                               help="Nodo a exportar (por defecto este; 'historico' tras reconstruir)")
+    importar_args = subcomandos.add_parser('importar', help='Copiar filas exportadas en otro nodo')
+    importar_args.add_argument('fichero')
+    args = parser.parse_args()
+
+    if args.accion == 'reconstruir':
+        print(f'📊 {reconstruir(ruta=args.db)} histogramas (día, tema) creados desde estadisticas')
+    elif args.accion == 'exportar':
+        json.dump(exportar(args.nodo, args.db), sys.stdout, ensure_ascii=False)
+    else:
+        with open(args.fichero, encoding='utf-8') as entrada:
+            filas = json.load(entrada)
+        copiadas = importar(filas, ruta=args.db)
+        print(f'📥 {copiadas} de {len(filas)} filas copiadas (las demás ya estaban al día)')
@@ -0,0 +1,571 @@
+"""
+captura.py - Captura del tráfico real y reproducción determinista
+=================================================================
+
+Los benchmarks sintéticos juegan partidas "perfectas": siempre el mismo
+tema, siempre las 10 preguntas, sin pensar entre respuesta y respuesta.
+Los jugadores de verdad eligen unos temas más que otros, abandonan
+partidas a medias y tardan segundos en contestar. Este módulo:
+
+  1. CAPTURA en producción la secuencia de peticiones de cada jugador a
+     /api/temas, /api/jugar, /api/responder y /api/estadisticas, con su
+     instante y lo que tardó el servidor
+  2. REPRODUCE esa secuencia contra cualquier servidor (otra versión del
+     código, otra configuración) a la velocidad original o acelerada
+  3. COMPARA dos reproducciones: latencias por ruta y peticiones por segundo
+
+¿QUÉ SE GUARDA? (datos anonimizados)
+------------------------------------
+Una línea JSON (una lista, para que ocupe poco) por petición:
+
+    [instante_ms, cliente, ruta, argumento, estado, ms]
+    [1760000000123, "3f9a1c0b2d4e", "r", "b", 200, 3.41]
+
+  - cliente: seudónimo del jugador (HMAC del id de jugador con una sal
+    aleatoria de esta ejecución), o null si aún no ha jugado nunca
+  - ruta: 't' temas, 'j' jugar, 'r' responder, 'e' estadisticas
+  - argumento: el tema de /api/jugar (solo si existía: si no, '?') o la
+    letra de /api/responder ('x' si no era a, b ni c)
+Nada más: ni cookies, ni direcciones IP, ni el id real del jugador.
+
+El muestreo (QUIZ_CAPTURA_MUESTREO) es por jugador, no por petición: de
+un jugador se guardan todas sus peticiones o ninguna, para no romper las
+secuencias (una partida sin su /api/jugar no se puede reproducir).
+
+¿CÓMO SE REPRODUCE IGUAL EN DOS VERSIONES?
+------------------------------------------
+Cada jugador capturado es un jugador virtual con su propia cookie que
+repite sus peticiones en el mismo orden y en el mismo instante (dividido
+por --velocidad). El mazo de cada partida lo elige mazo.py al azar; para
+que las dos versiones elijan LAS MISMAS preguntas, el reproductor manda en
+/api/jugar la cabecera X-Quiz-Semilla ('semilla:jugador:partida') y el
+servidor, si se arrancó con QUIZ_REPRODUCCION=1, elige el mazo con
+random.Random(esa semilla). Sin QUIZ_REPRODUCCION la cabecera se ignora:
+en producción nadie puede elegir su mazo.
+
+Para comparar de verdad, arranca las dos versiones con una copia de la
+misma base de datos.
+
+CÓMO USARLO:
+------------
+    # En producción (se escribe con un hilo aparte, como trazas.py)
+    QUIZ_CAPTURA=captura.ndjson QUIZ_CAPTURA_MUESTREO=0.1 uv run python app.py
+
+    # Qué hay en la captura (temas, partidas abandonadas, pausas...)
+    uv run python captura.py resumen captura.ndjson
+
+    # Servidores de prueba, y reproducción contra cada uno
+    QUIZ_REPRODUCCION=1 uv run python app.py              # :5000, versión actual
+    uv run python captura.py reproducir captura.ndjson --url http://127.0.0.1:5000 \\
+        --url http://127.0.0.1:5001 --velocidad 4 --salida comparacion.json
+
+    # O cada una por separado y comparar después
+    uv run python captura.py reproducir captura.ndjson --url ... --salida antes.json
+    uv run python captura.py comparar antes.json despues.json
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import heapq
+import hmac
+import http.client
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from flask import g, request, session
+
+from mazo import PREGUNTAS_POR_PARTIDA
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MUESTREO_POR_DEFECTO = 1.0
+
+# Endpoint de Flask -> código de ruta en la captura
+RUTAS = {
+    'obtener_temas': 't',
+    'iniciar_juego': 'j',
+    'responder': 'r',
+    'obtener_estadisticas': 'e',
+}
+
+# Código de ruta -> (método, ruta) para reproducirla
+PETICIONES = {
+    't': ('GET', '/api/temas'),
+    'j': ('POST', '/api/jugar'),
+    'r': ('POST', '/api/responder'),
+    'e': ('GET', '/api/estadisticas'),
+}
+
+RESPUESTAS = {'a', 'b', 'c'}
+MAX_TEMA = 64                 # Caracteres del tema que se guardan como mucho
+CABECERA_SEMILLA = 'X-Quiz-Semilla'
+
+HILOS_POR_DEFECTO = 64        # Peticiones simultáneas del reproductor
+TIEMPO_ESPERA = 10.0          # Segundos por petición antes de darla por fallida
+
+_logger = logging.getLogger('quiz.captura')
+_logger.propagate = False
+_escuchador = None
+_manejador = None
+_config = {'muestreo': MUESTREO_POR_DEFECTO, 'sal': b''}
+
+
+# =============================================================================
+# CAPTURA (dentro del servidor)
+# =============================================================================
+
+def _cliente(jugador):
+    """Seudónimo estable del jugador durante esta captura (None si no hay)."""
+    if not jugador:
+        return None
+    return hmac.new(_config['sal'], jugador.encode(), 'sha256').hexdigest()[:12]
+
+
+def _muestreado(cliente):
+    if _config['muestreo'] >= 1:
+        return True
+    if cliente is None:
+        return random.random() < _config['muestreo']
+    # Por jugador: la misma decisión para todas sus peticiones
+    return int(cliente[:8], 16) < _config['muestreo'] * 0x1_0000_0000
+
+
+def _argumento(ruta, estado):
+    """Lo único que se guarda del cuerpo de la petición, ya limpio."""
+    if ruta not in ('j', 'r'):
+        return None
+    datos = request.get_json(silent=True)
+    datos = datos if isinstance(datos, dict) else {}
+    if ruta == 'j':
+        tema = datos.get('tema', 'todos')
+        # Un tema que no existe puede ser cualquier cosa que escribió alguien
+        return tema[:MAX_TEMA] if estado == 200 and isinstance(tema, str) else '?'
+    respuesta = datos.get('respuesta')
+    return respuesta if respuesta in RESPUESTAS else 'x'
+
+
+def _empezar():
+    if request.endpoint in RUTAS:
+        g._inicio_captura = time.perf_counter()
+
+
+def _apuntar(response):
+    inicio = g.pop('_inicio_captura', None)
+    if inicio is None:
+        return response
+    ms = (time.perf_counter() - inicio) * 1000
+    cliente = _cliente(session.get('jugador'))
+    if _muestreado(cliente):
+        ruta = RUTAS[request.endpoint]
+        linea = [round(time.time() * 1000), cliente, ruta,
+                 _argumento(ruta, response.status_code), response.status_code, round(ms, 2)]
+        _logger.info(json.dumps(linea, ensure_ascii=False, separators=(',', ':')))
+    return response
+
+
+def instalar(app, ruta, muestreo=MUESTREO_POR_DEFECTO):
+    """
+    Activa la captura en una aplicación Flask.
+
+    Args:
+        app (Flask): La aplicación
+        ruta (str): Archivo NDJSON donde se escribe la captura (se añade al final)
+        muestreo (float): Fracción de jugadores capturados (0-1)
+    """
+    global _escuchador, _manejador
+
+    _config['muestreo'] = muestreo
+    # Antes de fork(): todos los trabajadores dan el mismo seudónimo al
+    # mismo jugador, aunque sus peticiones caigan en procesos distintos
+    _config['sal'] = secrets.token_bytes(16)
+
+    if _escuchador is None:
+        cola = queue.SimpleQueue()
+        archivo = logging.FileHandler(ruta, encoding='utf-8')
+        archivo.setFormatter(logging.Formatter('%(message)s'))
+        _manejador = logging.handlers.QueueHandler(cola)
+        _logger.addHandler(_manejador)
+        _logger.setLevel(logging.INFO)
+        _escuchador = logging.handlers.QueueListener(cola, archivo)
+        _escuchador.start()
+
+    app.before_request(_empezar)
+    app.after_request(_apuntar)
+
+
+def tras_fork():
+    """Vuelve a arrancar el hilo escritor en un trabajador (ver trazas.tras_fork)."""
+    global _escuchador
+    if _escuchador is not None:
+        _escuchador = logging.handlers.QueueListener(_escuchador.queue, *_escuchador.handlers)
+        _escuchador.start()
+
+
+def detener():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _escuchador, _manejador
+    if _escuchador is not None:
+        _logger.removeHandler(_manejador)
+        _escuchador.stop()
+        for manejador in _escuchador.handlers:
+            manejador.close()
+        _escuchador = _manejador = None
+
+
+def generador(cabeceras):
+    """
+    Generador aleatorio para elegir el mazo de /api/jugar.
+
+    Solo se llama con QUIZ_REPRODUCCION=1: si la petición trae la cabecera
+    X-Quiz-Semilla, un random.Random con esa semilla (el mismo mazo en
+    cualquier versión del servidor); si no, el módulo random de siempre.
+    """
+    semilla = cabeceras.get(CABECERA_SEMILLA)
+    return random.Random(semilla) if semilla else random
+
+
+# =============================================================================
+# LECTURA DE UNA CAPTURA
+# =============================================================================
+
+def leer(ruta):
+    """
+    Lee una captura y la ordena por instante (con varios trabajadores las
+    líneas pueden llegar algo desordenadas). Se saltan las líneas rotas.
+
+    Returns:
+        list: [instante_ms, cliente, ruta, argumento, estado, ms] por petición
+    """
+    eventos = []
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue
+            if isinstance(evento, list) and len(evento) == 6 and evento[2] in PETICIONES:
+                eventos.append(evento)
+    eventos.sort(key=lambda evento: evento[0])
+    return eventos
+
+
+def secuencias(eventos):
+    """
+    Agrupa las peticiones por jugador.
+
+    Las peticiones sin cliente (navegadores que aún no han jugado) son
+    cada una un jugador de una sola petición.
+
+    Returns:
+        list: Una lista por jugador de (segundos desde el principio, ruta,
+              argumento, estado capturado), en orden
+    """
+    if not eventos:
+        return []
+    origen = eventos[0][0]
+    por_cliente = {}
+    sueltas = []
+    for instante, cliente, ruta, argumento, estado, _ms in eventos:
+        paso = ((instante - origen) / 1000, ruta, argumento, estado)
+        if cliente is None:
+            sueltas.append([paso])
+        else:
+            por_cliente.setdefault(cliente, []).append(paso)
+    return list(por_cliente.values()) + sueltas
+
+
+def _percentil(valores, q):
+    """Percentil q (0-100) de una lista YA ORDENADA (None si está vacía)."""
+    if not valores:
+        return None
+    return round(valores[int(q / 100 * (len(valores) - 1))], 2)
+
+
+def resumen(eventos):
+    """
+    Qué hay en una captura: lo que los benchmarks sintéticos no tienen.
+
+    Returns:
+        dict: Peticiones por ruta, temas, partidas abandonadas, pausas entre
+              peticiones del mismo jugador y latencias capturadas
+    """
+    grupos = secuencias(eventos)
+    temas = Counter()
+    partidas = abandonadas = 0
+    pausas = []
+    for pasos in grupos:
+        respondidas = None
+        for anterior, paso in zip([None] + pasos, pasos):
+            if anterior is not None:
+                pausas.append(paso[0] - anterior[0])
+            if paso[1] == 'j' and paso[3] == 200:
+                if respondidas is not None and respondidas < PREGUNTAS_POR_PARTIDA:
+                    abandonadas += 1
+                partidas += 1
+                respondidas = 0
+                temas[paso[2]] += 1
+            elif paso[1] == 'r' and respondidas is not None:
+                respondidas += 1
+        if respondidas is not None and respondidas < PREGUNTAS_POR_PARTIDA:
+            abandonadas += 1
+    latencias = {}
+    for ruta, (_metodo, camino) in PETICIONES.items():
+        tiempos = sorted(evento[5] for evento in eventos if evento[2] == ruta)
+        latencias[camino] = {'n': len(tiempos), 'p50_ms': _percentil(tiempos, 50),
+                             'p95_ms': _percentil(tiempos, 95)}
+    pausas.sort()
+    return {
+        'peticiones': len(eventos),
+        'jugadores': len({evento[1] for evento in eventos if evento[1] is not None}),
+        'duracion_s': round((eventos[-1][0] - eventos[0][0]) / 1000, 1) if eventos else 0,
+        'partidas': partidas,
+        'abandonadas': abandonadas,
+        'temas': dict(temas.most_common()),
+        'pausa_p50_s': _percentil(pausas, 50),
+        'pausa_p95_s': _percentil(pausas, 95),
+        'latencias_capturadas': latencias,
+    }
+
+
+# =============================================================================
+# REPRODUCCIÓN
+# =============================================================================
+
+class Reproduccion:
+    """
+    Reproduce las secuencias de una captura contra un servidor.
+
+    Un planificador (el hilo que llama a ejecutar()) lanza cada petición en
+    su instante a un grupo de `hilos` hilos. La siguiente petición de un
+    jugador solo se planifica cuando ha terminado la anterior: si el
+    servidor va lento, el jugador la envía en cuanto puede (como haría el
+    navegador). El "retraso" mide cuánto tarde salen las peticiones por
+    falta de hilos en el reproductor: si es alto, el que no da abasto es
+    el reproductor, no el servidor.
+
+    Args:
+        url (str): Servidor, por ejemplo 'http://127.0.0.1:5000'
+        grupos (list): Resultado de secuencias()
+        velocidad (float): 1 = ritmo original, 4 = cuatro veces más rápido,
+            0 = sin pausas (cada jugador encadena sus peticiones)
+        semilla: Semilla de los mazos (ver generador())
+        hilos (int): Peticiones simultáneas como máximo
+    """
+
+    def __init__(self, url, grupos, velocidad=1.0, semilla=0, hilos=HILOS_POR_DEFECTO):
+        partes = urlsplit(url)
+        self.url = url
+        self._clase = (http.client.HTTPSConnection if partes.scheme == 'https'
+                       else http.client.HTTPConnection)
+        self._host = partes.netloc
+        self._prefijo = partes.path.rstrip('/')
+        self.grupos = grupos
+        self.velocidad = velocidad
+        self.semilla = semilla
+        self.hilos = hilos
+        self._cookies = [None] * len(grupos)
+        self._partidas = [0] * len(grupos)
+        self._cerrojo = threading.Condition()
+        self._pendientes = []        # Montículo de (vence, jugador, paso)
+        self._en_curso = 0
+        self._medidas = []           # (ruta, ms, estado, estado capturado, retraso_ms)
+
+    def _vence(self, instante):
+        return instante / self.velocidad if self.velocidad else 0.0
+
+    def ejecutar(self):
+        """Reproduce todo y devuelve el informe (ver _informe())."""
+        for jugador, pasos in enumerate(self.grupos):
+            self._pendientes.append((self._vence(pasos[0][0]), jugador, 0))
+        heapq.heapify(self._pendientes)
+
+        self._origen = time.perf_counter()
+        with ThreadPoolExecutor(self.hilos, thread_name_prefix='reproduccion') as grupo:
+            with self._cerrojo:
+                while self._pendientes or self._en_curso:
+                    if not self._pendientes or self._en_curso >= self.hilos:
+                        self._cerrojo.wait()
+                        continue
+                    vence, jugador, paso = self._pendientes[0]
+                    falta = vence - (time.perf_counter() - self._origen)
+                    if falta > 0:
+                        self._cerrojo.wait(falta)
+                        continue
+                    heapq.heappop(self._pendientes)
+                    self._en_curso += 1
+                    grupo.submit(self._paso, jugador, paso, vence)
+        return self._informe(time.perf_counter() - self._origen)
+
+    def _paso(self, jugador, paso, vence):
+        instante, ruta, argumento, capturado = self.grupos[jugador][paso]
+        retraso = (time.perf_counter() - self._origen - vence) * 1000
+        inicio = time.perf_counter()
+        try:
+            estado = self._peticion(jugador, ruta, argumento)
+        except Exception:   # Cuenta como error, pero la reproducción sigue
+            estado = None
+        ms = (time.perf_counter() - inicio) * 1000
+
+        with self._cerrojo:
+            self._medidas.append((ruta, ms, estado, capturado, retraso))
+            siguiente = paso + 1
+            if siguiente < len(self.grupos[jugador]):
+                ahora = time.perf_counter() - self._origen
+                vence = max(self._vence(self.grupos[jugador][siguiente][0]), ahora)
+                heapq.heappush(self._pendientes, (vence, jugador, siguiente))
+            self._en_curso -= 1
+            self._cerrojo.notify()
+
+    def _peticion(self, jugador, ruta, argumento):
+        metodo, camino = PETICIONES[ruta]
+        cabeceras = {}
+        cuerpo = None
+        if ruta == 'j':
+            cuerpo = {'tema': argumento}
+            self._partidas[jugador] += 1
+            cabeceras[CABECERA_SEMILLA] = f'{self.semilla}:{jugador}:{self._partidas[jugador]}'
+        elif ruta == 'r':
+            cuerpo = {'respuesta': argumento}
+        if cuerpo is not None:
+            cuerpo = json.dumps(cuerpo).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/json'
+        if self._cookies[jugador]:
+            cabeceras['Cookie'] = self._cookies[jugador]
+
+        conexion = self._clase(self._host, timeout=TIEMPO_ESPERA)
+        try:
+            conexion.request(metodo, self._prefijo + camino, body=cuerpo, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            cookie = respuesta.getheader('Set-Cookie')
+            if cookie:
+                self._cookies[jugador] = cookie.split(';', 1)[0]
+            return respuesta.status
+        finally:
+            conexion.close()
+
+    def _informe(self, duracion):
+        rutas = {}
+        for ruta, (_metodo, camino) in PETICIONES.items():
+            tiempos = sorted(medida[1] for medida in self._medidas if medida[0] == ruta)
+            if tiempos:
+                rutas[camino] = {
+                    'n': len(tiempos),
+                    'p50_ms': _percentil(tiempos, 50),
+                    'p95_ms': _percentil(tiempos, 95),
+                    'p99_ms': _percentil(tiempos, 99),
+                    'max_ms': round(tiempos[-1], 2),
+                }
+        retrasos = sorted(medida[4] for medida in self._medidas)
+        return {
+            'url': self.url,
+            'velocidad': self.velocidad,
+            'semilla': self.semilla,
+            'peticiones': len(self._medidas),
+            'duracion_s': round(duracion, 2),
+            'peticiones_por_segundo': round(len(self._medidas) / duracion, 1) if duracion else None,
+            'errores': sum(1 for medida in self._medidas if medida[2] is None or medida[2] >= 500),
+            # Estado distinto del capturado (p. ej. 404 donde hubo 200): el
+            # servidor no tiene los mismos datos que producción
+            'estados_distintos': sum(1 for medida in self._medidas
+                                     if medida[2] is not None and medida[2] != medida[3]),
+            'retraso_p95_ms': _percentil(retrasos, 95),
+            'rutas': rutas,
+        }
+
+
+def _cambio(antes, despues):
+    if antes is None or despues is None:
+        return None
+    return {'antes': antes, 'despues': despues,
+            'cambio_pct': round((despues - antes) / antes * 100, 1) if antes else None}
+
+
+def comparar(antes, despues):
+    """
+    Diferencias entre dos informes de Reproduccion.ejecutar().
+
+    cambio_pct > 0 en latencias es peor; en peticiones por segundo, mejor.
+    """
+    rutas = {}
+    for camino in sorted(set(antes['rutas']) | set(despues['rutas'])):
+        a = antes['rutas'].get(camino, {})
+        b = despues['rutas'].get(camino, {})
+        rutas[camino] = {clave: _cambio(a.get(clave), b.get(clave))
+                         for clave in ('p50_ms', 'p95_ms', 'p99_ms')}
+    return {
+        'antes': antes['url'],
+        'despues': despues['url'],
+        'peticiones_por_segundo': _cambio(antes['peticiones_por_segundo'],
+                                          despues['peticiones_por_segundo']),
+        'errores': _cambio(antes['errores'], despues['errores']),
+        'rutas': rutas,
+    }
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Captura y reproducción de tráfico real.')
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+
+    orden = ordenes.add_parser('resumen', help='Qué hay en una captura')
+    orden.add_argument('captura')
+
+    orden = ordenes.add_parser('reproducir', help='Reproduce una captura contra uno o más servidores')
+    orden.add_argument('captura')
+    orden.add_argument('--url', action='append', required=True,
+                       help='Servidor (repetible: se reproducen uno tras otro y se comparan)')
+    orden.add_argument('--velocidad', type=float, default=1.0,
+                       help='1 = ritmo original, 4 = cuatro veces más rápido, 0 = sin pausas')
+    orden.add_argument('--semilla', default='0', help='Semilla de los mazos')
+    orden.add_argument('--hilos', type=int, default=HILOS_POR_DEFECTO)
+    orden.add_argument('--salida', default=None, help='Archivo JSON de salida')
+
+    orden = ordenes.add_parser('comparar', help='Compara dos informes de reproducir')
+    orden.add_argument('antes')
+    orden.add_argument('despues')
+    args = parser.parse_args()
+
+    if args.orden == 'resumen':
+        resultado = resumen(leer(args.captura))
+    elif args.orden == 'comparar':
+        resultado = comparar(json.loads(Path(args.antes).read_text(encoding='utf-8')),
+                             json.loads(Path(args.despues).read_text(encoding='utf-8')))
+    else:
+        grupos = secuencias(leer(args.captura))
+        informes = []
+        for url in args.url:
+            print(f"▶️  Reproduciendo {len(grupos)} jugadores contra {url}...", file=sys.stderr)
+            informes.append(Reproduccion(url, grupos, args.velocidad, args.semilla,
+                                         args.hilos).ejecutar())
+        if len(informes) == 1:
+            resultado = informes[0]      # Listo para `comparar` más adelante
+        else:
+            resultado = {'informes': informes,
+                         'comparaciones': [comparar(informes[0], informe)
+                                           for informe in informes[1:]]}
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if getattr(args, 'salida', None):
+        Path(args.salida).write_text(texto, encoding='utf-8')
+        print(f"✅ Resultado guardado en {args.salida}", file=sys.stderr)
+    else:
+        print(texto)
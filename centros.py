@@ -0,0 +1,414 @@
+"""
+centros.py - Un catálogo de preguntas por centro
+================================================
+
+Varios centros (colegios, institutos) comparten el mismo servidor, pero
+cada uno tiene su banco de preguntas privado y sus propias partidas. Cada
+centro es un fichero SQLite aparte, centros/<nombre>.db, con el mismo
+esquema que quiz.db.
+
+¿CÓMO SE ELIGE EL CENTRO?
+-------------------------
+En cada petición, por este orden:
+  1. La cabecera X-Quiz-Centro: ies-norte
+  2. El subdominio: ies-norte.quiz.example.com (con QUIZ_DOMINIO=quiz.example.com)
+
+Sin centro, la petición usa el catálogo principal (quiz.db o PostgreSQL),
+como siempre. Un centro sin fichero da 404: los centros se crean desde la
+línea de órdenes, no en el primer acceso (cualquiera puede inventarse un
+subdominio, y cada uno sería un fichero nuevo en el disco).
+
+El centro elegido se guarda en una ContextVar (ver usar_en_peticion() en
+almacenamiento.py), así que get_almacen() devuelve el almacén del centro
+sin que juego.py, mazo.py o examen.py sepan nada de centros.
+
+¿QUÉ SE GUARDA DE CADA CENTRO ABIERTO?
+--------------------------------------
+Un AlmacenCentro: el AlmacenSQLite de su fichero, ya inicializado (init_db
+se ejecuta una vez al abrirlo, no en cada petición), con:
+  - hasta MAX_LIBRES conexiones abiertas para reutilizar
+  - su caché de ids por tema (la de mazo.py) y, si alguien los consulta,
+    su caché de analítica (analitica.py) y sus histogramas de puntuación
+    (bocetos.py), que se guardan en su fichero al cerrarlo
+
+Con miles de centros no pueden estar todos abiertos: los abiertos forman
+una LRU de como mucho MAX_ABIERTOS. Al abrir uno más se cierra el que lleva
+más tiempo sin usarse, y los que llevan INACTIVIDAD segundos sin peticiones
+los cierra un hilo de barrido cada INACTIVIDAD / 4 segundos, aunque no
+llegue ninguna petición más. El hilo lo arranca el primer abrir() de cada
+proceso, así que con servidor.py nace ya en el trabajador, después del
+fork() (un hilo no sobrevive al fork()). Así quedan acotados los ficheros
+abiertos (MAX_ABIERTOS * MAX_LIBRES conexiones, más las que estén en uso
+en ese momento) y la memoria de las cachés de cada centro.
+
+Si se cierra un centro mientras una petición usa una de sus conexiones,
+esa conexión se cierra al devolverla en lugar de volver a la lista.
+
+CÓMO USARLO:
+------------
+    uv run python centros.py crear ies-norte              # Catálogo vacío
+    uv run python centros.py crear ies-sur --ejemplo      # Con las de preguntas.py
+    uv run python centros.py listar
+
+    QUIZ_CENTROS=1 QUIZ_DOMINIO=quiz.example.com uv run python app.py
+    curl -H 'X-Quiz-Centro: ies-sur' http://127.0.0.1:5000/api/temas
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from flask import g, jsonify, request
+
+import memoria
+from almacenamiento import AlmacenSQLite, dejar_peticion, usar_en_peticion
+from database import get_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DIR_CENTROS = Path(__file__).parent / 'centros'
+MAX_ABIERTOS = 256       # Centros abiertos a la vez en cada proceso
+MAX_LIBRES = 2           # Conexiones guardadas por centro para reutilizarlas
+INACTIVIDAD = 300.0      # Segundos sin peticiones antes de cerrar un centro
+
+CABECERA = 'X-Quiz-Centro'
+
+# Una etiqueta de DNS: letras minúsculas, dígitos y guiones. Como el nombre
+# acaba siendo un nombre de fichero, nada de puntos ni barras.
+NOMBRE_VALIDO = re.compile(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?')
+
+
+# =============================================================================
+# ALMACÉN DE UN CENTRO
+# =============================================================================
+
+class AlmacenCentro(AlmacenSQLite):
+    """
+    AlmacenSQLite de un centro que reutiliza sus conexiones.
+
+    En lugar de cerrarlas, las operaciones las devuelven con _soltar()
+    y se guardan (hasta max_libres) para la siguiente.
+    """
+
+    def __init__(self, nombre, ruta, max_libres=MAX_LIBRES):
+        super().__init__(ruta)
+        self.centro = nombre
+        self.max_libres = max_libres
+        self.usado = time.monotonic()
+        self.ids_por_tema = {}       # Caché de mazo.py de este centro
+        self.analitica = None        # Caché de analitica.py (se crea al consultarla)
+        self.bocetos = None          # Histogramas de bocetos.py (se crean al usarlos)
+        self._libres = []
+        self._cerrado = False
+        self._cerrojo = threading.Lock()
+
+    def _conexion(self):
+        with self._cerrojo:
+            if self._libres:
+                return self._libres.pop()
+        return get_db(self.ruta, entre_hilos=True)
+
+    _lectura = _conexion
+
+    def _soltar(self, conn):
+        # Lo que cambian algunas operaciones (ver AlmacenSQLite) se deja como
+        # lo dejó get_db() antes de prestar la conexión a otra
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        conn.isolation_level = ''
+        with self._cerrojo:
+            if not self._cerrado and len(self._libres) < self.max_libres:
+                self._libres.append(conn)
+                return
+        conn.close()
+
+    def cerrar(self):
+        with self._cerrojo:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+        for conn in libres:
+            conn.close()
+        # Las partidas aún sin guardar en los histogramas van a su fichero
+        if self.bocetos is not None:
+            self.bocetos.guardar(releer=False)
+
+    def libres(self):
+        with self._cerrojo:
+            return len(self._libres)
+
+
+# =============================================================================
+# CENTROS ABIERTOS (LRU)
+# =============================================================================
+
+class Centros:
+    """
+    Los centros abiertos de este proceso, del menos al más recientemente
+    usado. Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, directorio=DIR_CENTROS, max_abiertos=MAX_ABIERTOS,
+                 inactividad=INACTIVIDAD, max_libres=MAX_LIBRES):
+        self.directorio = Path(directorio)
+        self.max_abiertos = max_abiertos
+        self.inactividad = inactividad
+        self.max_libres = max_libres
+        self._abiertos = OrderedDict()      # nombre -> AlmacenCentro
+        self._cerrojo = threading.Lock()
+        self._pid_barrido = None            # Proceso en el que corre el hilo de barrido
+        self._parar_barrido = threading.Event()
+        self._contadores = {
+            'aciertos': 0,          # Peticiones con el centro ya abierto
+            'aperturas': 0,         # Centros abiertos (init_db incluido)
+            'desconocidos': 0,      # Peticiones de centros sin fichero
+            'expulsados': 0,        # Cerrados por superar max_abiertos
+            'inactivos': 0,         # Cerrados por llevar `inactividad` sin uso
+        }
+        memoria.registrar('preguntas', 'centros.ids_por_tema', self._bytes_ids)
+        memoria.registrar('analitica', 'centros.analitica', self._bytes_analitica)
+
+    def ruta(self, nombre):
+        """Fichero del centro (ValueError si el nombre no es válido)."""
+        if not NOMBRE_VALIDO.fullmatch(nombre):
+            raise ValueError(f'Nombre de centro no válido: {nombre!r}')
+        return self.directorio / f'{nombre}.db'
+
+    def abrir(self, nombre):
+        """
+        El almacén del centro, abriéndolo si hace falta.
+
+        Returns:
+            AlmacenCentro, o None si el centro no existe
+
+        Raises:
+            ValueError: Si el nombre no es válido
+        """
+        ruta = self.ruta(nombre)
+        if self._pid_barrido != os.getpid():
+            self.iniciar_barrido()
+        ahora = time.monotonic()
+        cerrar = []
+        with self._cerrojo:
+            almacen = self._abiertos.get(nombre)
+            if almacen is not None:
+                self._abiertos.move_to_end(nombre)
+                almacen.usado = ahora
+                self._contadores['aciertos'] += 1
+
+        if almacen is None:
+            almacen = self._abrir_nuevo(nombre, ruta, ahora, cerrar)
+
+        for viejo in cerrar:
+            viejo.cerrar()
+        return almacen
+
+    def _abrir_nuevo(self, nombre, ruta, ahora, cerrar):
+        if not ruta.exists():
+            with self._cerrojo:
+                self._contadores['desconocidos'] += 1
+            return None
+        # init_db() fuera del cerrojo: los demás centros no tienen que esperar
+        nuevo = AlmacenCentro(nombre, ruta, self.max_libres)
+        nuevo.inicializar()
+        with self._cerrojo:
+            almacen = self._abiertos.get(nombre)
+            if almacen is None:
+                almacen = self._abiertos[nombre] = nuevo
+                self._contadores['aperturas'] += 1
+                while len(self._abiertos) > self.max_abiertos:
+                    _, expulsado = self._abiertos.popitem(last=False)
+                    cerrar.append(expulsado)
+                    self._contadores['expulsados'] += 1
+            else:
+                cerrar.append(nuevo)        # Otro hilo lo abrió a la vez
+                self._abiertos.move_to_end(nombre)
+            almacen.usado = ahora
+        return almacen
+
+    def _sacar_inactivos(self, ahora):
+        """Saca (sin cerrarlos) los centros sin uso. Con el cerrojo cogido."""
+        sacados = []
+        # Están por orden de uso: basta con mirar desde el principio
+        while self._abiertos:
+            nombre, almacen = next(iter(self._abiertos.items()))
+            if ahora - almacen.usado < self.inactividad:
+                break
+            del self._abiertos[nombre]
+            sacados.append(almacen)
+        self._contadores['inactivos'] += len(sacados)
+        return sacados
+
+    def barrer(self):
+        """Cierra ya los centros que llevan `inactividad` segundos sin uso."""
+        with self._cerrojo:
+            sacados = self._sacar_inactivos(time.monotonic())
+        for almacen in sacados:
+            almacen.cerrar()
+        return len(sacados)
+
+    def iniciar_barrido(self):
+        """
+        Arranca el hilo que llama a barrer() cada `inactividad / 4` segundos.
+
+        Uno por proceso: si ya corre en este, no hace nada. Lo llama abrir(),
+        así que no hace falta llamarlo a mano.
+        """
+        with self._cerrojo:
+            if self._pid_barrido == os.getpid():
+                return
+            self._pid_barrido = os.getpid()
+            self._parar_barrido.clear()
+        threading.Thread(target=self._barrer_periodicamente, name='centros-barrido',
+                         daemon=True).start()
+
+    def _barrer_periodicamente(self):
+        while not self._parar_barrido.wait(self.inactividad / 4):
+            self.barrer()
+
+    def cerrar_todos(self):
+        self._parar_barrido.set()
+        with self._cerrojo:
+            self._pid_barrido = None        # El siguiente abrir() lo vuelve a arrancar
+            abiertos = list(self._abiertos.values())
+            self._abiertos.clear()
+        for almacen in abiertos:
+            almacen.cerrar()
+
+    def crear(self, nombre, ejemplo=False):
+        """
+        Crea el fichero de un centro (o completa su esquema si ya existe).
+
+        Args:
+            ejemplo (bool): Cargar las preguntas de preguntas.py si el
+                catálogo está vacío
+
+        Returns:
+            Path: Ruta del fichero
+        """
+        ruta = self.ruta(nombre)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        almacen = AlmacenSQLite(ruta)
+        if almacen.inicializar() and ejemplo:
+            almacen.cargar_catalogo()
+        return ruta
+
+    def listar(self):
+        """Nombres de los centros que tienen fichero, por orden alfabético."""
+        return sorted(ruta.stem for ruta in self.directorio.glob('*.db')
+                      if NOMBRE_VALIDO.fullmatch(ruta.stem))
+
+    def contadores(self):
+        with self._cerrojo:
+            abiertos = list(self._abiertos.values())
+            datos = dict(self._contadores)
+        datos['abiertos'] = len(abiertos)
+        datos['conexiones_libres'] = sum(almacen.libres() for almacen in abiertos)
+        return datos
+
+    def _bytes_ids(self):
+        with self._cerrojo:
+            cachés = [almacen.ids_por_tema for almacen in self._abiertos.values()]
+        return memoria.tamano(cachés)
+
+    def _bytes_analitica(self):
+        with self._cerrojo:
+            cachés = [almacen.analitica for almacen in self._abiertos.values()]
+        return sum(cache.bytes() for cache in cachés if cache is not None)
+
+
+# =============================================================================
+# ELECCIÓN DEL CENTRO EN CADA PETICIÓN
+# =============================================================================
+
+def nombre_peticion(cabeceras, dominio=None):
+    """
+    Nombre del centro de una petición: la cabecera X-Quiz-Centro o el
+    subdominio de `dominio` en Host. None si no es de ningún centro.
+
+    Args:
+        cabeceras: Cabeceras de la petición (se busca sin distinguir
+            mayúsculas, como en Flask)
+        dominio (str): Dominio principal, por ejemplo 'quiz.example.com'
+    """
+    nombre = cabeceras.get(CABECERA)
+    if nombre:
+        return nombre.strip().lower()
+    if not dominio:
+        return None
+    host = (cabeceras.get('Host') or '').split(':')[0].lower()
+    if host.endswith('.' + dominio):
+        return host[:-len(dominio) - 1]
+    return None
+
+
+def instalar(app, centros, dominio=None):
+    """Elige el almacén del centro al empezar cada petición y lo deja al acabar."""
+
+    @app.before_request
+    def _elegir_centro():
+        nombre = nombre_peticion(request.headers, dominio)
+        if nombre is None:
+            return None
+        try:
+            almacen = centros.abrir(nombre)
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+        if almacen is None:
+            return jsonify({'error': f'Centro desconocido: {nombre}'}), 404
+        g._testigo_centro = usar_en_peticion(almacen)
+        return None
+
+    @app.teardown_request
+    def _dejar_centro(_error=None):
+        testigo = g.pop('_testigo_centro', None)
+        if testigo is not None:
+            dejar_peticion(testigo)
+
+
+def desde_entorno():
+    """Crea los Centros con la configuración de las variables de entorno."""
+    return Centros(
+        directorio=os.environ.get('QUIZ_CENTROS_DIR', DIR_CENTROS),
+        max_abiertos=int(os.environ.get('QUIZ_CENTROS_MAX', MAX_ABIERTOS)),
+        inactividad=float(os.environ.get('QUIZ_CENTROS_INACTIVIDAD', INACTIVIDAD)),
+        max_libres=int(os.environ.get('QUIZ_CENTROS_LIBRES', MAX_LIBRES)),
+    )
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Catálogos de preguntas por centro.')
+    parser.add_argument('--dir', default=os.environ.get('QUIZ_CENTROS_DIR', DIR_CENTROS),
+                        help='Carpeta de los ficheros de los centros')
+    ordenes = parser.add_subparsers(dest='orden', required=True)
+    crear = ordenes.add_parser('crear', help='Crea el fichero de uno o más centros')
+    crear.add_argument('nombres', nargs='+')
+    crear.add_argument('--ejemplo', action='store_true',
+                       help='Cargar las preguntas de preguntas.py')
+    ordenes.add_parser('listar', help='Lista los centros que existen')
+    args = parser.parse_args()
+
+    registro = Centros(args.dir)
+    if args.orden == 'crear':
+        for nombre in args.nombres:
+            try:
+                print(f"✅ {registro.crear(nombre, args.ejemplo)}")
+            except ValueError as error:
+                parser.error(str(error))
+    else:
+        for nombre in registro.listar():
+            print(nombre)
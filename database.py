@@ -29,7 +29,11 @@ Autor: Profesor de SAA
 Fecha: 2025
 """
 
+import functools
 import sqlite3
+import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 # =============================================================================
@@ -42,12 +46,255 @@ from pathlib import Path
 # / "quiz.db" -> añade el nombre del archivo de base de datos
 DB_PATH = Path(__file__).parent / "quiz.db"
 
+_ESTE_ARCHIVO = Path(__file__)
+_DIRECTORIO = _ESTE_ARCHIVO.parent
+
+# Tablas que forman el "catálogo" de preguntas: se leen mucho y cambian poco.
+# (estadisticas NO es catálogo: recibe una fila por cada partida)
+TABLAS_CATALOGO = ('temas', 'preguntas')
+
+# Triggers que suben la versión del catálogo, (nombre, CREATE TRIGGER): los
+# crea init_db() y carga_catalogo() los quita y los repone
+TRIGGERS_VERSION = [
+    (f'{tabla}_{operacion.lower()}_version', f'''
+        CREATE TRIGGER IF NOT EXISTS {tabla}_{operacion.lower()}_version
+        AFTER {operacion} ON {tabla}
+        BEGIN
+            UPDATE catalogo_version SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+    for tabla in TABLAS_CATALOGO
+    for operacion in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+
+# =============================================================================
+# REGISTRO COMPACTO DE PREGUNTAS
+# =============================================================================
+# Cada partida carga 10 preguntas y cada examen o mazo sin conexión unas
+# cuantas más. Con sqlite3.Row (o un dict por fila) cada pregunta lleva
+# encima un diccionario o la descripción de columnas del cursor; con
+# __slots__ solo ocupa los 8 huecos de sus campos. Ver benchmark_preguntas.py.
+
+# Columnas de la tabla preguntas, en el orden de los campos de Pregunta
+CAMPOS_PREGUNTA = ('id', 'tema_id', 'pregunta', 'opcion_a', 'opcion_b', 'opcion_c',
+                   'respuesta_correcta', 'explicacion')
+COLUMNAS_PREGUNTA = ', '.join(CAMPOS_PREGUNTA)
+
+# tema_id -> el mismo objeto int para todas las preguntas del tema. CPython
+# solo comparte los enteros de -5 a 256: con ids de tema mayores (bases
+# sintéticas, PostgreSQL) cada fila leída crearía su propio int (28 bytes).
+# Tiene una entrada por tema, así que no crece con las preguntas.
+_temas_internados = {}
+
+
+class Pregunta:
+    """
+    Una fila de la tabla preguntas, sin diccionario por instancia.
+
+    Se lee por atributo (pregunta.opcion_a). Para guardarla en la sesión
+    (JSON en una cookie) se usa a_sesion(), una lista sin los nombres de
+    las columnas, y desde_sesion() para reconstruirla.
+    """
+
+    __slots__ = CAMPOS_PREGUNTA
+
+    def __init__(self, id, tema_id, pregunta, opcion_a, opcion_b, opcion_c,
+                 respuesta_correcta, explicacion):
+        self.id = id
+        self.tema_id = _temas_internados.setdefault(tema_id, tema_id)
+        self.pregunta = pregunta
+        self.opcion_a = opcion_a
+        self.opcion_b = opcion_b
+        self.opcion_c = opcion_c
+        self.respuesta_correcta = respuesta_correcta
+        self.explicacion = explicacion
+
+    @classmethod
+    def de_cursor(cls, cursor, fila):
+        """row_factory de sqlite3: la fila llega como tupla en el orden del SELECT."""
+        return cls(*fila)
+
+    @classmethod
+    def desde_sesion(cls, valor):
+        """
+        Reconstruye una pregunta guardada con a_sesion().
+
+        También acepta el dict que guardaban las versiones anteriores, para
+        no romper las partidas a medias de las cookies ya emitidas.
+        """
+        if isinstance(valor, dict):
+            return cls(**{campo: valor.get(campo) for campo in CAMPOS_PREGUNTA})
+        return cls(*valor)
+
+    def a_sesion(self):
+        """Lista [id, tema_id, pregunta, ...] en el orden de CAMPOS_PREGUNTA."""
+        return [self.id, self.tema_id, self.pregunta, self.opcion_a, self.opcion_b,
+                self.opcion_c, self.respuesta_correcta, self.explicacion]
+
+    def opciones(self):
+        return {'a': self.opcion_a, 'b': self.opcion_b, 'c': self.opcion_c}
+
+    def __eq__(self, otra):
+        if not isinstance(otra, Pregunta):
+            return NotImplemented
+        return self.a_sesion() == otra.a_sesion()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'Pregunta(id={self.id}, tema_id={self.tema_id}, pregunta={self.pregunta!r})'
+
+
+# =============================================================================
+# OBSERVADORES DE CONSULTAS
+# =============================================================================
+# Otros módulos pueden "escuchar" cada consulta SQL que se ejecuta (por
+# ejemplo trazas.py, para medir cuánto tarda cada una). Basta con añadir
+# a esta lista una función con la firma:
+#
+#     def observador(sql, inicio, duracion):  # inicio: time.perf_counter()
+#         ...
+#
+# Si la lista está vacía (lo normal), las consultas no se cronometran.
+# Con PostgreSQL (almacenamiento.AlmacenPostgres) avisa cursor_postgres().
+observadores_sql = []
+
+# Igual, pero para cada conexión que se abre (sin argumentos). Con
+# PostgreSQL, para cada conexión que se saca del pool:
+#
+#     def observador():
+#         ...
+observadores_conexion = []
+
+
+class CursorQuiz(sqlite3.Cursor):
+    """Cursor que avisa a los observadores_sql de cada consulta ejecutada."""
+
+    def execute(self, sql, parametros=()):
+        if not observadores_sql:
+            return super().execute(sql, parametros)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            _avisar(sql, inicio)
+
+    def executemany(self, sql, filas):
+        if not observadores_sql:
+            return super().executemany(sql, filas)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, filas)
+        finally:
+            _avisar(sql, inicio)
+
+
+class ConexionQuiz(sqlite3.Connection):
+    """
+    Conexión que crea cursores CursorQuiz.
+
+    conn.execute() es un atajo que en C no pasa por cursor().execute(),
+    así que también lo redirigimos aquí.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        avisar_conexion()
+
+    def cursor(self, factory=CursorQuiz):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, filas):
+        return self.cursor().executemany(sql, filas)
+
+
+@functools.lru_cache(maxsize=None)
+def cursor_postgres():
+    """
+    Clase de cursor de psycopg que avisa a los observadores_sql, como
+    CursorQuiz. La usa almacenamiento.AlmacenPostgres (cursor_factory del
+    pool); se crea al pedirla porque psycopg es opcional.
+    """
+    import psycopg
+
+    def texto(consulta, cursor):
+        # psycopg también acepta sql.Composed: el observador quiere el texto
+        return consulta if isinstance(consulta, str) else consulta.as_string(cursor)
+
+    class CursorPostgres(psycopg.Cursor):
+        def execute(self, consulta, parametros=None, **opciones):
+            if not observadores_sql:
+                return super().execute(consulta, parametros, **opciones)
+            inicio = time.perf_counter()
+            try:
+                return super().execute(consulta, parametros, **opciones)
+            finally:
+                _avisar(texto(consulta, self), inicio)
+
+        def executemany(self, consulta, filas, **opciones):
+            if not observadores_sql:
+                return super().executemany(consulta, filas, **opciones)
+            inicio = time.perf_counter()
+            try:
+                return super().executemany(consulta, filas, **opciones)
+            finally:
+                _avisar(texto(consulta, self), inicio)
+
+    return CursorPostgres
+
+
+def _avisar(sql, inicio):
+    duracion = time.perf_counter() - inicio
+    for observador in observadores_sql:
+        observador(sql, inicio, duracion)
+
+
+def avisar_conexion():
+    """Avisa a los observadores_conexion de una conexión nueva."""
+    for observador in observadores_conexion:
+        observador()
+
+
+# Funciones de este módulo que no son "quien hace la consulta" sino el camino
+# hasta SQLite (o PostgreSQL)
+_INTERNAS = {'__init__', 'cursor', 'execute', 'executemany', '_avisar', 'avisar_conexion',
+             'get_db'}
+
+
+def lugares_llamada(maximo=3):
+    """
+    Dónde se originó la consulta o conexión que se está observando.
+
+    Se llama DIRECTAMENTE desde un observador (de observadores_sql u
+    observadores_conexion). Recorre la pila de llamadas por encima del
+    observador y devuelve los primeros `maximo` marcos que son código del
+    quiz (no Flask ni la maquinaria de este módulo), del más cercano al
+    más lejano.
+
+    Returns:
+        list: ['database.py:393 obtener_id_tema', 'app.py:210 index', ...]
+    """
+    lugares = []
+    marco = sys._getframe(2)      # Saltamos el propio observador
+    while marco is not None and len(lugares) < maximo:
+        archivo = Path(marco.f_code.co_filename)
+        funcion = marco.f_code.co_name
+        interna = archivo == _ESTE_ARCHIVO and funcion in _INTERNAS
+        if archivo.parent == _DIRECTORIO and not interna:
+            lugares.append(f'{archivo.name}:{marco.f_lineno} {funcion}')
+        marco = marco.f_back
+    return lugares
+
 
 # =============================================================================
 # FUNCIONES DE CONEXIÓN
 # =============================================================================
 
-def get_db():
+def get_db(ruta=None, entre_hilos=False):
     """
     Crea y devuelve una conexión a la base de datos SQLite.
     
@@ -63,6 +310,14 @@ def get_db():
     
     Mucho más legible y menos propenso a errores.
     
+    Args:
+        ruta (Path o str, opcional): Archivo de base de datos a abrir.
+            Si no se indica se usa DB_PATH. Lo usan el generador de datos
+            sintéticos y los benchmarks para trabajar con otras bases.
+        entre_hilos (bool): Permite usar la conexión desde otro hilo distinto
+            del que la abrió (nunca a la vez). Lo necesitan las conexiones
+            que se guardan para reutilizarlas (ver centros.py).
+    
     Returns:
         sqlite3.Connection: Objeto de conexión a la base de datos
     
@@ -75,7 +330,9 @@ def get_db():
         conn.close()
     """
     # sqlite3.connect() abre el archivo. Si no existe, lo crea.
-    conn = sqlite3.connect(DB_PATH)
+    # factory=ConexionQuiz permite observar las consultas (ver arriba)
+    conn = sqlite3.connect(ruta or DB_PATH, factory=ConexionQuiz,
+                           check_same_thread=not entre_hilos)
     
     # row_factory permite acceder a las columnas por nombre
     # Ejemplo: fila['nombre'] en lugar de fila[0]
@@ -88,7 +345,7 @@ def get_db():
 # FUNCIONES DE INICIALIZACIÓN
 # =============================================================================
 
-def init_db():
+def init_db(ruta=None):
     """
     Inicializa la base de datos creando todas las tablas necesarias.
     
@@ -117,21 +374,37 @@ def init_db():
        - correctas: Número de aciertos
        - total: Número total de preguntas
        - porcentaje: Porcentaje de aciertos
+       - cliente_id: 'cliente:<id del navegador>' (partidas sin conexión) o
+                     'examen:<id>:<alumno>' (notas de examen)
+    
+    Además crea la tabla BOCETOS_PUNTUACION (histogramas de porcentajes,
+    ver bocetos.py), la tabla EXAMENES (ver examen.py) y la tabla auxiliar CATALOGO_VERSION y sus triggers
+    (ver version_catalogo()).
     
     Nota sobre CREATE TABLE IF NOT EXISTS:
     --------------------------------------
     Esta sintaxis evita errores si la tabla ya existe.
     Es seguro ejecutar esta función múltiples veces.
     
+    Args:
+        ruta (Path o str, opcional): Base de datos a inicializar
+            (por defecto DB_PATH, ver get_db()).
+    
     Nota sobre FOREIGN KEY:
     ----------------------
     tema_id en 'preguntas' referencia a id en 'temas'.
     Esto asegura integridad: no puedes tener una pregunta
     con un tema_id que no existe en la tabla temas.
     """
-    conn = get_db()
+    conn = get_db(ruta)
     cursor = conn.cursor()
     
+    # Vacío incremental: al borrar filas antiguas (ver retencion.py) las
+    # páginas libres se pueden devolver al disco poco a poco con
+    # PRAGMA incremental_vacuum, sin el bloqueo largo de un VACUUM completo.
+    # Solo tiene efecto en una base de datos nueva (antes de crear tablas).
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    
     # -------------------------------------------------------------------------
     # Tabla de TEMAS (categorías de preguntas)
     # -------------------------------------------------------------------------
@@ -167,6 +440,10 @@ def init_db():
     # CHECK: Restricción que valida que respuesta_correcta solo sea 'a', 'b' o 'c'
     # FOREIGN KEY: Crea una relación con la tabla temas
     
+    # Índice para buscar las preguntas de un tema sin recorrer toda la tabla
+    # (lo usa mazo.py para obtener los ids de cada tema)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_preguntas_tema ON preguntas(tema_id)')
+    
     # -------------------------------------------------------------------------
     # Tabla de ESTADÍSTICAS (historial de partidas)
     # -------------------------------------------------------------------------
@@ -184,6 +461,101 @@ def init_db():
     # CURRENT_TIMESTAMP: Se rellena automáticamente con la fecha/hora actual
     # REAL: Número decimal (para el porcentaje)
     
+    # Partidas jugadas sin conexión (ver /api/resultados/lote): el navegador
+    # pone a cada resultado un identificador propio, así que si reenvía un
+    # lote que ya llegó no se duplica nada. Las partidas normales lo dejan
+    # en NULL (un índice UNIQUE admite muchos NULL).
+    # ALTER TABLE porque las bases de datos antiguas no tienen la columna.
+    columnas = {fila['name'] for fila in cursor.execute('PRAGMA table_info(estadisticas)')}
+    if 'cliente_id' not in columnas:
+        cursor.execute('ALTER TABLE estadisticas ADD COLUMN cliente_id TEXT')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_estadisticas_cliente
+        ON estadisticas(cliente_id)
+    ''')
+    
+    # Índice por fecha: las 10 últimas partidas (/api/estadisticas) y la
+    # búsqueda de partidas antiguas para archivarlas (retencion.py)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_estadisticas_fecha ON estadisticas(fecha)')
+    
+    # Índice por tema y fecha: el historial de un tema (retencion.historial)
+    # sale ya ordenado y se para en el límite, sin recorrer los demás temas
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_estadisticas_tema_fecha
+        ON estadisticas(tema, fecha)
+    ''')
+    
+    # -------------------------------------------------------------------------
+    # Tabla de BOCETOS de puntuación (ver bocetos.py)
+    # -------------------------------------------------------------------------
+    # Un histograma de porcentajes por (día, tema, nodo servidor). La clave
+    # empieza por la ventana (el día) para poder leer "los últimos N días"
+    # con el índice de la clave primaria. WITHOUT ROWID: la tabla ES ese índice.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bocetos_puntuacion (
+            ventana TEXT NOT NULL,
+            tema TEXT NOT NULL,
+            nodo TEXT NOT NULL,
+            conteos TEXT NOT NULL,
+            PRIMARY KEY (ventana, tema, nodo)
+        ) WITHOUT ROWID
+    ''')
+    
+    # -------------------------------------------------------------------------
+    # Tabla de EXÁMENES (ver examen.py)
+    # -------------------------------------------------------------------------
+    # Un mazo fijo: los ids de sus preguntas (JSON, en orden) y la clave de
+    # respuestas copiada al crearlo ('bacab...'). Las notas de cada alumno
+    # van a estadisticas con cliente_id 'examen:<id>:<alumno>'.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS examenes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            tema TEXT NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            preguntas TEXT NOT NULL,
+            clave TEXT NOT NULL
+        )
+    ''')
+
+    # -------------------------------------------------------------------------
+    # Tabla de PREGUNTAS VISTAS por cada jugador (ver mazo.py y jugadores.py)
+    # -------------------------------------------------------------------------
+    # Un bitset por (jugador, tema) con las preguntas que ya vio, numeradas
+    # con la versión del catálogo `version`. Está en la base de datos y no en
+    # la memoria del proceso porque con varios trabajadores (servidor.py)
+    # cada partida del mismo jugador puede caer en uno distinto. `usado`
+    # permite olvidar a los jugadores que no vuelven.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vistas_jugador (
+            jugador TEXT NOT NULL,
+            tema TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            bits BLOB NOT NULL,
+            vistas INTEGER NOT NULL,
+            usado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (jugador, tema)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vistas_jugador_usado ON vistas_jugador(usado)')
+
+    # -------------------------------------------------------------------------
+    # VERSIÓN DEL CATÁLOGO (temas + preguntas)
+    # -------------------------------------------------------------------------
+    # Una única fila con un contador que sube cada vez que cambia algo en
+    # temas o preguntas. Los triggers lo actualizan solos, así que da igual
+    # quién modifique el catálogo (el juego, un script o el README).
+    # El espejo en memoria (espejo.py) lo usa para saber cuándo refrescarse.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalogo_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO catalogo_version (id, version) VALUES (1, 0)')
+    for _nombre, sql in TRIGGERS_VERSION:
+        cursor.execute(sql)
+    
     # Guardar los cambios en la base de datos
     conn.commit()
     
@@ -195,7 +567,7 @@ def init_db():
 # FUNCIONES DE VERIFICACIÓN
 # =============================================================================
 
-def tablas_vacias():
+def tablas_vacias(ruta=None):
     """
     Comprueba si las tablas de temas y preguntas están vacías.
     
@@ -204,6 +576,9 @@ def tablas_vacias():
     Para saber si necesitamos cargar las preguntas iniciales.
     Si ya hay datos, no los volvemos a cargar (evitamos duplicados).
     
+    Args:
+        ruta (Path o str, opcional): Archivo de base de datos (por defecto DB_PATH)
+    
     Returns:
         bool: True si alguna tabla está vacía, False si ambas tienen datos
     
@@ -213,7 +588,7 @@ def tablas_vacias():
         else:
             print("Ya hay preguntas cargadas")
     """
-    conn = get_db()
+    conn = get_db(ruta)
     cursor = conn.cursor()
     
     # Contar registros en la tabla temas
@@ -308,3 +683,66 @@ def contar_preguntas():
     conn.close()
     
     return resultado
+
+
+def version_catalogo(conn=None):
+    """
+    Devuelve la versión actual del catálogo (temas + preguntas).
+    
+    ¿Para qué sirve?
+    ----------------
+    Es un contador que los triggers de init_db() incrementan con cada
+    INSERT, UPDATE o DELETE en temas o preguntas. Si la versión no ha
+    cambiado, cualquier copia o caché del catálogo sigue siendo válida.
+    
+    Args:
+        conn (sqlite3.Connection, opcional): Conexión a reutilizar.
+            Si no se pasa, se abre y cierra una nueva.
+    
+    Returns:
+        int: Versión del catálogo (0 si nunca se ha modificado)
+    """
+    propia = conn is None
+    if propia:
+        conn = get_db()
+    
+    fila = conn.execute('SELECT version FROM catalogo_version WHERE id = 1').fetchone()
+    
+    if propia:
+        conn.close()
+    
+    return fila[0] if fila else 0
+
+
+@contextmanager
+def carga_catalogo(conn):
+    """
+    Transacción para cargar muchas filas de temas o preguntas de una vez.
+
+    Los triggers de catalogo_version suben la versión FILA A FILA: cargar
+    100.000 preguntas serían 100.000 UPDATE más. Aquí se quitan al
+    empezar, la versión sube UNA vez al final y se vuelven a crear, todo
+    en la misma transacción (BEGIN IMMEDIATE): las demás conexiones nunca
+    ven el catálogo sin triggers, y si algo falla el ROLLBACK lo deja todo
+    como estaba.
+
+    CÓMO USARLO:
+        with carga_catalogo(conn):
+            conn.executemany('INSERT INTO preguntas ...', filas)
+    """
+    conn.isolation_level = None      # Las transacciones las abrimos nosotros
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for nombre, _sql in TRIGGERS_VERSION:
+            conn.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+        yield conn
+        conn.execute('UPDATE catalogo_version SET version = version + 1 WHERE id = 1')
+        for _nombre, sql in TRIGGERS_VERSION:
+            conn.execute(sql)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.isolation_level = ''
+
@@ -0,0 +1,242 @@
+"""
+espejo.py - Copia en memoria del catálogo de preguntas
+======================================================
+
+Las lecturas del catálogo (temas y preguntas) son muchísimas más que las
+escrituras: cada visita a la portada, cada /api/temas y cada /api/jugar
+lee el catálogo, y el catálogo solo cambia cuando alguien añade preguntas.
+
+Este módulo mantiene una copia ("espejo") de las tablas del catálogo en
+una base de datos SQLite EN MEMORIA. Las lecturas del catálogo se hacen
+contra el espejo (sin tocar el disco) y las escrituras siguen yendo a
+quiz.db como siempre.
+
+¿CÓMO SE CONSTRUYE EL ESPEJO?
+-----------------------------
+1. Se crea una base de datos temporal en memoria
+2. Se ATTACHa quiz.db y se copian SOLO las tablas del catálogo
+   (con sus índices). estadisticas no se copia: puede ser enorme
+3. Con sqlite3.Connection.backup() se vuelca esa copia en una base
+   de datos en memoria COMPARTIDA ("cache=shared"), que es la que
+   abren las lecturas
+
+¿CÓMO SE MANTIENE AL DÍA?
+-------------------------
+database.init_db() crea unos triggers que incrementan un contador
+(version_catalogo()) con cada cambio en temas o preguntas. Como mucho
+una vez cada INTERVALO_COMPROBACION segundos miramos ese contador y,
+si ha cambiado, construimos un espejo nuevo con otro nombre y lo
+publicamos. Las conexiones que estaban leyendo del espejo viejo
+terminan tranquilamente; nadie espera a nadie.
+
+CÓMO USARLO:
+------------
+    import espejo
+    espejo.activar_espejo()      # Al arrancar (ver app.inicializar_app)
+
+    conn = espejo.get_db_lectura()   # En lugar de get_db() para leer catálogo
+    ...
+    conn.close()
+
+Si el espejo no está activado, get_db_lectura() es exactamente get_db().
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import itertools
+import sqlite3
+import threading
+import time
+
+import database
+import memoria
+from database import TABLAS_CATALOGO, ConexionQuiz, get_db, version_catalogo
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+# Cada cuántos segundos (como mucho) comprobamos si el catálogo ha cambiado
+INTERVALO_COMPROBACION = 2.0
+
+
+# =============================================================================
+# ESTADO DEL MÓDULO
+# =============================================================================
+
+# Conexión que mantiene viva la base de datos en memoria: una base de datos
+# ":memory:" compartida desaparece cuando se cierra su última conexión
+_ancla = None
+_ancla_anterior = None         # Espejo previo, se cierra en la siguiente reconstrucción
+_uri = None                    # URI del espejo que usan las lecturas
+_version = None                # Versión del catálogo copiada en el espejo
+_ultima_comprobacion = 0.0
+_cerrojo = threading.Lock()    # Solo un hilo reconstruye el espejo a la vez
+_contador = itertools.count(1)  # Para dar un nombre distinto a cada espejo
+
+
+# =============================================================================
+# CONSTRUCCIÓN DEL ESPEJO
+# =============================================================================
+
+def _copiar_catalogo():
+    """
+    Copia las tablas del catálogo de quiz.db a una base de datos privada
+    en memoria.
+
+    Todo se lee dentro de una misma transacción, así que la versión y
+    las filas copiadas son coherentes entre sí.
+
+    Returns:
+        tuple: (conexión en memoria con la copia, versión copiada)
+    """
+    copia = sqlite3.connect(':memory:')
+    copia.execute('ATTACH DATABASE ? AS disco', (str(database.DB_PATH),))
+    copia.execute('BEGIN')
+    version = copia.execute(
+        'SELECT version FROM disco.catalogo_version WHERE id = 1'
+    ).fetchone()[0]
+
+    for tabla in TABLAS_CATALOGO:
+        # Reutilizamos el CREATE TABLE / CREATE INDEX original
+        definiciones = copia.execute('''
+            SELECT type, sql FROM disco.sqlite_master
+            WHERE tbl_name = ? AND type IN ('table', 'index') AND sql IS NOT NULL
+            ORDER BY type = 'index'
+        ''', (tabla,)).fetchall()
+        for tipo, sql in definiciones:
+            copia.execute(sql)
+            if tipo == 'table':
+                copia.execute(f'INSERT INTO main.{tabla} SELECT * FROM disco.{tabla}')
+
+    copia.execute('COMMIT')
+    copia.execute('DETACH DATABASE disco')
+    return copia, version
+
+
+def _reconstruir():
+    """
+    Construye un espejo nuevo y lo publica.
+
+    Cada espejo tiene un nombre distinto (quiz_espejo_1, quiz_espejo_2...):
+    al cambiar _uri, las nuevas lecturas van al espejo nuevo y el viejo
+    se libera cuando se cierra su última conexión.
+
+    ¿Por qué no cerramos el ancla vieja enseguida?
+    Un hilo puede haber leído _uri justo antes del cambio y abrir su
+    conexión un instante después. Si el espejo viejo ya no existiera,
+    SQLite crearía una base de datos vacía con ese nombre. Mantenemos
+    viva el ancla anterior hasta la siguiente reconstrucción, que como
+    pronto llega INTERVALO_COMPROBACION segundos más tarde.
+    """
+    global _ancla, _ancla_anterior, _uri, _version
+
+    copia, version = _copiar_catalogo()
+
+    uri = f'file:quiz_espejo_{next(_contador)}?mode=memory&cache=shared'
+    ancla = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    copia.backup(ancla)
+    copia.close()
+
+    if _ancla_anterior is not None:
+        _ancla_anterior.close()
+    _ancla_anterior = _ancla
+    _ancla, _uri, _version = ancla, uri, version
+
+
+def _comprobar_version():
+    """
+    Reconstruye el espejo si el catálogo del disco ha cambiado.
+
+    Solo mira el disco una vez cada INTERVALO_COMPROBACION segundos.
+    Si otro hilo ya está reconstruyendo, no esperamos: seguimos leyendo
+    del espejo actual.
+    """
+    global _ultima_comprobacion
+
+    ahora = time.monotonic()
+    if ahora - _ultima_comprobacion < INTERVALO_COMPROBACION:
+        return
+    if not _cerrojo.acquire(blocking=False):
+        return
+    try:
+        _ultima_comprobacion = ahora
+        if version_catalogo() != _version:
+            _reconstruir()
+    finally:
+        _cerrojo.release()
+
+
+# =============================================================================
+# API PÚBLICA
+# =============================================================================
+
+def activar_espejo():
+    """
+    Crea el espejo en memoria del catálogo.
+
+    Se llama una vez al arrancar, después de init_db() y de cargar las
+    preguntas (si no, el espejo nacería vacío; aunque se corregiría solo
+    en la siguiente comprobación de versión).
+    """
+    global _ultima_comprobacion
+    with _cerrojo:
+        _reconstruir()
+        _ultima_comprobacion = time.monotonic()
+
+
+def desactivar_espejo():
+    """Libera el espejo; las lecturas vuelven a ir a quiz.db."""
+    global _ancla, _ancla_anterior, _uri, _version
+    with _cerrojo:
+        for ancla in (_ancla, _ancla_anterior):
+            if ancla is not None:
+                ancla.close()
+        _ancla = _ancla_anterior = _uri = _version = None
+
+
+def espejo_activo():
+    """Devuelve True si las lecturas del catálogo se sirven desde memoria."""
+    return _uri is not None
+
+
+def get_db_lectura():
+    """
+    Devuelve una conexión para LEER el catálogo (temas y preguntas).
+
+    - Con el espejo activo: conexión a la base de datos en memoria
+    - Sin espejo: una conexión normal de get_db()
+
+    ¡Ojo! En el espejo solo están las tablas del catálogo. Para
+    estadisticas, o para escribir, usa siempre get_db().
+
+    Returns:
+        sqlite3.Connection: Conexión con row_factory = sqlite3.Row
+    """
+    if _uri is None:
+        return get_db()
+
+    _comprobar_version()
+
+    conn = sqlite3.connect(_uri, uri=True, factory=ConexionQuiz)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _bytes_espejo():
+    """
+    Bytes de los espejos vivos (el actual y el anterior).
+
+    SQLite guarda las páginas fuera de Python, así que se calculan con
+    page_count * page_size en vez de con memoria.tamano().
+    """
+    with _cerrojo:
+        return sum(
+            ancla.execute('PRAGMA page_count').fetchone()[0]
+            * ancla.execute('PRAGMA page_size').fetchone()[0]
+            for ancla in (_ancla, _ancla_anterior) if ancla is not None
+        )
+
+
+memoria.registrar('preguntas', 'espejo (SQLite en memoria)', _bytes_espejo)
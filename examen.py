@@ -0,0 +1,408 @@
+"""
+examen.py - Modo examen: un mazo fijo y corrección de hojas en bloque
+=====================================================================
+
+El profesor quiere usar el quiz como examen (en papel o en el aula sin
+red) y subir después CIENTOS o MILES de hojas de respuestas de una vez.
+Pasarlas por /api/responder una respuesta cada vez no tiene sentido.
+
+CÓMO FUNCIONA:
+--------------
+1. Se CREA un examen: un mazo fijo de preguntas de un tema. Se guarda la
+   lista de ids y la CLAVE (la respuesta correcta de cada una, 'bacab...')
+   tal como estaba ese día: si después se corrige una pregunta del
+   catálogo, las hojas de este examen se siguen corrigiendo igual.
+
+2. Se SUBEN las hojas (CSV o NDJSON), una por alumno:
+
+       alumno,respuestas                   {"alumno": "ana", "respuestas": "bac-b"}
+       ana,bac-b                           {"alumno": "luis", "respuestas": ["b", "a", "c", null, "a"]}
+       luis,b,a,c,,a     (o una columna por pregunta)
+
+   '-', un hueco o null = pregunta sin responder.
+
+3. Se CORRIGEN todas a la vez con NumPy: las hojas forman una matriz
+   (alumnos x preguntas) y se comparan con la clave en una sola operación
+
+       aciertos = respuestas == clave          # (n, k) de True/False
+       correctas = aciertos.sum(axis=1)        # aciertos de cada alumno
+
+4. Los resultados se guardan en estadisticas en UNA transacción. Cada hoja
+   lleva su cliente_id ('examen:7:ana'), así que subir el mismo fichero
+   dos veces no duplica nada (como los lotes sin conexión de juego.py).
+
+5. Se devuelven ESTADÍSTICAS POR PREGUNTA:
+   - acierto:        fracción de alumnos que la acertaron (su "facilidad")
+   - discriminacion: correlación entre acertarla y la nota en el RESTO del
+                     examen. Baja o negativa = la aciertan por igual los que
+                     saben y los que no (pregunta confusa o clave errónea)
+   - opciones:       cuántos eligieron cada opción (y cuántos la dejaron)
+   Y del examen entero, la media y la fiabilidad KR-20 (0-1).
+
+NumPy es una dependencia opcional:
+
+    uv sync --extra analitica
+
+CÓMO USARLO:
+------------
+    uv run python examen.py crear "Parcial 1" --tema NumPy --preguntas 20
+    uv run python examen.py corregir 1 hojas.csv
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import sys
+
+from bocetos import bocetos_de
+from almacenamiento import get_almacen
+from mazo import PREGUNTAS_POR_PARTIDA, ids_tema
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MAX_PREGUNTAS = 200        # Preguntas por examen como máximo
+MAX_HOJAS = 20_000         # Hojas por subida como máximo
+MAX_ALUMNO = 64            # Longitud máxima del identificador del alumno
+
+OPCIONES = 'abc'
+SIN_RESPONDER = '-'
+
+ERROR_NUMPY = 'La corrección de exámenes necesita numpy: uv sync --extra analitica'
+
+
+# =============================================================================
+# CREAR Y LEER EXÁMENES
+# =============================================================================
+
+def crear_examen(nombre, tema, cantidad=PREGUNTAS_POR_PARTIDA, ids=None, rng=random):
+    """
+    Crea un examen con un mazo fijo de preguntas.
+
+    Args:
+        nombre (str): Nombre del examen ('Parcial 1')
+        tema (str): Nombre del tema o 'todos'
+        cantidad (int): Preguntas elegidas al azar del tema
+        ids (list, opcional): Ids concretos (en este orden) en lugar de al azar
+        rng: Generador aleatorio (random.Random) para poder fijar semillas
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP)
+    """
+    if not isinstance(nombre, str) or not nombre.strip():
+        return {'error': 'El examen necesita un nombre'}, 400
+    if ids is None:
+        if isinstance(cantidad, bool) or not isinstance(cantidad, int):
+            return {'error': 'preguntas debe ser un número'}, 400
+        disponibles = ids_tema(tema)
+        if not disponibles:
+            return {'error': 'No hay preguntas disponibles'}, 404
+        ids = rng.sample(list(disponibles), max(1, min(cantidad, MAX_PREGUNTAS, len(disponibles))))
+    elif (not isinstance(ids, list) or not 0 < len(ids) <= MAX_PREGUNTAS
+          or len(set(ids)) != len(ids)
+          or any(isinstance(i, bool) or not isinstance(i, int) for i in ids)):
+        return {'error': f'ids debe ser una lista de 1 a {MAX_PREGUNTAS} ids distintos'}, 400
+
+    preguntas = get_almacen().preguntas(ids)
+    if len(preguntas) != len(ids):
+        return {'error': 'Alguna de las preguntas no existe'}, 404
+    clave = ''.join(fila.respuesta_correcta for fila in preguntas)
+
+    examen_id = get_almacen().guardar_examen(nombre.strip(), tema, json.dumps(ids), clave)
+    return ver_examen(examen_id)
+
+
+def ver_examen(examen_id):
+    """
+    Devuelve el examen para imprimirlo: las preguntas SIN la clave.
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP)
+    """
+    examen = get_almacen().leer_examen(examen_id)
+    if examen is None:
+        return {'error': 'El examen no existe'}, 404
+    preguntas = get_almacen().preguntas(json.loads(examen['preguntas']))
+    return {
+        'id': examen['id'],
+        'nombre': examen['nombre'],
+        'tema': examen['tema'],
+        'fecha': examen['fecha'],
+        'preguntas': [{
+            'numero': numero,
+            'id': fila.id,
+            'pregunta': fila.pregunta,
+            'opciones': fila.opciones(),
+        } for numero, fila in enumerate(preguntas, 1)],
+    }, 200
+
+
+# =============================================================================
+# LECTURA DE LAS HOJAS
+# =============================================================================
+
+def _respuesta(valor):
+    """'A', 'b ', '', None... -> 'a', 'b', '-' ('?' si no es una opción)"""
+    if valor is None:
+        return SIN_RESPONDER
+    if not isinstance(valor, str):
+        return '?'
+    valor = valor.strip().lower()
+    if valor in ('', SIN_RESPONDER):
+        return SIN_RESPONDER
+    return valor if len(valor) == 1 and valor in OPCIONES else '?'
+
+
+def _hoja(alumno, respuestas, k):
+    """
+    Normaliza una hoja: (alumno, 'bac-b') o (None, motivo) si no vale.
+
+    `respuestas` puede ser una cadena ('bac-b') o una lista (['b', 'a', ...]).
+    """
+    if not isinstance(alumno, str) or not 0 < len(alumno.strip()) <= MAX_ALUMNO:
+        return None, 'alumno no válido'
+    if isinstance(respuestas, str):
+        respuestas = list(respuestas.replace(' ', SIN_RESPONDER))
+    if not isinstance(respuestas, list):
+        return None, 'faltan las respuestas'
+    if len(respuestas) != k:
+        return None, f'{len(respuestas)} respuestas (el examen tiene {k})'
+    hoja = ''.join(_respuesta(r) for r in respuestas)
+    if '?' in hoja:
+        return None, 'respuesta que no es a, b, c ni -'
+    return alumno.strip(), hoja
+
+
+def leer_hojas(texto, formato, k):
+    """
+    Lee un fichero de hojas de respuestas.
+
+    Args:
+        texto (str): Contenido del fichero
+        formato (str): 'csv' o 'ndjson'
+        k (int): Preguntas del examen
+
+    Returns:
+        tuple: ([(alumno, 'bac-b'), ...], [{'linea', 'motivo'}, ...])
+    """
+    hojas, rechazadas = [], []
+    if formato == 'csv':
+        filas = enumerate(csv.reader(io.StringIO(texto)), 1)
+    else:
+        filas = enumerate(texto.splitlines(), 1)
+
+    for linea, fila in filas:
+        if formato == 'csv':
+            if not fila or not any(celda.strip() for celda in fila):
+                continue
+            if linea == 1 and fila[0].strip().lower() == 'alumno':
+                continue        # Cabecera
+            # 'ana,bac-b' o una columna por pregunta: 'ana,b,a,c,,b'
+            respuestas = fila[1] if len(fila) == 2 else fila[1:]
+            alumno = fila[0]
+        else:
+            if not fila.strip():
+                continue
+            try:
+                registro = json.loads(fila)
+            except json.JSONDecodeError:
+                rechazadas.append({'linea': linea, 'motivo': 'JSON no válido'})
+                continue
+            if not isinstance(registro, dict):
+                rechazadas.append({'linea': linea, 'motivo': 'se esperaba un objeto'})
+                continue
+            alumno, respuestas = registro.get('alumno'), registro.get('respuestas')
+
+        alumno, hoja = _hoja(alumno, respuestas, k)
+        if alumno is None:
+            rechazadas.append({'linea': linea, 'motivo': hoja})
+        else:
+            hojas.append((alumno, hoja))
+        if len(hojas) + len(rechazadas) > MAX_HOJAS:
+            raise ValueError(f'Máximo {MAX_HOJAS} hojas por subida')
+    return hojas, rechazadas
+
+
+# =============================================================================
+# CORRECCIÓN VECTORIZADA
+# =============================================================================
+
+def calificar(clave, hojas):
+    """
+    Corrige todas las hojas a la vez y calcula las estadísticas por pregunta.
+
+    Args:
+        clave (str): Respuesta correcta de cada pregunta ('bacab')
+        hojas (list): Respuestas de cada alumno, ya normalizadas ('bac-b')
+
+    Returns:
+        dict: {'correctas': array con los aciertos de cada hoja,
+               'media', 'kr20', 'items': [...]}
+    """
+    import numpy as np
+
+    n, k = len(hojas), len(clave)
+    # Cada letra es un byte: las hojas se convierten en una matriz (n, k)
+    # sin recorrerlas respuesta a respuesta
+    respuestas = np.frombuffer(''.join(hojas).encode('ascii'), dtype=np.uint8).reshape(n, k)
+    correcta = np.frombuffer(clave.encode('ascii'), dtype=np.uint8)
+
+    aciertos = respuestas == correcta                  # (n, k) bool
+    correctas = aciertos.sum(axis=1)                   # (n,) aciertos por hoja
+
+    # Facilidad de cada pregunta: fracción de aciertos
+    x = aciertos.astype(np.float64)
+    acierto = x.mean(axis=0)
+
+    # Discriminación: correlación de cada pregunta con el resto del examen
+    # (se resta la propia pregunta para que no se correlacione consigo misma)
+    resto = correctas[:, None] - x
+    xc = x - acierto
+    rc = resto - resto.mean(axis=0)
+    denominador = np.sqrt((xc * xc).sum(axis=0) * (rc * rc).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        discriminacion = np.where(denominador > 0, (xc * rc).sum(axis=0) / denominador, np.nan)
+
+    # Recuento de cada opción por pregunta: una comparación por opción
+    recuentos = {
+        opcion: (respuestas == ord(opcion)).sum(axis=0)
+        for opcion in OPCIONES + SIN_RESPONDER
+    }
+
+    # Fiabilidad KR-20 (alfa de Cronbach para preguntas de acierto/fallo)
+    varianza = correctas.var()
+    kr20 = None
+    if k > 1 and varianza > 0:
+        kr20 = float(k / (k - 1) * (1 - (acierto * (1 - acierto)).sum() / varianza))
+
+    return {
+        'correctas': correctas,
+        'media': float(correctas.mean()) if n else None,
+        'kr20': kr20,
+        'items': [{
+            'numero': j + 1,
+            'correcta': clave[j],
+            'acierto': round(float(acierto[j]), 4),
+            'discriminacion': None if np.isnan(discriminacion[j]) else round(float(discriminacion[j]), 4),
+            'opciones': {opcion: int(recuentos[opcion][j]) for opcion in OPCIONES},
+            'sin_responder': int(recuentos[SIN_RESPONDER][j]),
+        } for j in range(k)],
+    }
+
+
+# =============================================================================
+# SUBIDA DE HOJAS
+# =============================================================================
+
+def _guardar(examen, hojas, correctas):
+    """
+    Guarda las hojas en estadisticas en UNA transacción.
+
+    Las hojas de este examen ya guardadas (mismo cliente_id
+    'examen:<id>:<alumno>') se saltan: ver almacenamiento.guardar_resultados.
+
+    Returns:
+        list: (tema, porcentaje) de las hojas nuevas
+    """
+    prefijo = f"examen:{examen['id']}:"
+    total = len(examen['clave'])
+    nuevas = get_almacen().guardar_resultados([
+        (prefijo + alumno, None, examen['tema'], int(aciertos), total, int(aciertos) / total * 100)
+        for (alumno, _hoja), aciertos in zip(hojas, correctas)
+    ])
+    return [(tema, porcentaje) for _id, _fecha, tema, _c, _t, porcentaje in nuevas]
+
+
+def corregir_hojas(examen_id, texto, formato):
+    """
+    Corrige y guarda un fichero de hojas de respuestas.
+
+    Args:
+        examen_id (int): Examen al que pertenecen las hojas
+        texto (str): Contenido del fichero (CSV o NDJSON)
+        formato (str): 'csv' o 'ndjson'
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP). El cuerpo incluye la nota de cada
+               alumno, las hojas rechazadas y las estadísticas por pregunta.
+    """
+    try:
+        import numpy  # noqa: F401  (solo comprobamos que está instalado)
+    except ImportError:
+        return {'error': ERROR_NUMPY}, 501
+
+    examen = get_almacen().leer_examen(examen_id)
+    if examen is None:
+        return {'error': 'El examen no existe'}, 404
+    clave = examen['clave']
+
+    try:
+        hojas, rechazadas = leer_hojas(texto, formato, len(clave))
+    except ValueError as error:
+        return {'error': str(error)}, 413
+
+    # Un alumno, una hoja: las repetidas dentro del mismo fichero se rechazan
+    vistos = set()
+    unicas = []
+    for alumno, hoja in hojas:
+        if alumno in vistos:
+            rechazadas.append({'alumno': alumno, 'motivo': 'alumno repetido'})
+        else:
+            vistos.add(alumno)
+            unicas.append((alumno, hoja))
+    if not unicas:
+        return {'error': 'No hay ninguna hoja válida', 'rechazadas': rechazadas}, 400
+
+    resultado = calificar(clave, [hoja for _alumno, hoja in unicas])
+    nuevas = _guardar(examen, unicas, resultado['correctas'])
+
+    # Las notas nuevas también cuentan para los percentiles (ver bocetos.py)
+    histogramas = bocetos_de(get_almacen())
+    for tema, porcentaje in nuevas:
+        histogramas.registrar(tema, porcentaje)
+
+    return {
+        'examen': examen['id'],
+        'hojas': len(unicas),
+        'nuevas': len(nuevas),
+        'rechazadas': rechazadas,
+        'media': resultado['media'],
+        'kr20': resultado['kr20'],
+        'notas': [{'alumno': alumno, 'correctas': int(aciertos), 'total': len(clave)}
+                  for (alumno, _hoja), aciertos in zip(unicas, resultado['correctas'])],
+        'items': resultado['items'],
+    }, 200
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exámenes con mazo fijo y corrección en bloque.')
+    subcomandos = parser.add_subparsers(dest='accion', required=True)
+    crear_args = subcomandos.add_parser('crear', help='Crear un examen')
+    crear_args.add_argument('nombre')
+    crear_args.add_argument('--tema', default='todos')
+    crear_args.add_argument('--preguntas', type=int, default=PREGUNTAS_POR_PARTIDA)
+    corregir_args = subcomandos.add_parser('corregir', help='Corregir un fichero de hojas')
+    corregir_args.add_argument('examen', type=int)
+    corregir_args.add_argument('fichero', help='.csv o .ndjson')
+    args = parser.parse_args()
+
+    if args.accion == 'crear':
+        cuerpo, codigo = crear_examen(args.nombre, args.tema, args.preguntas)
+    else:
+        with open(args.fichero, encoding='utf-8-sig') as entrada:
+            texto = entrada.read()
+        formato = 'csv' if args.fichero.lower().endswith('.csv') else 'ndjson'
+        cuerpo, codigo = corregir_hojas(args.examen, texto, formato)
+    json.dump(cuerpo, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    sys.exit(0 if codigo == 200 else 1)
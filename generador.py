@@ -0,0 +1,223 @@
+"""
+generador.py - Generador de datos sintéticos para el Quiz
+=========================================================
+
+El banco de preguntas real tiene unas 100 preguntas y la tabla de
+estadísticas empieza vacía. Con esos tamaños cualquier consulta es
+instantánea, así que no podemos saber cómo se comportan cosas como
+ORDER BY RANDOM() o el LEFT JOIN de contar_preguntas() cuando haya
+miles de temas, millones de preguntas o millones de partidas jugadas.
+
+Este módulo rellena una base de datos SQLite con datos inventados
+(pero con el mismo esquema que quiz.db) para poder medir.
+
+¿QUÉ GENERA?
+------------
+- N temas:        'Tema 0001', 'Tema 0002', ...
+- N preguntas:    repartidas al azar entre los temas
+- N partidas:     filas de estadisticas con fechas del último año
+
+CÓMO USARLO:
+------------
+    # Base de datos aparte con 100.000 preguntas y 100.000 partidas
+    uv run python generador.py --db bench.db --preguntas 100000 --partidas 100000
+
+    # Rellenar el propio quiz.db (¡añade datos falsos al juego!)
+    uv run python generador.py --preguntas 10000 --partidas 10000
+
+Nota sobre la velocidad:
+-----------------------
+Para llegar a 10 millones de filas en un tiempo razonable:
+  - Insertamos por lotes con executemany() (ver preguntas.py)
+  - Desactivamos synchronous y usamos el journal en memoria: si el
+    proceso se interrumpe la base de datos sintética puede quedar
+    corrupta, pero es desechable.
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from database import DB_PATH, carga_catalogo, get_db, init_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+# Número de filas que se insertan en cada executemany()
+# Lotes grandes = menos idas y vueltas a SQLite, pero más memoria
+TAMANO_LOTE = 50_000
+
+# Las partidas sintéticas se reparten a lo largo de este periodo
+DIAS_HISTORIAL = 365
+
+# Iconos que se asignan por turnos a los temas generados
+ICONOS = ['🔢', '🐼', '📈', '🗄️', '🤖', '🧮', '📊', '🧠']
+
+
+# =============================================================================
+# GENERADORES DE FILAS
+# =============================================================================
+# Son "generadores" de Python (usan yield): producen las filas de una en una
+# en lugar de construir listas enormes en memoria.
+
+def _filas_temas(n_temas):
+    """Genera las tuplas (nombre, descripcion, icono) de los temas."""
+    for i in range(1, n_temas + 1):
+        yield (
+            f'Tema {i:04d}',
+            f'Tema sintético número {i}',
+            ICONOS[i % len(ICONOS)],
+        )
+
+
+def _filas_preguntas(n_preguntas, ids_temas, rng):
+    """
+    Genera tuplas con el mismo formato que get_preguntas_numpy():
+    (tema_id, pregunta, opcion_a, opcion_b, opcion_c, respuesta_correcta, explicacion)
+    """
+    for i in range(1, n_preguntas + 1):
+        yield (
+            rng.choice(ids_temas),
+            f'¿Pregunta sintética número {i}?',
+            f'Opción A de la pregunta {i}',
+            f'Opción B de la pregunta {i}',
+            f'Opción C de la pregunta {i}',
+            rng.choice('abc'),
+            f'Explicación de la pregunta {i}.',
+        )
+
+
+def _filas_partidas(n_partidas, nombres_temas, rng):
+    """
+    Genera tuplas (fecha, tema, correctas, total, porcentaje).
+
+    Las fechas usan el mismo formato que CURRENT_TIMESTAMP de SQLite
+    ('AAAA-MM-DD HH:MM:SS') para que ORDER BY fecha funcione igual
+    que con partidas reales.
+    """
+    ahora = datetime.now()
+    segundos_periodo = DIAS_HISTORIAL * 24 * 3600
+    # 'todos' también aparece en la tabla real (partidas mezcladas)
+    temas = list(nombres_temas) + ['todos']
+    for _ in range(n_partidas):
+        fecha = ahora - timedelta(seconds=rng.randrange(segundos_periodo))
+        correctas = rng.randint(0, 10)
+        yield (
+            fecha.strftime('%Y-%m-%d %H:%M:%S'),
+            rng.choice(temas),
+            correctas,
+            10,
+            correctas * 10.0,
+        )
+
+
+def _insertar_por_lotes(cursor, sql, filas, tamano_lote):
+    """Inserta las filas de un generador en lotes de tamano_lote."""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            cursor.executemany(sql, lote)
+            lote.clear()
+    if lote:
+        cursor.executemany(sql, lote)
+
+
+# =============================================================================
+# FUNCIÓN PRINCIPAL
+# =============================================================================
+
+def generar_datos(ruta=None, n_preguntas=10_000, n_partidas=10_000,
+                  n_temas=50, semilla=0, tamano_lote=TAMANO_LOTE):
+    """
+    Rellena una base de datos con temas, preguntas y partidas sintéticas.
+
+    ¿Qué hace?
+    ----------
+    1. Crea las tablas con init_db() (mismo esquema que el juego)
+    2. Inserta n_temas temas
+    3. Inserta n_preguntas preguntas repartidas entre esos temas
+    4. Inserta n_partidas filas en estadisticas
+
+    Los datos se AÑADEN a los que ya existan. Para medir con un tamaño
+    exacto, usa un archivo nuevo.
+
+    Args:
+        ruta (Path o str): Base de datos a rellenar (por defecto quiz.db)
+        n_preguntas (int): Preguntas a generar
+        n_partidas (int): Partidas (filas de estadisticas) a generar
+        n_temas (int): Temas a generar
+        semilla (int): Semilla aleatoria; misma semilla = mismos datos
+        tamano_lote (int): Filas por cada executemany()
+
+    Returns:
+        dict: Resumen con lo que se ha insertado
+    """
+    rng = random.Random(semilla)
+    init_db(ruta)
+
+    conn = get_db(ruta)
+    # Carga masiva: priorizamos velocidad sobre durabilidad
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    cursor = conn.cursor()
+
+    # Una sola transacción, y la versión del catálogo sube una vez y no por
+    # cada pregunta (ver database.carga_catalogo)
+    with carga_catalogo(conn):
+        # Los nombres de tema son UNIQUE: si ya existen se reutilizan
+        cursor.executemany(
+            'INSERT OR IGNORE INTO temas (nombre, descripcion, icono) VALUES (?, ?, ?)',
+            _filas_temas(n_temas)
+        )
+        nombres = [fila[0] for fila in _filas_temas(n_temas)]
+        marcadores = ', '.join('?' * len(nombres))
+        cursor.execute(f'SELECT id FROM temas WHERE nombre IN ({marcadores})', nombres)
+        ids_temas = [fila[0] for fila in cursor.fetchall()]
+
+        _insertar_por_lotes(cursor, '''
+            INSERT INTO preguntas (tema_id, pregunta, opcion_a, opcion_b, opcion_c, respuesta_correcta, explicacion)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', _filas_preguntas(n_preguntas, ids_temas, rng), tamano_lote)
+
+        _insertar_por_lotes(cursor, '''
+            INSERT INTO estadisticas (fecha, tema, correctas, total, porcentaje)
+            VALUES (?, ?, ?, ?, ?)
+        ''', _filas_partidas(n_partidas, nombres, rng), tamano_lote)
+
+    conn.close()
+
+    return {
+        'ruta': str(ruta or DB_PATH),
+        'temas': n_temas,
+        'preguntas': n_preguntas,
+        'partidas': n_partidas,
+        'semilla': semilla,
+    }
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Rellena una base de datos del quiz con datos sintéticos.'
+    )
+    parser.add_argument('--db', default=None,
+                        help='Archivo SQLite a rellenar (por defecto quiz.db)')
+    parser.add_argument('--preguntas', type=int, default=10_000)
+    parser.add_argument('--partidas', type=int, default=10_000)
+    parser.add_argument('--temas', type=int, default=50)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"🔧 Generando datos en {args.db or DB_PATH}...")
+    resumen = generar_datos(args.db, args.preguntas, args.partidas,
+                            args.temas, args.semilla)
+    print(f"✅ {resumen['temas']} temas, {resumen['preguntas']} preguntas, "
+          f"{resumen['partidas']} partidas")
@@ -0,0 +1,335 @@
+"""
+juego.py - Lógica de una partida (independiente del servidor web)
+=================================================================
+
+Aquí está el "reglamento" del quiz: cómo empieza una partida, cómo se
+corrige una respuesta y qué se devuelve en cada paso. No sabe nada de
+Flask ni de HTTP: recibe el estado de la partida como un diccionario
+(la sesión) y devuelve (cuerpo, código_http).
+
+¿POR QUÉ SEPARARLO DE app.py?
+-----------------------------
+Porque hay más de una forma de servir el juego:
+  - app.py   -> Flask (WSGI), el servidor de siempre
+  - asgi.py  -> Modo asyncio (ASGI) para muchas conexiones a la vez
+Los dos llaman a estas mismas funciones, así que el JSON que recibe el
+navegador es idéntico en ambos casos.
+
+PARTIDAS SIN CONEXIÓN:
+---------------------
+El navegador puede descargar varios mazos completos (CON respuestas y
+explicaciones) con mazos_sin_conexion(), jugarlos sin red y enviar luego
+los resultados en lote con guardar_lote(). Cada resultado lleva un id del
+navegador (se guarda como 'cliente:<id>'), así que reenviar un lote no
+duplica partidas.
+
+ESTADO DE LA PARTIDA (en la sesión):
+-----------------------------------
+    estado['jugador']          -> Identificador del jugador (ver jugadores.py)
+    estado['preguntas']        -> Preguntas de esta partida (listas, ver database.Pregunta)
+    estado['tema']             -> Tema elegido
+    estado['pregunta_actual']  -> Índice de la pregunta actual
+    estado['correctas']        -> Contador de aciertos
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import random
+from datetime import datetime, timezone
+
+import trazas
+from bocetos import bocetos_de
+from almacenamiento import get_almacen
+from database import Pregunta
+from jugadores import nuevo_id_jugador
+from mazo import elegir_mazos, elegir_preguntas, marcar_vistas
+
+MAX_MAZOS = 5          # Mazos que se pueden pedir de una vez para jugar sin red
+MAX_LOTE = 500         # Resultados por lote como máximo
+MAX_ID_CLIENTE = 64    # Longitud máxima del id que pone el navegador
+MAX_TEMA = 100         # Longitud máxima del nombre de tema de un resultado
+
+# Los ids del navegador se guardan con este prefijo en estadisticas.cliente_id,
+# que comparten con las notas de examen ('examen:<id>:<alumno>', ver examen.py):
+# así un navegador no puede ocupar antes el id de la nota de un alumno
+PREFIJO_CLIENTE = 'cliente:'
+
+
+def pregunta_publica(pregunta, numero, total):
+    """
+    Prepara una pregunta para enviarla al navegador.
+
+    ¡Sin la respuesta correcta ni la explicación! Esas solo se envían
+    después de que el jugador responda.
+    """
+    return {
+        'pregunta_num': numero,                # Número de pregunta (1 de 10)
+        'total': total,                        # Total de preguntas
+        'pregunta': pregunta.pregunta,         # Texto de la pregunta
+        'opciones': pregunta.opciones(),       # Las 3 opciones
+    }
+
+
+def nueva_partida(estado, tema, rng=random):
+    """
+    Empieza una partida: elige el mazo y devuelve la primera pregunta.
+
+    Args:
+        estado (dict): Sesión del jugador (se modifica)
+        tema (str): Nombre del tema o 'todos'
+        rng: Generador aleatorio del mazo (uno con semilla para reproducir
+            una captura, ver captura.py)
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP)
+    """
+    # Identificar al jugador (se crea la primera vez que juega)
+    if 'jugador' not in estado:
+        estado['jugador'] = nuevo_id_jugador()
+
+    # Seleccionar 10 preguntas aleatorias que el jugador no haya visto
+    with trazas.span('mazo.elegir', tema=tema):
+        filas = elegir_preguntas(estado['jugador'], tema, rng=rng)
+    preguntas = list(filas)
+
+    # Guardar estado del juego en la sesión del usuario. La sesión es JSON
+    # en una cookie: cada pregunta va como lista, sin repetir los nombres
+    # de las columnas (ver database.Pregunta)
+    estado['preguntas'] = [p.a_sesion() for p in preguntas]  # Preguntas de esta partida
+    estado['tema'] = tema                  # Tema elegido
+    estado['pregunta_actual'] = 0          # Índice de la pregunta actual
+    estado['correctas'] = 0                # Contador de aciertos
+
+    # Si hay preguntas, devolver la primera
+    if preguntas:
+        return pregunta_publica(preguntas[0], 1, len(preguntas)), 200
+
+    # No hay preguntas para ese tema
+    return {'error': 'No hay preguntas disponibles'}, 404
+
+
+def guardar_partida(tema, correctas, total, porcentaje):
+    """Guarda una partida terminada en la tabla de estadísticas."""
+    get_almacen().guardar_partida(tema, correctas, total, porcentaje)
+
+
+def responder(estado, respuesta_usuario):
+    """
+    Corrige la respuesta a la pregunta actual y avanza la partida.
+
+    Args:
+        estado (dict): Sesión del jugador (se modifica)
+        respuesta_usuario (str): 'a', 'b' o 'c'
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP). El cuerpo incluye la siguiente
+               pregunta ('siguiente') o el resumen final ('fin').
+    """
+    # Recuperar el estado del juego de la sesión
+    preguntas = estado.get('preguntas', [])
+    idx = estado.get('pregunta_actual', 0)  # Índice de la pregunta actual
+
+    # Validación: ¿hay pregunta para responder?
+    if idx >= len(preguntas):
+        return {'error': 'No hay más preguntas'}, 400
+
+    # Obtener la pregunta actual y verificar la respuesta
+    pregunta_actual = Pregunta.desde_sesion(preguntas[idx])
+    es_correcta = respuesta_usuario == pregunta_actual.respuesta_correcta
+
+    # Si es correcta, incrementar contador
+    if es_correcta:
+        estado['correctas'] = estado.get('correctas', 0) + 1
+
+    # Avanzar a la siguiente pregunta
+    estado['pregunta_actual'] = idx + 1
+
+    # Preparar respuesta base
+    resultado = {
+        'correcta': es_correcta,                           # ¿Acertó?
+        'respuesta_correcta': pregunta_actual.respuesta_correcta,  # Cuál era
+        'explicacion': pregunta_actual.explicacion,        # Por qué
+        'correctas_acumuladas': estado.get('correctas', 0)  # Aciertos totales
+    }
+
+    # ¿Hay más preguntas?
+    if idx + 1 < len(preguntas):
+        # Sí hay más: incluir la siguiente pregunta
+        siguiente = Pregunta.desde_sesion(preguntas[idx + 1])
+        resultado['siguiente'] = pregunta_publica(siguiente, idx + 2, len(preguntas))
+    else:
+        # Era la última pregunta: fin del juego
+        total = len(preguntas)
+        correctas = estado.get('correctas', 0)
+        porcentaje = (correctas / total) * 100 if total > 0 else 0
+
+        # Guardar en la tabla de estadísticas para historial
+        tema = estado.get('tema', 'todos')
+        guardar_partida(tema, correctas, total, porcentaje)
+
+        # "Mejor que el X% de las partidas del tema" (ver bocetos.py)
+        # (cada centro tiene sus propios histogramas)
+        percentil = bocetos_de(get_almacen()).registrar(tema, porcentaje)
+
+        # Incluir resumen final
+        resultado['fin'] = {
+            'correctas': correctas,
+            'total': total,
+            'porcentaje': porcentaje,
+            'percentil': round(percentil) if percentil is not None else None
+        }
+
+    return resultado, 200
+
+
+# =============================================================================
+# PARTIDAS SIN CONEXIÓN
+# =============================================================================
+
+def mazos_sin_conexion(estado, tema, cantidad):
+    """
+    Prepara varios mazos para jugarlos en el navegador sin red.
+
+    Cada mazo se elige igual que en nueva_partida() (sin repetir preguntas
+    ya vistas), pero las preguntas incluyen la respuesta correcta y la
+    explicación, porque la corrección se hace en el navegador. No se marcan
+    como vistas hasta que llega el resultado del mazo (guardar_lote()).
+
+    Args:
+        estado (dict): Sesión del jugador (se modifica)
+        tema (str): Nombre del tema o 'todos'
+        cantidad (int): Número de mazos (de 1 a MAX_MAZOS)
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP)
+    """
+    if 'jugador' not in estado:
+        estado['jugador'] = nuevo_id_jugador()
+
+    with trazas.span('mazo.elegir', tema=tema, mazos=cantidad):
+        elegidos = elegir_mazos(estado['jugador'], tema, max(1, min(cantidad, MAX_MAZOS)))
+    mazos = [[{
+        'id': fila.id,
+        'pregunta': fila.pregunta,
+        'opciones': fila.opciones(),
+        'respuesta_correcta': fila.respuesta_correcta,
+        'explicacion': fila.explicacion,
+    } for fila in filas] for filas in elegidos if filas]
+
+    if not mazos:
+        return {'error': 'No hay preguntas disponibles'}, 404
+    return {'tema': tema, 'mazos': mazos}, 200
+
+
+def _validar_resultado(resultado, temas):
+    """
+    Comprueba un resultado enviado por el navegador.
+
+    Args:
+        resultado (dict): Un resultado del lote
+        temas (set): Nombres de los temas que existen, más 'todos'
+
+    Returns:
+        tuple o None: (cliente_id, fecha, tema, correctas, total, porcentaje)
+                      listo para insertar, o None si no es válido
+    """
+    if not isinstance(resultado, dict):
+        return None
+    cliente_id = resultado.get('id')
+    tema = resultado.get('tema')
+    correctas = resultado.get('correctas')
+    total = resultado.get('total')
+    if not (isinstance(cliente_id, str) and 0 < len(cliente_id) <= MAX_ID_CLIENTE):
+        return None
+    # Solo temas que existen: un nombre cualquiera crearía filas e
+    # histogramas de percentiles nuevos sin límite
+    if not isinstance(tema, str) or len(tema) > MAX_TEMA or tema not in temas:
+        return None
+    # bool es subclase de int: True no es un número de aciertos
+    if any(isinstance(n, bool) or not isinstance(n, int) for n in (correctas, total)):
+        return None
+    if not 0 < total <= 100 or not 0 <= correctas <= total:
+        return None
+
+    # Fecha en la que se jugó (la del navegador), guardada como CURRENT_TIMESTAMP (UTC)
+    try:
+        fecha = datetime.fromisoformat(resultado['fecha'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return None
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return (PREFIJO_CLIENTE + cliente_id, fecha.strftime('%Y-%m-%d %H:%M:%S'), tema,
+            correctas, total, correctas / total * 100)
+
+
+def _ids_jugados(resultado):
+    """Ids de las preguntas del mazo jugado ('preguntas'), o [] si no vienen bien."""
+    ids = resultado.get('preguntas')
+    if not isinstance(ids, list) or len(ids) > resultado['total']:
+        return []
+    if any(isinstance(i, bool) or not isinstance(i, int) for i in ids):
+        return []
+    return ids
+
+
+def guardar_lote(resultados, jugador_id=None):
+    """
+    Guarda un lote de partidas jugadas sin conexión.
+
+    Es IDEMPOTENTE: cada resultado trae su id ('id'), que se guarda como
+    'cliente:<id>', y los que ya estaban guardados se ignoran (índice único de estadisticas.cliente_id, ver
+    almacenamiento.guardar_resultados). El navegador puede reenviar el
+    mismo lote tantas veces como haga falta.
+
+    Si el resultado trae los ids de las preguntas del mazo ('preguntas') y
+    se conoce al jugador, esas preguntas se marcan ahora como vistas (los
+    mazos no se marcan al descargarlos, ver mazos_sin_conexion()).
+
+    Args:
+        resultados (list): [{'id', 'tema', 'correctas', 'total', 'fecha',
+                             'preguntas'}, ...] ('preguntas' es opcional)
+        jugador_id (str): Jugador de la sesión, o None si no tiene
+
+    Returns:
+        tuple: (cuerpo JSON, código HTTP). El cuerpo indica qué ids se han
+               aceptado (nuevos o repetidos) y cuáles se han rechazado por
+               no ser válidos; el navegador puede olvidarse de todos ellos.
+    """
+    if not isinstance(resultados, list):
+        return {'error': 'Se esperaba una lista de resultados'}, 400
+    if len(resultados) > MAX_LOTE:
+        return {'error': f'Máximo {MAX_LOTE} resultados por lote'}, 413
+
+    almacen_datos = get_almacen()
+    temas = {tema['nombre'] for tema in almacen_datos.temas()} | {'todos'}
+
+    aceptados = []
+    filas = []
+    rechazados = []
+    for resultado in resultados:
+        fila = _validar_resultado(resultado, temas)
+        if fila is None:
+            rechazados.append(resultado.get('id') if isinstance(resultado, dict) else None)
+        else:
+            aceptados.append(resultado['id'])
+            filas.append(fila)
+            if jugador_id is not None:
+                jugadas = _ids_jugados(resultado)
+                if jugadas:
+                    marcar_vistas(jugador_id, resultado['tema'], jugadas)
+
+    # Una sola transacción para todo el lote; devuelve las que eran nuevas
+    nuevas = almacen_datos.guardar_resultados(filas)
+
+    # Las partidas nuevas también cuentan para los percentiles
+    histogramas = bocetos_de(almacen_datos)
+    for _cliente_id, _fecha, tema, _correctas, _total, porcentaje in nuevas:
+        histogramas.registrar(tema, porcentaje)
+
+    return {
+        'aceptados': aceptados,
+        'nuevos': len(nuevas),
+        'rechazados': rechazados,
+    }, 200
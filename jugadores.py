@@ -0,0 +1,93 @@
+"""
+jugadores.py - Estado de cada jugador guardado en el servidor
+=============================================================
+
+La sesión de Flask vive en una cookie firmada que viaja en cada petición,
+así que solo debe contener cosas pequeñas. Lo que ocupa más (qué preguntas
+ha visto ya cada jugador, ver mazo.py) se guarda en la base de datos, en
+la tabla vistas_jugador, y la sesión solo guarda el identificador del
+jugador.
+
+¿POR QUÉ EN LA BASE DE DATOS Y NO EN MEMORIA?
+---------------------------------------------
+Con varios procesos trabajadores (servidor.py) cada partida de un mismo
+jugador puede caer en un proceso distinto. Si cada proceso recordara por
+su cuenta qué preguntas vio el jugador, se repetirían preguntas entre
+partidas. En la base de datos lo comparten todos los procesos (y todos
+los nodos, con PostgreSQL). Cada centro (centros.py) lo guarda en su
+propio fichero, con sus temas.
+
+Para que la tabla no crezca sin control, los jugadores que llevan
+TTL_SEGUNDOS sin jugar se olvidan. Cada proceso lo comprueba como mucho
+una vez cada PURGA_SEGUNDOS (un DELETE por el índice de `usado`).
+
+Olvidar a un jugador no rompe nada: simplemente vuelve a poder ver
+preguntas que ya había visto.
+
+CÓMO USARLO:
+------------
+    from jugadores import vistas
+
+    with vistas(jugador_id, tema) as registro:
+        registro['vistas'] = 3    # Se modifica en exclusiva y se guarda al salir
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from almacenamiento import get_almacen
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+TTL_SEGUNDOS = 7 * 24 * 3600   # Una semana sin jugar
+PURGA_SEGUNDOS = 3600          # Cada cuánto busca cada proceso jugadores caducados
+
+
+# =============================================================================
+# PREGUNTAS VISTAS
+# =============================================================================
+
+# Centro (None = catálogo principal) -> última purga en este proceso
+_ultima_purga = {}
+_cerrojo = threading.Lock()
+
+
+def _purgar_si_toca(almacen_datos):
+    """Olvida a los jugadores caducados si hace PURGA_SEGUNDOS de la última vez."""
+    ahora = time.monotonic()
+    with _cerrojo:
+        ultima = _ultima_purga.get(almacen_datos.centro)
+        if ultima is not None and ahora - ultima < PURGA_SEGUNDOS:
+            return
+        _ultima_purga[almacen_datos.centro] = ahora
+    corte = datetime.now(timezone.utc) - timedelta(seconds=TTL_SEGUNDOS)
+    almacen_datos.olvidar_jugadores(corte.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+@contextmanager
+def vistas(jugador_id, tema):
+    """
+    Da acceso exclusivo al bitset de preguntas vistas de un jugador en un tema.
+
+    Es un dict {'version', 'bits', 'vistas'} (vacío la primera vez) del
+    almacén en uso (get_almacen()). Mientras dura el bloque `with`, ningún
+    otro proceso puede tocarlo, así que las operaciones dentro deben ser
+    rápidas.
+    """
+    almacen_datos = get_almacen()
+    _purgar_si_toca(almacen_datos)
+    with almacen_datos.vistas(jugador_id, tema) as registro:
+        yield registro
+
+
+def nuevo_id_jugador():
+    """Genera un identificador aleatorio para un jugador nuevo."""
+    return uuid.uuid4().hex
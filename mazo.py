@@ -0,0 +1,316 @@
+"""
+mazo.py - Selección de preguntas sin repetir entre partidas
+===========================================================
+
+Antes, cada partida elegía sus 10 preguntas con ORDER BY RANDOM(), sin
+memoria: quien jugaba dos veces seguidas al mismo tema veía a menudo las
+mismas preguntas. Además ORDER BY RANDOM() tiene que leer y ordenar TODAS
+las preguntas del tema en cada partida.
+
+Ahora recordamos, por jugador y por tema, qué preguntas ha visto ya, y el
+mazo de cada partida se saca solo de las NO vistas. Cuando el jugador ha
+visto todas las del tema, empezamos de cero.
+
+¿CÓMO SE RECUERDAN LAS PREGUNTAS VISTAS?
+----------------------------------------
+Con un "bitset": un bit por pregunta del tema (1 = vista, 0 = no vista),
+guardado en un bytearray. Las preguntas del tema se numeran 0, 1, 2...
+según su posición en la lista ordenada de ids del tema.
+
+    Tema con 100.000 preguntas  ->  100.000 bits = 12,5 KB por jugador
+
+El bitset se guarda en la base de datos (tabla vistas_jugador, ver
+jugadores.py), así que todos los procesos trabajadores lo comparten.
+
+La lista de ids de cada tema se guarda en caché y se invalida cuando
+cambia la versión del catálogo (version_catalogo() del almacén). Si el
+catálogo cambia, las posiciones ya no significan lo mismo y los bitsets
+de esa versión se descartan.
+
+¿CÓMO SE ELIGE EL MAZO?
+-----------------------
+- Si quedan muchas preguntas sin ver: se prueban posiciones al azar y se
+  descartan las vistas (pocas vueltas en promedio)
+- Si quedan pocas sin ver: se recorre el bitset byte a byte para listar
+  las no vistas y se elige entre ellas (saltando los bytes 0xFF, "todo visto")
+En ambos casos el coste está acotado, aunque el tema tenga 100.000 preguntas.
+
+Las preguntas elegidas se leen por id (clave primaria), sin ordenar la tabla.
+
+Los mazos para jugar sin conexión (elegir_mazos) se eligen igual pero no
+se marcan como vistos al descargarlos: se marcan cuando llega el
+resultado de la partida (marcar_vistas).
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import random
+import threading
+from bisect import bisect_left
+
+import memoria
+from almacenamiento import get_almacen
+from jugadores import vistas
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+PREGUNTAS_POR_PARTIDA = 10
+
+# Si la fracción de preguntas sin ver baja de este valor, dejamos de
+# probar posiciones al azar y recorremos el bitset
+FRACCION_MINIMA_MUESTREO = 1 / 16
+
+
+# =============================================================================
+# CACHÉ DE IDS POR TEMA
+# =============================================================================
+
+# (tema, version_catalogo) -> array('q') con los ids ordenados de ese tema
+# array guarda los enteros "en crudo" (8 bytes cada uno) en lugar de como
+# objetos int de Python (28+ bytes), importante con temas muy grandes.
+# Es la del catálogo principal: cada centro lleva la suya (ver centros.py),
+# que desaparece cuando se cierra el centro
+_ids_por_tema = {}
+_cerrojo_ids = threading.Lock()
+memoria.registrar('preguntas', 'mazo.ids_por_tema', lambda: memoria.tamano(_ids_por_tema))
+
+
+def _ids_tema(tema, version):
+    """
+    Devuelve los ids (ordenados) de las preguntas de un tema.
+
+    Args:
+        tema (str): Nombre del tema o 'todos'
+        version (int): Versión del catálogo con la que se cachea
+    """
+    almacen_datos = get_almacen()
+    cache = _ids_por_tema if almacen_datos.centro is None else almacen_datos.ids_por_tema
+    clave = (tema, version)
+    ids = cache.get(clave)
+    if ids is not None:
+        return ids
+
+    ids = almacen_datos.ids_tema(tema)
+
+    with _cerrojo_ids:
+        # Las entradas de versiones anteriores ya no sirven
+        for vieja in [c for c in cache if c[1] != version]:
+            del cache[vieja]
+        cache[clave] = ids
+    return ids
+
+
+def ids_tema(tema):
+    """Ids (ordenados) de las preguntas de un tema con el catálogo actual."""
+    return _ids_tema(tema, get_almacen().version_catalogo())
+
+
+def precalentar():
+    """
+    Carga en la caché los ids de todos los temas (y de 'todos').
+
+    La usa el servidor de producción (servidor.py) antes de crear los
+    procesos trabajadores: así la caché se construye una sola vez y los
+    trabajadores la heredan ya hecha.
+    """
+    almacen_datos = get_almacen()
+    version = almacen_datos.version_catalogo()
+    temas = [tema['nombre'] for tema in almacen_datos.temas()]
+    for tema in temas + ['todos']:
+        _ids_tema(tema, version)
+
+
+# =============================================================================
+# OPERACIONES CON EL BITSET
+# =============================================================================
+
+def _visto(bits, pos):
+    return bits[pos >> 3] & (1 << (pos & 7))
+
+
+def _marcar(bits, pos):
+    bits[pos >> 3] |= 1 << (pos & 7)
+
+
+def _posiciones_no_vistas(bits, n):
+    """Lista las posiciones con bit 0, saltando los bytes completos (0xFF)."""
+    libres = []
+    for i, byte in enumerate(bits):
+        if byte == 0xFF:
+            continue
+        for bit in range(8):
+            pos = (i << 3) | bit
+            if pos < n and not byte & (1 << bit):
+                libres.append(pos)
+    return libres
+
+
+def _elegir_posiciones(bits, n, no_vistas, k, rng):
+    """
+    Elige k posiciones distintas con bit 0 (hay al menos k disponibles).
+    """
+    if no_vistas >= n * FRACCION_MINIMA_MUESTREO:
+        # Muestreo con rechazo: como mínimo 1 de cada 16 intentos acierta
+        elegidas = set()
+        while len(elegidas) < k:
+            pos = rng.randrange(n)
+            if not _visto(bits, pos):
+                elegidas.add(pos)
+        return list(elegidas)
+    return rng.sample(_posiciones_no_vistas(bits, n), k)
+
+
+# =============================================================================
+# API PÚBLICA
+# =============================================================================
+
+def _registro(registro, version, n):
+    """Deja en `registro` un bitset vacío si no tenía o si cambió el catálogo."""
+    if registro.get('version') != version:
+        registro.update(version=version, bits=bytearray((n + 7) // 8), vistas=0)
+    return registro
+
+
+def _tomar(registro, n, k, rng):
+    """
+    Elige k posiciones no vistas del registro y las marca como vistas.
+
+    Si no quedan suficientes, usa las que queden, reinicia el bitset y
+    completa con posiciones nuevas.
+    """
+    bits = registro['bits']
+    no_vistas = n - registro['vistas']
+    if no_vistas >= k:
+        posiciones = _elegir_posiciones(bits, n, no_vistas, k, rng)
+    else:
+        # Tema agotado: usamos las que quedan y empezamos una vuelta nueva.
+        # Las que quedaban se marcan ya en la vuelta nueva para que no
+        # se repitan dentro de este mismo mazo.
+        posiciones = _posiciones_no_vistas(bits, n)
+        bits[:] = bytes(len(bits))
+        registro['vistas'] = 0
+        for pos in posiciones:
+            _marcar(bits, pos)
+        posiciones += _elegir_posiciones(bits, n, n - len(posiciones),
+                                         k - len(posiciones), rng)
+
+    for pos in posiciones:
+        _marcar(bits, pos)
+    registro['vistas'] += len(posiciones)
+    return posiciones
+
+
+def elegir_preguntas(jugador_id, tema, k=PREGUNTAS_POR_PARTIDA, rng=random):
+    """
+    Elige el mazo de una partida evitando las preguntas que el jugador ya vio.
+
+    ¿Qué hace?
+    ----------
+    1. Obtiene (de la caché) los ids de las preguntas del tema
+    2. Recupera el bitset de preguntas vistas del jugador para ese tema
+    3. Elige k preguntas no vistas; si no quedan suficientes, usa las que
+       queden, reinicia el bitset y completa con preguntas nuevas
+    4. Marca las elegidas como vistas
+    5. Lee esas preguntas de la base de datos por su id
+
+    Args:
+        jugador_id (str): Identificador del jugador (ver jugadores.py)
+        tema (str): Nombre del tema o 'todos'
+        k (int): Número de preguntas del mazo
+        rng: Generador aleatorio (random.Random) para poder fijar semillas
+
+    Returns:
+        list: Lista de database.Pregunta, en orden aleatorio
+              (vacía si el tema no existe o no tiene preguntas)
+    """
+    version = get_almacen().version_catalogo()
+    ids = _ids_tema(tema, version)
+    n = len(ids)
+    k = min(k, n)
+    if k == 0:
+        return []
+
+    with vistas(jugador_id, tema) as registro:
+        posiciones = _tomar(_registro(registro, version, n), n, k, rng)
+
+    rng.shuffle(posiciones)
+    elegidos = [ids[pos] for pos in posiciones]
+
+    # Por id (clave primaria) y en este orden
+    return get_almacen().preguntas(elegidos)
+
+
+def elegir_mazos(jugador_id, tema, cantidad, k=PREGUNTAS_POR_PARTIDA, rng=random):
+    """
+    Elige varios mazos para jugar sin conexión, SIN marcarlos como vistos.
+
+    Los mazos se descargan por si se va la red y muchos no llegan a jugarse:
+    sus preguntas se marcan como vistas cuando llega el resultado de la
+    partida (marcar_vistas(), ver juego.guardar_lote). Se eligen sobre una
+    copia del bitset, así que no se repiten entre sí, y se leen todos con
+    una sola consulta.
+
+    Args:
+        jugador_id (str): Identificador del jugador (ver jugadores.py)
+        tema (str): Nombre del tema o 'todos'
+        cantidad (int): Número de mazos
+        k (int): Número de preguntas de cada mazo
+        rng: Generador aleatorio (random.Random) para poder fijar semillas
+
+    Returns:
+        list: Lista de mazos (listas de database.Pregunta)
+    """
+    version = get_almacen().version_catalogo()
+    ids = _ids_tema(tema, version)
+    n = len(ids)
+    k = min(k, n)
+    if k == 0:
+        return []
+
+    with vistas(jugador_id, tema) as registro:
+        _registro(registro, version, n)
+        copia = {'bits': bytearray(registro['bits']), 'vistas': registro['vistas']}
+
+    mazos = []
+    for _ in range(cantidad):
+        posiciones = _tomar(copia, n, k, rng)
+        rng.shuffle(posiciones)
+        mazos.append([ids[pos] for pos in posiciones])
+
+    # Una sola lectura por id para todos los mazos
+    por_id = {fila.id: fila for fila in get_almacen().preguntas(
+        list({id_ for mazo in mazos for id_ in mazo}))}
+    return [[por_id[id_] for id_ in mazo if id_ in por_id] for mazo in mazos]
+
+
+def marcar_vistas(jugador_id, tema, ids_preguntas):
+    """
+    Marca como vistas preguntas de un mazo jugado sin conexión.
+
+    Los ids que ya no están en el tema (catálogo cambiado) se ignoran.
+
+    Args:
+        jugador_id (str): Identificador del jugador (ver jugadores.py)
+        tema (str): Nombre del tema o 'todos'
+        ids_preguntas (list): Ids de las preguntas jugadas
+    """
+    version = get_almacen().version_catalogo()
+    ids = _ids_tema(tema, version)
+    n = len(ids)
+    posiciones = []
+    for id_ in ids_preguntas:
+        pos = bisect_left(ids, id_)
+        if pos < n and ids[pos] == id_:
+            posiciones.append(pos)
+    if not posiciones:
+        return
+
+    with vistas(jugador_id, tema) as registro:
+        bits = _registro(registro, version, n)['bits']
+        for pos in posiciones:
+            if not _visto(bits, pos):
+                _marcar(bits, pos)
+                registro['vistas'] += 1
@@ -0,0 +1,451 @@
+"""
+memoria.py - ¿En qué se gasta la memoria cada proceso?
+======================================================
+
+Cada proceso trabajador va acumulando cosas en memoria: las partidas en
+curso, los ids de cada tema (mazo.py), el espejo del
+catálogo (espejo.py), las lecturas guardadas (vuelo_unico.py), los
+histogramas de puntuación (bocetos.py)... Cuando el sistema operativo
+mata un trabajador por falta de memoria, no sabemos cuál de ellas creció.
+
+Este módulo mira la memoria de DOS formas:
+
+1. CONTABILIDAD: ¿quién GUARDA cuántos bytes?
+   Cada módulo registra aquí sus estructuras (memoria.registrar) y se mide
+   su tamaño recorriendo los objetos (sys.getsizeof de cada uno, sin contar
+   dos veces los compartidos). Es barato y no necesita nada activado.
+
+2. TRACEMALLOC: ¿desde dónde se RESERVÓ la memoria que sigue viva?
+   tracemalloc (biblioteca estándar) apunta cada reserva de memoria de
+   Python con la pila de llamadas que la hizo. Agrupamos las reservas por
+   subsistema según el archivo del quiz más interno de esa pila
+   (SUBSISTEMA_DE_ARCHIVO) y comparamos cada instantánea con la anterior
+   y con la primera: lo que crece sin parar es una fuga.
+
+    subsistema    ¿qué es?
+    ----------    ---------------------------------------------------------
+    partidas      Estado de los jugadores y partidas en curso
+    preguntas     Ids por tema, espejo del catálogo, filas leídas
+    respuestas    Resultados guardados de las lecturas (vuelo_unico.py)
+    bocetos       Histogramas de puntuación por tema
+    analitica     Historial por columnas (analitica.py)
+    peticiones    Flask/Werkzeug y las propias rutas (solo en tracemalloc)
+    otros         El resto: imports, biblioteca estándar...
+
+¡OJO! La sesión de Flask NO ocupa memoria del servidor: viaja en una cookie
+firmada, y las preguntas vistas de cada jugador están en la base de datos
+(jugadores.py). El tamaño de la cookie lo mide el subcomando `simular`.
+
+¡OJO! SQLite reserva su memoria por su cuenta, fuera de Python: tracemalloc
+no la ve. Por eso el espejo se mide con page_count * page_size.
+
+COSTE:
+------
+tracemalloc hace cada reserva más lenta y gasta memoria propia para
+apuntarlas (se informa en 'sobrecarga_bytes'). El coste crece con los
+marcos de pila que se apuntan: medido con el cliente de pruebas, una
+partida completa pasó de ~14 ms a ~36 ms con 1 marco y a ~160 ms con 10.
+Por eso solo se activa a propósito, en un trabajador de prueba o un rato:
+
+    QUIZ_MEMORIA=1 uv run python app.py            # Activa tracemalloc y la ruta
+    QUIZ_MEMORIA_MARCOS=10                         # Marcos de pila por reserva
+
+Si no se encuentra ningún archivo del quiz en los marcos apuntados, la
+reserva va a 'peticiones' (si es de Flask/Werkzeug) o a 'otros'.
+
+Con PYTHONTRACEMALLOC=10 se traza desde el arranque del intérprete
+(también los imports), no solo desde que se carga app.py.
+
+CÓMO USARLO:
+------------
+    GET /api/diagnostico/memoria               # Informe de ESTE proceso
+    GET /api/diagnostico/memoria?base=1        # ... y empieza a comparar desde aquí
+
+    # Consultar un servidor cada 30 segundos (cada respuesta dice su pid)
+    uv run python memoria.py observar http://127.0.0.1:5000 --cada 30
+
+    # Jugar 400 partidas aquí mismo y ver qué subsistema crece
+    uv run python memoria.py simular --partidas 400 --jugadores 100
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import urllib.request
+from collections import deque
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:            # Windows
+    resource = None
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DIRECTORIO = Path(__file__).parent
+
+MARCOS_POR_DEFECTO = 10        # Suelen bastar para llegar desde Flask hasta el quiz
+MAX_LINEAS = 10                # Líneas que más crecen en cada informe
+
+# Archivo del quiz -> subsistema al que se apuntan sus reservas
+SUBSISTEMA_DE_ARCHIVO = {
+    'jugadores.py': 'partidas',
+    'juego.py': 'partidas',
+    'examen.py': 'partidas',
+    'mazo.py': 'preguntas',
+    'centros.py': 'preguntas',
+    'almacenamiento.py': 'preguntas',
+    'espejo.py': 'preguntas',
+    'database.py': 'preguntas',
+    'preguntas.py': 'preguntas',
+    'vuelo_unico.py': 'respuestas',
+    'bocetos.py': 'bocetos',
+    'analitica.py': 'analitica',
+    'app.py': 'peticiones',
+    'asgi.py': 'peticiones',
+    'admision.py': 'peticiones',
+    'trazas.py': 'peticiones',
+    'captura.py': 'peticiones',
+    'presupuesto_sql.py': 'peticiones',
+    'servidor.py': 'peticiones',
+}
+
+# Reservas sin ningún marco del quiz: se miran los paquetes
+PAQUETES_PETICIONES = ('flask', 'werkzeug', 'jinja2', 'itsdangerous', 'markupsafe')
+
+# Lo que no se sigue al medir: son compartidos por todo el proceso
+_NO_SEGUIR = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+              types.MethodType, types.CodeType)
+
+_medidores = []                # (subsistema, nombre, función que devuelve bytes)
+_cerrojo = threading.Lock()
+_base = None                   # subsistema -> bytes de la primera instantánea
+_anterior = None               # (instantánea, subsistema -> bytes) de la última
+
+
+# =============================================================================
+# CONTABILIDAD
+# =============================================================================
+
+def registrar(subsistema, nombre, funcion):
+    """
+    Registra una estructura que ocupa memoria.
+
+    Args:
+        subsistema (str): 'partidas', 'preguntas', 'respuestas', 'bocetos'...
+        nombre (str): Qué es, para el informe (p. ej. 'mazo.ids_por_tema')
+        funcion: Función sin argumentos que devuelve los bytes que ocupa
+    """
+    _medidores.append((subsistema, nombre, funcion))
+
+
+def tamano(objeto):
+    """
+    Bytes que ocupa un objeto junto con todo lo que contiene.
+
+    Recorre diccionarios, listas, tuplas, conjuntos, colas y los atributos
+    de los objetos (__dict__ y __slots__). Cada objeto se cuenta una vez
+    aunque aparezca en varios sitios. Las clases, módulos y funciones no
+    se siguen: son de todo el proceso, no de la estructura medida.
+
+    Si otro hilo cambia un diccionario mientras lo recorremos, Python lanza
+    RuntimeError: en ese caso se vuelve a medir (es un diagnóstico, no hace
+    falta bloquear a nadie).
+    """
+    for _ in range(3):
+        try:
+            return _tamano(objeto)
+        except RuntimeError:
+            continue
+    return None
+
+
+def _tamano(objeto):
+    vistos = set()
+    pendientes = [objeto]
+    total = 0
+    while pendientes:
+        actual = pendientes.pop()
+        if id(actual) in vistos or isinstance(actual, _NO_SEGUIR):
+            continue
+        vistos.add(id(actual))
+        total += sys.getsizeof(actual)
+
+        if isinstance(actual, dict):
+            pendientes.extend(actual.keys())
+            pendientes.extend(actual.values())
+        elif isinstance(actual, (list, tuple, set, frozenset, deque)):
+            pendientes.extend(actual)
+        else:
+            if hasattr(actual, '__dict__'):
+                pendientes.append(vars(actual))
+            for atributo in getattr(type(actual), '__slots__', ()):
+                if hasattr(actual, atributo):
+                    pendientes.append(getattr(actual, atributo))
+    return total
+
+
+def contabilidad():
+    """
+    Bytes de cada estructura registrada, agrupados por subsistema.
+
+    Returns:
+        dict: subsistema -> {'bytes': total, 'partes': {nombre: bytes}}
+    """
+    cuentas = {}
+    for subsistema, nombre, funcion in list(_medidores):
+        medido = funcion()
+        grupo = cuentas.setdefault(subsistema, {'bytes': 0, 'partes': {}})
+        grupo['partes'][nombre] = medido
+        grupo['bytes'] += medido or 0
+    return cuentas
+
+
+# =============================================================================
+# TRACEMALLOC
+# =============================================================================
+
+def activar(marcos=MARCOS_POR_DEFECTO):
+    """Empieza a trazar las reservas (no hace nada si ya se trazaban)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(marcos)
+
+
+def _subsistema(traza):
+    """Subsistema de una reserva: el archivo del quiz más interno de su pila."""
+    primero = None
+    for marco in reversed(traza.traceback):       # Del más reciente al más antiguo
+        ruta = Path(marco.filename)
+        if ruta.parent == DIRECTORIO:
+            return SUBSISTEMA_DE_ARCHIVO.get(ruta.name, 'otros')
+        if primero is None:
+            primero = ruta
+    if primero is not None and any(paquete in primero.parts for paquete in PAQUETES_PETICIONES):
+        return 'peticiones'
+    return 'otros'
+
+
+def _por_subsistema(instantanea):
+    bytes_por_subsistema = {}
+    for traza in instantanea.traces:
+        subsistema = _subsistema(traza)
+        bytes_por_subsistema[subsistema] = bytes_por_subsistema.get(subsistema, 0) + traza.size
+    return bytes_por_subsistema
+
+
+def _lugar(marco):
+    """'mazo.py:190' para el quiz, 'flask/app.py:42' para lo demás."""
+    ruta = Path(marco.filename)
+    if ruta.parent == DIRECTORIO:
+        return f'{ruta.name}:{marco.lineno}'
+    return f'{"/".join(ruta.parts[-2:])}:{marco.lineno}'
+
+
+def _instantanea():
+    """Compara una instantánea nueva con la anterior y con la primera."""
+    global _base, _anterior
+
+    with _cerrojo:
+        # Las reservas de tracemalloc y de este módulo no son del quiz
+        instantanea = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True),
+            tracemalloc.Filter(False, __file__, all_frames=True),
+        ))
+        actual = _por_subsistema(instantanea)
+        if _base is None:
+            _base, _anterior = actual, (instantanea, actual)
+        base = _base
+        instantanea_anterior, anterior = _anterior
+        _anterior = (instantanea, actual)
+
+    crecimiento = [
+        {'lugar': _lugar(estadistica.traceback[0]), 'bytes': estadistica.size,
+         'diferencia': estadistica.size_diff, 'bloques': estadistica.count_diff}
+        for estadistica in instantanea.compare_to(instantanea_anterior, 'lineno')[:MAX_LINEAS]
+        if estadistica.size_diff > 0
+    ]
+    trazado, pico = tracemalloc.get_traced_memory()
+    return {
+        'marcos': tracemalloc.get_traceback_limit(),
+        'trazado_bytes': trazado,
+        'trazado_pico_bytes': pico,
+        'sobrecarga_bytes': tracemalloc.get_tracemalloc_memory(),
+        'subsistemas': {
+            subsistema: {
+                'bytes': actual.get(subsistema, 0),
+                'desde_anterior': actual.get(subsistema, 0) - anterior.get(subsistema, 0),
+                'desde_base': actual.get(subsistema, 0) - base.get(subsistema, 0),
+            }
+            for subsistema in sorted(set(actual) | set(base))
+        },
+        'crecimiento': crecimiento,
+    }
+
+
+def reiniciar_base():
+    """Olvida las instantáneas: el próximo informe será la nueva base."""
+    global _base, _anterior
+    with _cerrojo:
+        _base = _anterior = None
+
+
+# =============================================================================
+# INFORME DEL PROCESO
+# =============================================================================
+
+def _rss():
+    """Memoria residente actual del proceso (solo Linux), o None."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _rss_pico():
+    """Memoria residente máxima que ha llegado a tener el proceso, o None."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == 'darwin' else pico * 1024   # Linux da KB
+
+
+def informe():
+    """
+    Informe de memoria de ESTE proceso.
+
+    Returns:
+        dict: pid, memoria residente, contabilidad por subsistema y, si
+              tracemalloc está activo, la comparación de instantáneas
+              (si no, 'tracemalloc' es None)
+    """
+    return {
+        'pid': os.getpid(),
+        'rss_bytes': _rss(),
+        'rss_pico_bytes': _rss_pico(),
+        'contabilidad': contabilidad(),
+        'tracemalloc': _instantanea() if tracemalloc.is_tracing() else None,
+    }
+
+
+# =============================================================================
+# LÍNEA DE COMANDOS
+# =============================================================================
+
+def _kb(n):
+    return '        -' if n is None else f'{n / 1024:9.1f}'
+
+
+def _imprimir(datos, titulo):
+    print(f"\n── {titulo} · pid {datos['pid']} · RSS {_kb(datos['rss_bytes']).strip()} KB "
+          f"(pico {_kb(datos['rss_pico_bytes']).strip()} KB)")
+    print('   contabilidad (KB):')
+    for subsistema, grupo in sorted(datos['contabilidad'].items()):
+        partes = ', '.join(f'{nombre} {_kb(b).strip()}' for nombre, b in grupo['partes'].items())
+        print(f"     {subsistema:<11} {_kb(grupo['bytes'])}   ({partes})")
+    traza = datos['tracemalloc']
+    if traza is None:
+        print('   tracemalloc: desactivado (QUIZ_MEMORIA=1)')
+        return
+    print(f"   tracemalloc (KB): trazado {_kb(traza['trazado_bytes']).strip()}, "
+          f"sobrecarga {_kb(traza['sobrecarga_bytes']).strip()}")
+    print(f"     {'subsistema':<11} {'actual':>9} {'Δ anterior':>10} {'Δ base':>9}")
+    for subsistema, fila in traza['subsistemas'].items():
+        print(f"     {subsistema:<11} {_kb(fila['bytes'])} {fila['desde_anterior'] / 1024:+10.1f} "
+              f"{fila['desde_base'] / 1024:+9.1f}")
+    for linea in traza['crecimiento']:
+        print(f"     + {linea['diferencia'] / 1024:8.1f} KB  {linea['lugar']}  ({linea['bloques']:+} bloques)")
+
+
+def observar(url, cada, veces):
+    """Pide el informe a un servidor cada `cada` segundos."""
+    destino = url.rstrip('/') + '/api/diagnostico/memoria'
+    n = 0
+    while True:
+        with urllib.request.urlopen(destino, timeout=30) as respuesta:
+            _imprimir(json.load(respuesta), time.strftime('%H:%M:%S'))
+        n += 1
+        if veces and n >= veces:
+            return
+        time.sleep(cada)
+
+
+def simular(partidas, jugadores, tema, pasos, marcos):
+    """
+    Juega partidas con el cliente de pruebas de Flask y enseña qué crece.
+
+    Usa una base de datos SQLite temporal (no toca quiz.db). Cada jugador
+    es un cliente con su propia cookie de sesión; al final se muestra
+    el tamaño medio de esa cookie.
+    """
+    import database
+    from mazo import PREGUNTAS_POR_PARTIDA
+
+    def jugar(cliente):
+        cliente.post('/api/jugar', json={'tema': tema})
+        for _ in range(PREGUNTAS_POR_PARTIDA):
+            cliente.post('/api/responder', json={'respuesta': 'a'})
+
+    with tempfile.TemporaryDirectory() as temporal:
+        database.DB_PATH = Path(temporal) / 'memoria.db'
+        from app import app
+        from bocetos import bocetos
+
+        # Una partida de calentamiento antes de trazar: los imports perezosos
+        # y las cachés de Flask no son parte del crecimiento por partida
+        clientes = [app.test_client() for _ in range(jugadores)]
+        jugar(app.test_client())
+        activar(marcos)
+        _imprimir(informe(), 'base')
+
+        jugadas = 0
+        for paso in range(1, pasos + 1):
+            objetivo = partidas * paso // pasos
+            while jugadas < objetivo:
+                jugar(clientes[jugadas % jugadores])
+                jugadas += 1
+            _imprimir(informe(), f'{jugadas} partidas')
+
+        # Lo pendiente se guarda ya: al salir la base de datos temporal no existe
+        bocetos.guardar()
+
+        cookies = [cliente.get_cookie('session') for cliente in clientes]
+        tamanos = [len(cookie.value) for cookie in cookies if cookie is not None]
+        if tamanos:
+            print(f'\nCookie de sesión: {sum(tamanos) / len(tamanos):.0f} bytes de media, '
+                  f'{max(tamanos)} como máximo (viaja en cada petición, no ocupa el servidor)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Contabilidad de memoria y instantáneas de tracemalloc.')
+    subcomandos = parser.add_subparsers(dest='accion', required=True)
+    observar_args = subcomandos.add_parser('observar', help='Consultar /api/diagnostico/memoria de un servidor')
+    observar_args.add_argument('url', help='p. ej. http://127.0.0.1:5000 (arrancado con QUIZ_MEMORIA=1)')
+    observar_args.add_argument('--cada', type=float, default=30, help='Segundos entre consultas')
+    observar_args.add_argument('--veces', type=int, default=0, help='0 = sin fin')
+    simular_args = subcomandos.add_parser('simular', help='Jugar partidas aquí mismo y medir')
+    simular_args.add_argument('--partidas', type=int, default=200)
+    simular_args.add_argument('--jugadores', type=int, default=50)
+    simular_args.add_argument('--tema', default='todos')
+    simular_args.add_argument('--pasos', type=int, default=4)
+    simular_args.add_argument('--marcos', type=int, default=MARCOS_POR_DEFECTO)
+    args = parser.parse_args()
+
+    # Los módulos del quiz se registran en `memoria`, no en este `__main__`
+    import memoria
+
+    if args.accion == 'observar':
+        memoria.observar(args.url, args.cada, args.veces)
+    else:
+        memoria.simular(args.partidas, args.jugadores, args.tema, args.pasos, args.marcos)
@@ -0,0 +1,247 @@
+"""
+plan_consultas.py - Vigilancia de los planes de consulta de SQLite
+==================================================================
+
+Con 100 preguntas cualquier consulta es instantánea, así que nadie se da
+cuenta cuando una consulta nueva recorre una tabla entera (SCAN) o tiene
+que ordenar todas sus filas en una tabla temporal (USE TEMP B-TREE). Con
+un millón de partidas esa misma consulta tarda segundos.
+
+Este script:
+  1. Genera (la primera vez) una base de datos sintética grande con
+     generador.py, en bench_datos/
+  2. Ejecuta la aplicación de verdad contra ella: las rutas de app.py
+     (con el cliente de pruebas de Flask), las funciones de database.py,
+     la carga inicial de preguntas.py, mazo.py, retencion.py, bocetos.py,
+     examen.py y analitica.py
+  3. Apunta CADA sentencia SQL que se ejecuta (con database.observadores_sql)
+     y dónde se ejecutó
+  4. Pide a SQLite el plan de cada una con EXPLAIN QUERY PLAN
+  5. FALLA (código de salida 1) si algún plan tiene SCAN o USE TEMP B-TREE
+     y la consulta no está en la lista PERMITIDAS
+
+¿QUÉ ES EXPLAIN QUERY PLAN?
+---------------------------
+SQLite explica cómo va a ejecutar la consulta sin ejecutarla:
+
+    SEARCH estadisticas USING INDEX idx_estadisticas_fecha (fecha<?)   <- bien
+    SCAN preguntas                                                     <- recorre todo
+    USE TEMP B-TREE FOR ORDER BY                                       <- ordena todo
+
+Si una consulta necesita de verdad recorrer una tabla (por ejemplo, una
+que se ejecuta solo al arrancar), se añade a PERMITIDAS explicando POR QUÉ.
+
+CÓMO USARLO:
+------------
+    uv run python plan_consultas.py
+    uv run python plan_consultas.py --preguntas 1000000 --partidas 1000000
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+import database
+from generador import generar_datos
+
+DIRECTORIO = Path(__file__).parent
+DIRECTORIO_DATOS = DIRECTORIO / 'bench_datos'
+
+# =============================================================================
+# LISTA DE CONSULTAS PERMITIDAS
+# =============================================================================
+# (sentencia SQL normalizada, trozo del plan que se permite, motivo)
+# La sentencia se compara entera (espacios colapsados): si alguien cambia
+# la consulta, tiene que volver a justificar su plan.
+
+PERMITIDAS = [
+    ('SELECT * FROM temas', 'SCAN temas',
+     'Catálogo de temas: se muestran todos y son pocos (también mazo.precalentar())'),
+    ('SELECT COUNT(*) FROM temas', 'SCAN temas',
+     'tablas_vacias(): solo al arrancar'),
+    ('SELECT COUNT(*) FROM preguntas', 'SCAN preguntas',
+     'tablas_vacias() y carga inicial: solo al arrancar'),
+    ('SELECT id FROM preguntas ORDER BY id', 'SCAN preguntas',
+     "Ids de 'todos' en mazo.py: una vez por versión del catálogo (se cachean)"),
+    ('SELECT t.nombre, COUNT(p.id) as total FROM temas t LEFT JOIN preguntas p '
+     'ON t.id = p.tema_id GROUP BY t.id', 'SCAN t',
+     'contar_preguntas(): un recuento por tema, solo herramientas'),
+    ('SELECT t.nombre, t.icono, COUNT(p.id) as total FROM temas t LEFT JOIN preguntas p '
+     'ON t.id = p.tema_id GROUP BY t.id', 'SCAN t',
+     'mostrar_estadisticas(): solo al cargar las preguntas'),
+    ('SELECT id, fecha, tema, correctas, total, porcentaje '
+     'FROM estadisticas ORDER BY fecha DESC LIMIT ?',
+     'SCAN estadisticas USING INDEX idx_estadisticas_fecha',
+     'Recorre el índice de fechas desde el final y para en 10 filas (LIMIT 10)'),
+    ('SELECT id, fecha, tema, correctas, total, porcentaje '
+     'FROM estadisticas ORDER BY fecha, id LIMIT ?',
+     'SCAN estadisticas USING INDEX idx_estadisticas_fecha',
+     'retencion.historial() sin filtros: recorre el índice de fechas en orden y para en el límite'),
+]
+
+# Planes que indican que se recorre o se ordena una tabla entera
+PATRON_PROBLEMA = re.compile(r'\bSCAN\b(?! CONSTANT ROW)|USE TEMP B-TREE')
+
+# Solo estas sentencias tienen un plan que revisar (CREATE, PRAGMA... no)
+PATRON_CONSULTA = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.I)
+
+
+def normalizar(sql):
+    """Colapsa espacios y saltos de línea: 'SELECT *\\n   FROM x' -> 'SELECT * FROM x'"""
+    return ' '.join(sql.split())
+
+
+# =============================================================================
+# RECOGIDA DE SENTENCIAS
+# =============================================================================
+
+def recoger_sentencias(ruta_grande):
+    """
+    Ejecuta la aplicación y devuelve las sentencias SQL que lanza.
+
+    Returns:
+        dict: sentencia normalizada -> conjunto de lugares de llamada
+    """
+    sentencias = {}
+
+    def observador(sql, _inicio, _duracion):
+        if PATRON_CONSULTA.match(sql):
+            lugares = database.lugares_llamada(maximo=1) or ['?']
+            sentencias.setdefault(normalizar(sql), set()).add(lugares[0])
+
+    database.observadores_sql.append(observador)
+    try:
+        # 1. Carga inicial de preguntas.py (necesita una base de datos vacía)
+        import preguntas
+        with tempfile.TemporaryDirectory() as temporal:
+            database.DB_PATH = Path(temporal) / 'vacia.db'
+            database.init_db()
+            database.tablas_vacias()
+            preguntas.cargar_todas_las_preguntas()
+            preguntas.mostrar_estadisticas()
+
+        # 2. La aplicación contra la base de datos grande
+        database.DB_PATH = ruta_grande
+        import bocetos
+        import mazo
+        import retencion
+        from app import app
+
+        database.obtener_id_tema('Tema 0001')
+        database.contar_preguntas()
+        database.version_catalogo()
+        mazo.precalentar()
+        retencion.archivar(dias=36_500, pausa=0)   # Nada tiene 100 años: no borra nada
+
+        cliente = app.test_client()
+        cliente.get('/')
+        cliente.get('/api/temas')
+        cliente.get('/api/estadisticas')
+        cliente.get('/api/estadisticas/historial')
+        cliente.get('/api/estadisticas/historial?desde=2025-01-01&hasta=2025-02-01&tema=Tema 0001')
+        cliente.get('/api/estadisticas/historial?tema=Tema 0001')
+        cliente.get('/api/estadisticas/historial?desde=2025-01-01')
+        for tema in ('todos', 'Tema 0001'):
+            cliente.post('/api/jugar', json={'tema': tema})
+            for _ in range(10):
+                cliente.post('/api/responder', json={'respuesta': 'a'})
+        cliente.post('/api/mazos', json={'tema': 'Tema 0002', 'cantidad': 2})
+        cliente.post('/api/resultados/lote', json={'resultados': [
+            {'id': 'plan-consultas', 'tema': 'Tema 0001', 'correctas': 5, 'total': 10,
+             'fecha': '2025-01-01T00:00:00Z'}]})
+        respuesta = cliente.post('/api/examenes', json={'nombre': 'plan', 'tema': 'Tema 0001', 'preguntas': 3})
+        if respuesta.status_code == 200:
+            cliente.get(f"/api/examenes/{respuesta.json['id']}")
+            cliente.post(f"/api/examenes/{respuesta.json['id']}/hojas",
+                         data='alumno,respuestas\nplan,abc', content_type='text/csv')
+        cliente.get('/api/analitica?agrupar=tema,semana&desde=2025-01-01&percentiles=50,90')
+        bocetos.bocetos.guardar()
+    finally:
+        database.observadores_sql.remove(observador)
+    return sentencias
+
+
+# =============================================================================
+# REVISIÓN DE PLANES
+# =============================================================================
+
+def plan(conn, sql):
+    """Líneas de EXPLAIN QUERY PLAN (los ? se dejan a NULL: el plan no depende)."""
+    parametros = [None] * sql.count('?')
+    return [fila[3] for fila in conn.execute('EXPLAIN QUERY PLAN ' + sql, parametros)]
+
+
+def permitido(sql, linea):
+    """Motivo por el que esta línea del plan está permitida, o None."""
+    for permitida, fragmento, motivo in PERMITIDAS:
+        if sql == normalizar(permitida) and fragmento in linea:
+            return motivo
+    return None
+
+
+def revisar(ruta, sentencias):
+    """
+    Revisa el plan de cada sentencia.
+
+    Returns:
+        list: [(sql, lugares, plan, problemas sin permiso, permitidos)]
+    """
+    conn = database.get_db(ruta)
+    informe = []
+    for sql in sorted(sentencias):
+        lineas = plan(conn, sql)
+        problemas, permitidos = [], []
+        for linea in lineas:
+            if PATRON_PROBLEMA.search(linea):
+                motivo = permitido(sql, linea)
+                if motivo is None:
+                    problemas.append(linea)
+                else:
+                    permitidos.append(f'{linea}  ({motivo})')
+        informe.append((sql, sorted(sentencias[sql]), lineas, problemas, permitidos))
+    conn.close()
+    return informe
+
+
+def preparar_base(preguntas, partidas):
+    """Genera la base de datos sintética si todavía no existe."""
+    DIRECTORIO_DATOS.mkdir(exist_ok=True)
+    ruta = DIRECTORIO_DATOS / f'plan_{preguntas}_{partidas}.db'
+    if not ruta.exists():
+        print(f'🔧 Generando {ruta} ({preguntas} preguntas, {partidas} partidas)...')
+        generar_datos(ruta, n_preguntas=preguntas, n_partidas=partidas)
+    return ruta
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Falla si alguna consulta recorre u ordena una tabla entera sin permiso.')
+    parser.add_argument('--preguntas', type=int, default=200_000)
+    parser.add_argument('--partidas', type=int, default=200_000)
+    args = parser.parse_args()
+
+    ruta = preparar_base(args.preguntas, args.partidas)
+    informe = revisar(ruta, recoger_sentencias(ruta))
+
+    fallos = 0
+    for sql, lugares, lineas, problemas, permitidos in informe:
+        icono = '❌' if problemas else ('⚠️ ' if permitidos else '✅')
+        print(f'{icono} {sql}')
+        print(f"     desde: {', '.join(lugares)}")
+        for linea in problemas:
+            print(f'     PROBLEMA: {linea}')
+        for linea in permitidos:
+            print(f'     permitido: {linea}')
+        fallos += bool(problemas)
+
+    print(f'\n{len(informe)} consultas revisadas, {fallos} con planes no permitidos')
+    sys.exit(1 if fallos else 0)
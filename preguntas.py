@@ -18,6 +18,9 @@ FORMATO DE CADA PREGUNTA:
 Cada pregunta es una tupla con 7 elementos:
 (tema_id, pregunta, opcion_a, opcion_b, opcion_c, respuesta_correcta, explicacion)
 
+Es el orden de database.CAMPOS_PREGUNTA sin el id (lo pone la base de
+datos). Al leerlas, almacenamiento.py las devuelve como database.Pregunta.
+
 Ejemplo:
     (1, '¿Qué función suma elementos?', 'np.add()', 'np.sum()', 'np.plus()', 'b', 'np.sum() suma todos.')
 
@@ -33,7 +36,7 @@ Autor: Profesor de SAA
 Fecha: 2025
 """
 
-from database import get_db
+from database import CAMPOS_PREGUNTA, carga_catalogo, get_db
 
 
 # =============================================================================
@@ -50,6 +53,10 @@ TEMAS = [
     ('Pandas', 'Análisis y manipulación de datos', '🐼'),
 ]
 
+# Columnas de cada tupla de pregunta: las de database.Pregunta menos el id
+CAMPOS_INSERCION = CAMPOS_PREGUNTA[1:]
+COLUMNAS_INSERCION = ', '.join(CAMPOS_INSERCION)
+
 
 # =============================================================================
 # PREGUNTAS DE NUMPY
@@ -228,11 +235,19 @@ def get_preguntas_pandas(tema_id):
     ]
 
 
+# Preguntas de cada tema de TEMAS (las usa también almacenamiento.py para
+# cargar el catálogo en PostgreSQL)
+PREGUNTAS_POR_TEMA = {
+    'NumPy': get_preguntas_numpy,
+    'Pandas': get_preguntas_pandas,
+}
+
+
 # =============================================================================
 # FUNCIÓN PRINCIPAL DE CARGA
 # =============================================================================
 
-def cargar_todas_las_preguntas():
+def cargar_todas_las_preguntas(ruta=None):
     """
     Carga todos los temas y preguntas en la base de datos SQLite.
     
@@ -249,6 +264,10 @@ def cargar_todas_las_preguntas():
     4. Genera todas las preguntas con esos IDs
     5. Inserta todas las preguntas en la tabla 'preguntas'
     
+    Args:
+        ruta (Path o str, opcional): Base de datos donde cargarlas (por
+            defecto quiz.db; centros.py la usa para el catálogo de un centro)
+    
     Returns:
         bool: True si se cargaron datos, False si ya existían
     
@@ -264,7 +283,7 @@ def cargar_todas_las_preguntas():
     Con executemany (RÁPIDO - USAMOS ESTO):
         cursor.executemany('INSERT INTO...', preguntas)
     """
-    conn = get_db()
+    conn = get_db(ruta)
     cursor = conn.cursor()
     
     # -------------------------------------------------------------------------
@@ -275,44 +294,46 @@ def cargar_todas_las_preguntas():
         conn.close()
         return False  # Ya hay datos, no hacemos nada
     
-    # -------------------------------------------------------------------------
-    # PASO 2: Insertar los temas
-    # -------------------------------------------------------------------------
-    # INSERT OR IGNORE: Si el tema ya existe (por nombre UNIQUE), lo ignora
-    cursor.executemany(
-        'INSERT OR IGNORE INTO temas (nombre, descripcion, icono) VALUES (?, ?, ?)', 
-        TEMAS
-    )
-    conn.commit()  # Guardamos para que se generen los IDs
-    
-    # -------------------------------------------------------------------------
-    # PASO 3: Obtener los IDs de los temas insertados
-    # -------------------------------------------------------------------------
-    # Necesitamos los IDs para asociar las preguntas a cada tema
-    cursor.execute('SELECT id FROM temas WHERE nombre = "NumPy"')
-    numpy_id = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT id FROM temas WHERE nombre = "Pandas"')
-    pandas_id = cursor.fetchone()[0]
-    
-    # -------------------------------------------------------------------------
-    # PASO 4: Recopilar todas las preguntas
-    # -------------------------------------------------------------------------
-    # Concatenamos las listas de preguntas de cada tema
-    todas_las_preguntas = (
-        get_preguntas_numpy(numpy_id) + 
-        get_preguntas_pandas(pandas_id)
-    )
-    
-    # -------------------------------------------------------------------------
-    # PASO 5: Insertar todas las preguntas de una vez
-    # -------------------------------------------------------------------------
-    cursor.executemany('''
-        INSERT INTO preguntas (tema_id, pregunta, opcion_a, opcion_b, opcion_c, respuesta_correcta, explicacion)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', todas_las_preguntas)
-    
-    conn.commit()  # Guardar todos los cambios
+    # Toda la carga en UNA transacción: la versión del catálogo sube una vez
+    # al final y no una vez por cada pregunta (ver database.carga_catalogo)
+    with carga_catalogo(conn):
+        # ---------------------------------------------------------------------
+        # PASO 2: Insertar los temas
+        # ---------------------------------------------------------------------
+        # INSERT OR IGNORE: Si el tema ya existe (por nombre UNIQUE), lo ignora
+        cursor.executemany(
+            'INSERT OR IGNORE INTO temas (nombre, descripcion, icono) VALUES (?, ?, ?)', 
+            TEMAS
+        )
+        # Sin commit: dentro de la misma transacción ya se ven los IDs
+    
+        # ---------------------------------------------------------------------
+        # PASO 3: Obtener los IDs de los temas insertados
+        # ---------------------------------------------------------------------
+        # Necesitamos los IDs para asociar las preguntas a cada tema
+        cursor.execute('SELECT id FROM temas WHERE nombre = "NumPy"')
+        numpy_id = cursor.fetchone()[0]
+    
+        cursor.execute('SELECT id FROM temas WHERE nombre = "Pandas"')
+        pandas_id = cursor.fetchone()[0]
+    
+        # ---------------------------------------------------------------------
+        # PASO 4: Recopilar todas las preguntas
+        # ---------------------------------------------------------------------
+        # Concatenamos las listas de preguntas de cada tema
+        todas_las_preguntas = (
+            get_preguntas_numpy(numpy_id) + 
+            get_preguntas_pandas(pandas_id)
+        )
+    
+        # ---------------------------------------------------------------------
+        # PASO 5: Insertar todas las preguntas de una vez
+        # ---------------------------------------------------------------------
+        cursor.executemany(
+            f'INSERT INTO preguntas ({COLUMNAS_INSERCION}) VALUES ({", ".join("?" * len(CAMPOS_INSERCION))})',
+            todas_las_preguntas
+        )
+
     conn.close()   # Liberar la conexión
     
     return True  # Indicamos que sí se cargaron datos
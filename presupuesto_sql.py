@@ -0,0 +1,239 @@
+"""
+presupuesto_sql.py - Presupuesto de SQL por petición y detector de N+1
+======================================================================
+
+Las funciones pequeñas como database.obtener_id_tema() abren una conexión
+y lanzan una consulta cada vez que se llaman. Una sola llamada no cuesta
+nada; el problema llega cuando alguien la mete en un bucle:
+
+    for nombre in temas:
+        tema_id = obtener_id_tema(nombre)      # 1 conexión + 1 consulta... x N
+
+Es el clásico problema "N+1": una consulta para la lista y N más, una por
+elemento, cuando bastaba con una o dos.
+
+Este módulo cuenta, en cada petición observada:
+  - Las CONEXIONES abiertas (database.observadores_conexion)
+  - Las CONSULTAS ejecutadas (database.observadores_sql)
+  - Cuántas veces se repite cada "FORMA" de consulta: el SQL con los
+    valores sustituidos por ?, así que
+        SELECT id FROM temas WHERE nombre = 'NumPy'
+        SELECT id FROM temas WHERE nombre = 'Pandas'
+    tienen la misma forma
+
+Y AVISA (una línea JSON en el log 'quiz.presupuesto') cuando una petición:
+  - Abre más de MAX_CONEXIONES conexiones
+  - Ejecuta más de MAX_CONSULTAS consultas
+  - Repite una misma forma más de MAX_REPETICIONES veces (posible N+1)
+
+El aviso incluye la ruta y DESDE DÓNDE se hizo cada cosa (archivo:línea
+de las funciones del quiz que abrieron la conexión o lanzaron la consulta).
+
+MUESTREO:
+---------
+Contar tiene un coste (sobre todo buscar desde dónde se llamó), así que
+en producción solo se observa una fracción de las peticiones. En
+desarrollo conviene observarlas todas (QUIZ_PRESUPUESTO_MUESTREO=1).
+
+CÓMO ACTIVARLO:
+---------------
+    QUIZ_PRESUPUESTO=1 QUIZ_PRESUPUESTO_MUESTREO=1 uv run python app.py
+
+    QUIZ_PRESUPUESTO_CONSULTAS=20      Consultas por petición
+    QUIZ_PRESUPUESTO_CONEXIONES=5      Conexiones por petición
+    QUIZ_PRESUPUESTO_REPETICIONES=5    Veces que se puede repetir una forma
+
+Los avisos acumulados por ruta están en /api/diagnostico/presupuesto.
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import json
+import logging
+import random
+import re
+import threading
+from collections import Counter
+
+from flask import g, has_app_context, request
+
+import database
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MUESTREO_POR_DEFECTO = 0.01
+MAX_CONSULTAS = 20
+MAX_CONEXIONES = 5
+MAX_REPETICIONES = 5
+
+_logger = logging.getLogger('quiz.presupuesto')
+_config = {
+    'muestreo': MUESTREO_POR_DEFECTO,
+    'consultas': MAX_CONSULTAS,
+    'conexiones': MAX_CONEXIONES,
+    'repeticiones': MAX_REPETICIONES,
+}
+
+# Avisos acumulados: ruta -> {'avisos': n, 'ultimo': informe}
+_avisos = {}
+_cerrojo = threading.Lock()
+_observadas = 0                  # Peticiones observadas en total
+
+
+# =============================================================================
+# FORMA DE UNA CONSULTA
+# =============================================================================
+
+_TEXTO = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def forma(sql):
+    """
+    Quita de una consulta los valores concretos.
+
+        SELECT * FROM preguntas WHERE id IN (4, 8, 15)   -> ... WHERE id IN (?...)
+        SELECT id FROM temas WHERE nombre = "NumPy"      -> ... WHERE nombre = ?
+    """
+    sql = _TEXTO.sub('?', sql)
+    sql = _NUMERO.sub('?', sql)
+    sql = _LISTA.sub('(?...)', sql)
+    return ' '.join(sql.split())
+
+
+# =============================================================================
+# CUENTA DE LA PETICIÓN ACTUAL
+# =============================================================================
+
+class Cuenta:
+    """Conexiones y consultas de una petición. Se guarda en flask.g."""
+
+    __slots__ = ('conexiones', 'consultas', 'formas', 'lugares_conexion', 'lugares_forma')
+
+    def __init__(self):
+        self.conexiones = 0
+        self.consultas = 0
+        self.formas = Counter()          # forma -> veces
+        self.lugares_conexion = Counter()  # 'archivo:línea función < ...' -> veces
+        self.lugares_forma = {}          # forma -> Counter de lugares
+
+    def excesos(self):
+        """Lista de límites superados (vacía si la petición va bien)."""
+        excesos = []
+        if self.conexiones > _config['conexiones']:
+            excesos.append('conexiones')
+        if self.consultas > _config['consultas']:
+            excesos.append('consultas')
+        if any(veces > _config['repeticiones'] for veces in self.formas.values()):
+            excesos.append('repeticiones')
+        return excesos
+
+    def informe(self, excesos):
+        repetidas = [
+            {'forma': sql, 'veces': veces,
+             'desde': [lugar for lugar, _ in self.lugares_forma[sql].most_common(3)]}
+            for sql, veces in self.formas.most_common()
+            if veces > _config['repeticiones'] or 'consultas' in excesos
+        ][:5]
+        return {
+            'metodo': request.method,
+            'ruta': request.path,
+            'endpoint': request.endpoint,
+            'excesos': excesos,
+            'conexiones': self.conexiones,
+            'consultas': self.consultas,
+            'conexiones_desde': [lugar for lugar, _ in self.lugares_conexion.most_common(3)],
+            'consultas_repetidas': repetidas,
+        }
+
+
+def _cuenta_actual():
+    if not has_app_context():
+        return None
+    return g.get('_cuenta_sql')
+
+
+# Los observadores llaman DIRECTAMENTE a database.lugares_llamada(): así sabe
+# cuántos marcos de la pila saltar. Los lugares se guardan como una cadena
+# corta: 'database.py:393 obtener_id_tema < app.py:210 index'
+
+def _observar_conexion():
+    """Observador para database.observadores_conexion."""
+    cuenta = _cuenta_actual()
+    if cuenta is not None:
+        cuenta.conexiones += 1
+        cuenta.lugares_conexion[' < '.join(database.lugares_llamada()) or '?'] += 1
+
+
+def _observar_consulta(sql, _inicio, _duracion):
+    """Observador para database.observadores_sql."""
+    cuenta = _cuenta_actual()
+    if cuenta is not None:
+        cuenta.consultas += 1
+        clave = forma(sql)
+        cuenta.formas[clave] += 1
+        lugares = cuenta.lugares_forma.setdefault(clave, Counter())
+        lugares[' < '.join(database.lugares_llamada()) or '?'] += 1
+
+
+# =============================================================================
+# GANCHOS DE FLASK
+# =============================================================================
+
+def _empezar():
+    """before_request: ¿observamos esta petición?"""
+    if random.random() < _config['muestreo']:
+        g._cuenta_sql = Cuenta()
+
+
+def _terminar(_error=None):
+    """teardown_request: comprueba el presupuesto y avisa si se ha superado."""
+    global _observadas
+    cuenta = g.pop('_cuenta_sql', None)
+    if cuenta is None:
+        return
+    excesos = cuenta.excesos()
+    with _cerrojo:
+        _observadas += 1
+        if not excesos:
+            return
+        informe = cuenta.informe(excesos)
+        registro = _avisos.setdefault(informe['endpoint'] or informe['ruta'], {'avisos': 0})
+        registro['avisos'] += 1
+        registro['ultimo'] = informe
+    _logger.warning(json.dumps(informe, ensure_ascii=False))
+
+
+def estado():
+    """Configuración, peticiones observadas y avisos por ruta."""
+    with _cerrojo:
+        return {
+            'limites': dict(_config),
+            'observadas': _observadas,
+            'avisos': {ruta: dict(registro) for ruta, registro in _avisos.items()},
+        }
+
+
+def instalar(app, muestreo=MUESTREO_POR_DEFECTO, consultas=MAX_CONSULTAS,
+             conexiones=MAX_CONEXIONES, repeticiones=MAX_REPETICIONES):
+    """
+    Activa el presupuesto de SQL en una aplicación Flask.
+
+    Args:
+        app (Flask): La aplicación
+        muestreo (float): Fracción de peticiones observadas (0-1)
+        consultas (int): Consultas permitidas por petición
+        conexiones (int): Conexiones permitidas por petición
+        repeticiones (int): Veces que se puede repetir una misma forma
+    """
+    _config.update(muestreo=muestreo, consultas=consultas,
+                   conexiones=conexiones, repeticiones=repeticiones)
+    if _observar_consulta not in database.observadores_sql:
+        database.observadores_sql.append(_observar_consulta)
+        database.observadores_conexion.append(_observar_conexion)
+    app.before_request(_empezar)
+    app.teardown_request(_terminar)
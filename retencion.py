@@ -0,0 +1,315 @@
+"""
+retencion.py - Archivado y compactación de la tabla estadisticas
+================================================================
+
+Cada partida terminada añade una fila a `estadisticas` y nunca se borra
+ninguna. Con los meses, quiz.db (y cada copia de seguridad) crece sin
+parar, aunque el juego solo enseña las 10 últimas partidas.
+
+Este módulo aplica una POLÍTICA DE RETENCIÓN:
+
+  1. ARCHIVAR: las partidas con más de N días se escriben en ficheros
+     NDJSON comprimidos con gzip, uno por mes:
+
+         quiz_archivo/estadisticas-2025-03.ndjson.gz
+
+     (una línea JSON por partida; se pueden leer con zcat o pandas)
+
+  2. BORRAR POR LOTES: se borran de la tabla de lote en lote, cada lote en
+     su propia transacción corta y con una pausa entre lotes. Así el
+     juego puede seguir guardando partidas mientras se archiva (un único
+     DELETE gigante bloquearía las escrituras durante segundos).
+     Cada lote se escribe y se sincroniza en disco ANTES de borrarlo de
+     la tabla: si el proceso se corta, como mucho un lote entero queda
+     en el archivo y en la tabla a la vez (al leer se descartan repetidas).
+
+  3. COMPACTAR: PRAGMA incremental_vacuum devuelve al disco las páginas
+     que han quedado libres, poco a poco, y ANALYZE actualiza las
+     estadísticas que usa SQLite para elegir índices.
+
+  4. LEER EL HISTÓRICO: historial() junta las partidas archivadas y las
+     de la tabla, para que las consultas de fechas antiguas sigan
+     funcionando (ruta /api/estadisticas/historial). Las dos fuentes se
+     leen ya ordenadas (la tabla con ORDER BY ... LIMIT, los archivos mes
+     a mes) y se para en cuanto hay `limite` partidas.
+
+Sobre el vacío incremental:
+---------------------------
+Solo funciona si la base de datos tiene auto_vacuum = INCREMENTAL. init_db()
+lo pone en las bases de datos NUEVAS; una base de datos antigua necesita
+convertirse UNA vez con --convertir (hace un VACUUM completo, que bloquea
+la base de datos mientras dura: mejor con el servidor parado).
+
+CÓMO USARLO:
+------------
+    # Archivar las partidas de más de un año
+    uv run python retencion.py --dias 365
+
+    # Convertir una base de datos antigua al vacío incremental
+    uv run python retencion.py --convertir
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import database
+from almacenamiento import AlmacenSQLite, get_almacen
+from database import get_db
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DIAS_RETENCION = 365      # Las partidas más antiguas se archivan
+TAMANO_LOTE = 5_000       # Filas archivadas y borradas en cada transacción
+PAUSA_LOTES = 0.05        # Segundos entre lotes (para dejar escribir al juego)
+PAGINAS_POR_PASO = 1_000  # Páginas liberadas en cada incremental_vacuum
+
+PREFIJO = 'estadisticas-'
+EXTENSION = '.ndjson.gz'
+
+# Formato de CURRENT_TIMESTAMP (UTC), el de la columna fecha
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def directorio_archivo(ruta=None):
+    """Carpeta de los archivos de una base de datos: quiz.db -> quiz_archivo/"""
+    ruta = Path(ruta or database.DB_PATH)
+    return ruta.with_name(ruta.stem + '_archivo')
+
+
+def _fichero_mes(directorio, mes):
+    return directorio / f'{PREFIJO}{mes}{EXTENSION}'
+
+
+# =============================================================================
+# ARCHIVAR Y BORRAR
+# =============================================================================
+
+def _escribir(fichero, filas):
+    """
+    Añade filas a un archivo mensual y espera a que lleguen al disco.
+
+    Cada llamada añade un "miembro" gzip nuevo al final del fichero; gzip
+    lee todos los miembros seguidos como si fueran uno solo.
+    """
+    with open(fichero, 'ab') as bruto:
+        with gzip.GzipFile(fileobj=bruto, mode='wb') as comprimido:
+            for fila in filas:
+                comprimido.write(json.dumps(fila, ensure_ascii=False).encode('utf-8') + b'\n')
+        bruto.flush()
+        os.fsync(bruto.fileno())
+
+
+def archivar(dias=DIAS_RETENCION, lote=TAMANO_LOTE, pausa=PAUSA_LOTES, ruta=None):
+    """
+    Mueve al archivo las partidas con más de `dias` días y compacta.
+
+    Args:
+        dias (int): Antigüedad a partir de la cual se archiva
+        lote (int): Filas por transacción
+        pausa (float): Segundos entre lotes
+        ruta (Path o str, opcional): Base de datos (por defecto DB_PATH)
+
+    Returns:
+        dict: Resumen (filas archivadas, ficheros tocados, compactación)
+    """
+    corte = (datetime.now(timezone.utc) - timedelta(days=dias)).strftime(FORMATO_FECHA)
+    directorio = directorio_archivo(ruta)
+    directorio.mkdir(exist_ok=True)
+
+    conn = get_db(ruta)
+    archivadas = 0
+    meses = set()
+    while True:
+        # Usa idx_estadisticas_fecha: no recorre la tabla entera
+        filas = conn.execute('''
+            SELECT * FROM estadisticas
+            WHERE fecha < ?
+            ORDER BY fecha, id
+            LIMIT ?
+        ''', (corte, lote)).fetchall()
+        if not filas:
+            break
+
+        # 1. Al archivo (agrupadas por mes) y al disco
+        por_mes = defaultdict(list)
+        for fila in filas:
+            por_mes[fila['fecha'][:7]].append(dict(fila))
+        for mes, registros in por_mes.items():
+            _escribir(_fichero_mes(directorio, mes), registros)
+        meses.update(por_mes)
+
+        # 2. Fuera de la tabla, en una transacción corta
+        with conn:
+            conn.executemany('DELETE FROM estadisticas WHERE id = ?',
+                             [(fila['id'],) for fila in filas])
+        archivadas += len(filas)
+        time.sleep(pausa)
+
+    resumen = {'corte': corte, 'archivadas': archivadas, 'meses': sorted(meses)}
+    resumen.update(compactar(conn, pausa))
+    conn.close()
+    return resumen
+
+
+def compactar(conn, pausa=PAUSA_LOTES):
+    """
+    Devuelve al disco las páginas libres (por pasos) y ejecuta ANALYZE.
+
+    Returns:
+        dict: {'vacio_incremental': bool, 'paginas_liberadas': int}
+    """
+    incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    liberadas = 0
+    if incremental:
+        while True:
+            libres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not libres:
+                break
+            # executescript y no execute: el módulo sqlite3 solo da un paso
+            # a la sentencia con execute(), y eso libera UNA página
+            conn.executescript(f'PRAGMA incremental_vacuum({PAGINAS_POR_PASO})')
+            liberadas += libres - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            time.sleep(pausa)
+    conn.execute('ANALYZE estadisticas')
+    conn.commit()
+    return {'vacio_incremental': incremental, 'paginas_liberadas': liberadas}
+
+
+def convertir_a_incremental(ruta=None):
+    """
+    Activa auto_vacuum = INCREMENTAL en una base de datos ya creada.
+
+    ¡Hace un VACUUM completo! Reescribe el fichero entero y bloquea la base
+    de datos mientras tanto. Solo hace falta una vez.
+    """
+    conn = get_db(ruta)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    conn.close()
+
+
+# =============================================================================
+# LECTURA DEL HISTÓRICO (archivo + tabla)
+# =============================================================================
+
+def _leer_archivo(fichero):
+    """Lee las filas de un archivo mensual (tolera un final cortado)."""
+    try:
+        with gzip.open(fichero, 'rt', encoding='utf-8') as lector:
+            for linea in lector:
+                if linea.strip():
+                    yield json.loads(linea)
+    except (EOFError, gzip.BadGzipFile):
+        # El proceso se cortó escribiendo el último lote: esas filas no
+        # llegaron a borrarse de la tabla, así que no se pierde nada
+        return
+
+
+def _orden(fila):
+    return (fila['fecha'], fila['id'])
+
+
+def _archivadas(directorio, desde, hasta, tema):
+    """
+    Partidas archivadas que cumplen los filtros, por (fecha, id).
+
+    Los ficheros se leen mes a mes y solo los que se solapan con el
+    intervalo. Dentro de un mes se ordenan (las partidas sin conexión
+    pueden llegar tarde y archivarse en otro lote), así que en memoria
+    hay como mucho las partidas de un mes que pasan los filtros.
+    """
+    for fichero in sorted(directorio.glob(f'{PREFIJO}*{EXTENSION}')):
+        mes = fichero.name[len(PREFIJO):-len(EXTENSION)]
+        if (desde and mes < desde[:7]) or (hasta and mes > hasta[:7]):
+            continue
+        filas = [fila for fila in _leer_archivo(fichero)
+                 if (desde is None or fila['fecha'] >= desde)
+                 and (hasta is None or fila['fecha'] < hasta)
+                 and (tema is None or fila['tema'] == tema)]
+        filas.sort(key=_orden)
+        yield from filas
+
+
+def historial(desde=None, hasta=None, tema=None, limite=None, ruta=None):
+    """
+    Partidas entre dos fechas, estén archivadas o en la tabla.
+
+    Args:
+        desde (str, opcional): Fecha inicial incluida ('2025-01-01' o con hora)
+        hasta (str, opcional): Fecha final NO incluida
+        tema (str, opcional): Solo las partidas de este tema
+        limite (int, opcional): Máximo de partidas (las más antiguas primero)
+        ruta (Path o str, opcional): Otra base de datos SQLite (por defecto, el
+            almacén en uso: get_almacen())
+
+    Returns:
+        list: Diccionarios con las columnas de estadisticas salvo cliente_id,
+              por fecha
+    """
+    # El almacén en uso (quiz.db, la base de un centro o PostgreSQL); `ruta`
+    # lee otro fichero SQLite
+    almacen = AlmacenSQLite(ruta) if ruta is not None else get_almacen()
+
+    # Tabla: las recientes y las que aún no se han archivado. Basta con las
+    # `limite` primeras: las demás no pueden estar entre las primeras del total
+    fuentes = [almacen.partidas(desde, hasta, tema, limite=limite)]
+
+    # Archivos del mismo fichero que la tabla: cada base de datos SQLite
+    # tiene su carpeta (archivar() no funciona con PostgreSQL), y así
+    # tampoco se mezclan ids de bases de datos distintas
+    directorio = (directorio_archivo(almacen.ruta)
+                  if isinstance(almacen, AlmacenSQLite) else None)
+    if directorio is not None and directorio.is_dir():
+        fuentes.append(_archivadas(directorio, desde, hasta, tema))
+
+    partidas = []
+    vistas = set()
+    for fila in heapq.merge(*fuentes, key=_orden):
+        if fila['id'] in vistas:
+            continue            # En el archivo y en la tabla: un lote cortado
+        vistas.add(fila['id'])
+        fila = dict(fila)
+        fila.pop('cliente_id', None)    # El archivo lo guarda; la API no lo enseña
+        partidas.append(fila)
+        if limite is not None and len(partidas) >= limite:
+            break               # No se leen más meses del archivo
+    return partidas
+
+
+# =============================================================================
+# EJECUCIÓN DIRECTA DEL MÓDULO
+# =============================================================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archiva y compacta la tabla estadisticas.')
+    parser.add_argument('--db', default=None, help='Base de datos (por defecto quiz.db)')
+    parser.add_argument('--dias', type=int, default=DIAS_RETENCION)
+    parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+    parser.add_argument('--convertir', action='store_true',
+                        help='Activa el vacío incremental (VACUUM completo, una sola vez)')
+    args = parser.parse_args()
+
+    if args.convertir:
+        print('🧹 Convirtiendo al vacío incremental (VACUUM completo)...')
+        convertir_a_incremental(args.db)
+    else:
+        inicio = time.perf_counter()
+        resumen = archivar(args.dias, args.lote, ruta=args.db)
+        print(f"📦 {resumen['archivadas']} partidas anteriores a {resumen['corte']} archivadas "
+              f"en {directorio_archivo(args.db)}/ ({time.perf_counter() - inicio:.1f} s)")
+        if resumen['vacio_incremental']:
+            print(f"🧹 {resumen['paginas_liberadas']} páginas devueltas al disco")
+        else:
+            print('⚠️  Sin vacío incremental: el fichero no encoge (usa --convertir una vez)')
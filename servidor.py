@@ -0,0 +1,215 @@
+"""
+servidor.py - Servidor de producción del Quiz
+=============================================
+
+`uv run python app.py` arranca el servidor de DESARROLLO de Flask: un solo
+proceso, con el recargador automático (que además ejecuta
+inicializar_app() dos veces). Sirve para programar, no para una clase
+entera jugando a la vez.
+
+Este módulo añade el comando `servir`, que arranca el quiz con gunicorn:
+
+  - Varios PROCESOS trabajadores (--workers), cada uno con varios HILOS
+    (--hilos). Los procesos aprovechan varios núcleos; los hilos atienden
+    varias peticiones por proceso mientras otras esperan a SQLite.
+  - La aplicación se carga UNA vez en el proceso principal ("preload") y
+    los trabajadores se crean con fork() a partir de él.
+  - Apagado ordenado: al recibir SIGTERM se dejan terminar las partidas
+    en curso antes de parar (ver "DRENAJE").
+
+¿QUÉ ES "COPY-ON-WRITE" Y POR QUÉ gc.freeze()?
+----------------------------------------------
+Tras fork(), padre e hijos comparten la memoria física hasta que alguien
+la ESCRIBE. Lo que cargamos antes de fork (módulos, plantillas, caché de
+ids de preguntas...) lo comparten todos los trabajadores gratis.
+
+El problema: el recolector de basura de Python escribe en cada objeto que
+revisa, y eso obliga a copiar páginas enteras en cada trabajador. Por eso:
+  1. gc.disable() mientras se calientan las cachés. Con `flask --app app
+     servir` la aplicación ya está importada cuando empieza load(): las
+     recolecciones de la importación ya han pasado, pero fueron en el
+     proceso principal ANTES de fork() y no copian nada en los trabajadores
+  2. gc.collect() y gc.freeze(): TODOS los objetos existentes (también los
+     creados al importar la aplicación) pasan a una generación
+     "permanente" que el recolector ya no revisa
+  3. gc.enable() en cada trabajador recién creado
+
+DRENAJE (apagado sin cortar partidas):
+--------------------------------------
+Una partida son 11 peticiones a lo largo de varios minutos. Al recibir
+SIGTERM el proceso principal:
+  1. Marca "drenando" en memoria compartida con los trabajadores
+  2. Los trabajadores rechazan partidas NUEVAS (/api/jugar -> 503 con
+     Retry-After) pero siguen atendiendo /api/responder
+  3. Cuando pasan SEGUNDOS_INACTIVIDAD sin ninguna respuesta (ya no quedan
+     partidas en curso) o se agota --drenaje, se paran los trabajadores
+     de forma ordenada (terminan las peticiones que tengan a medias)
+Un segundo SIGTERM (o Ctrl+C) para inmediatamente.
+
+CÓMO USARLO:
+------------
+    uv sync --extra produccion
+    uv run flask --app app servir --host 0.0.0.0 --port 8000 --workers 4 --hilos 8
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import gc
+import multiprocessing
+import os
+import time
+
+import click
+from flask import jsonify, request
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+DRENAJE_MAXIMO = 60          # Segundos máximos esperando partidas en curso
+SEGUNDOS_INACTIVIDAD = 10    # Sin respuestas durante este tiempo = ya no hay partidas
+REINTENTAR_EN = 30           # Valor de Retry-After mientras se drena
+
+# Memoria compartida entre el proceso principal y los trabajadores.
+# Se crea al importar el módulo, ANTES de fork(), para que todos la hereden.
+# lock=False: son valores sueltos que solo se leen/escriben enteros
+_drenando = multiprocessing.Value('b', 0, lock=False)
+_ultima_respuesta = multiprocessing.Value('d', 0.0, lock=False)
+
+
+# =============================================================================
+# DRENAJE EN LOS TRABAJADORES (ganchos de Flask)
+# =============================================================================
+
+def _rechazar_partidas_nuevas():
+    """before_request: mientras se drena no se empiezan partidas."""
+    if _drenando.value and request.endpoint == 'iniciar_juego':
+        respuesta = jsonify({'error': 'El servidor se está reiniciando, vuelve a intentarlo'})
+        respuesta.status_code = 503
+        respuesta.headers['Retry-After'] = str(REINTENTAR_EN)
+        return respuesta
+    return None
+
+
+def _anotar_respuesta(respuesta):
+    """after_request: apunta cuándo se respondió la última pregunta."""
+    if request.endpoint == 'responder':
+        _ultima_respuesta.value = time.time()
+    return respuesta
+
+
+def instalar_drenaje(app):
+    """Registra los ganchos de drenaje en la aplicación Flask."""
+    app.before_request(_rechazar_partidas_nuevas)
+    app.after_request(_anotar_respuesta)
+
+
+# =============================================================================
+# GUNICORN
+# =============================================================================
+
+def _calentar(app):
+    """
+    Llena las cachés antes de fork() para que los trabajadores las hereden.
+    """
+    import analitica
+    import mazo
+    from app import lectura_compartida, leer_temas
+
+    with app.app_context():
+        app.jinja_env.get_template('index.html')
+    lectura_compartida('temas', leer_temas)
+    mazo.precalentar()
+    analitica.precargar()
+
+
+def _post_fork(_servidor, _trabajador):
+    """Gancho de gunicorn: se ejecuta en cada trabajador recién creado."""
+    import captura
+    import trazas
+    gc.enable()
+    trazas.tras_fork()
+    captura.tras_fork()
+
+
+def crear_servidor(host, port, workers, hilos, drenaje, timeout):
+    """
+    Construye el servidor gunicorn con la aplicación precargada.
+
+    Se importa gunicorn aquí dentro porque es una dependencia opcional
+    (solo hace falta en producción).
+    """
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.arbiter import Arbiter
+
+    class ArbitroConDrenaje(Arbiter):
+        """Proceso principal de gunicorn con drenaje de partidas."""
+
+        inicio_drenaje = None
+
+        def handle_term(self):
+            if self.inicio_drenaje is not None:
+                raise StopIteration        # Segundo SIGTERM: parar ya
+            self.log.info('Drenando partidas en curso (máx. %s s)...', drenaje)
+            _drenando.value = 1
+            self.inicio_drenaje = time.time()
+
+        def manage_workers(self):
+            super().manage_workers()
+            if self.inicio_drenaje is None:
+                return
+            ahora = time.time()
+            ultima = max(_ultima_respuesta.value, self.inicio_drenaje)
+            if ahora - ultima >= SEGUNDOS_INACTIVIDAD or ahora - self.inicio_drenaje >= drenaje:
+                raise StopIteration        # El bucle principal llama a halt()
+
+    class ServidorQuiz(BaseApplication):
+        def load_config(self):
+            opciones = {
+                'bind': f'{host}:{port}',
+                'workers': workers,
+                'threads': hilos,
+                'worker_class': 'gthread',
+                'preload_app': True,
+                'timeout': timeout,
+                'graceful_timeout': timeout,
+                'post_fork': _post_fork,
+            }
+            for clave, valor in opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            # Con `flask --app app servir`, app ya está importada: lo que
+            # evita esto son las recolecciones mientras se calienta
+            gc.disable()
+            from app import app
+            _calentar(app)
+            gc.collect()
+            gc.freeze()
+            return app
+
+        def run(self):
+            ArbitroConDrenaje(self).run()
+
+    return ServidorQuiz()
+
+
+@click.command('servir')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--workers', default=(os.cpu_count() or 1) * 2, show_default='2 x núcleos',
+              help='Procesos trabajadores.')
+@click.option('--hilos', default=8, show_default=True, help='Hilos por trabajador.')
+@click.option('--drenaje', default=DRENAJE_MAXIMO, show_default=True,
+              help='Segundos máximos esperando partidas en curso al apagar.')
+@click.option('--timeout', default=30, show_default=True,
+              help='Segundos máximos de una petición.')
+def comando_servir(host, port, workers, hilos, drenaje, timeout):
+    """Arranca el quiz con el servidor de producción (gunicorn)."""
+    try:
+        servidor = crear_servidor(host, port, workers, hilos, drenaje, timeout)
+    except ImportError:
+        raise click.ClickException('El servidor de producción necesita gunicorn: '
+                                   'uv sync --extra produccion')
+    servidor.run()
@@ -0,0 +1,146 @@
+/*
+ * offline.js - Mazos y resultados guardados en el navegador (IndexedDB)
+ * =====================================================================
+ *
+ * Lo usan la página (index.html) y el service worker (sw.js).
+ *
+ *   mazos       tema -> {tema, mazos: [[pregunta, ...], ...]}
+ *               Mazos descargados de /api/mazos, con la respuesta correcta,
+ *               para jugar cuando no hay red o el servidor no responde.
+ *
+ *   resultados  id -> {id, tema, correctas, total, fecha, preguntas}
+ *               Partidas terminadas (con los ids de sus preguntas, que el
+ *               servidor marca entonces como vistas) pendientes de enviar a
+ *               /api/resultados/lote. Se borran cuando el servidor las
+ *               confirma; si el envío falla se reintenta más tarde (el
+ *               servidor ignora los ids repetidos).
+ */
+
+const QuizOffline = (() => {
+    const NOMBRE_BD = 'quiz-offline';
+    const MAZOS_MINIMOS = 2;       // Por debajo, se descargan más
+    const MAZOS_POR_PETICION = 3;
+    const TAMANO_LOTE = 100;       // Resultados por envío
+
+    let bd = null;
+
+    function abrir() {
+        if (bd) return bd;
+        bd = new Promise((resolve, reject) => {
+            const peticion = indexedDB.open(NOMBRE_BD, 1);
+            peticion.onupgradeneeded = () => {
+                peticion.result.createObjectStore('mazos', { keyPath: 'tema' });
+                peticion.result.createObjectStore('resultados', { keyPath: 'id' });
+            };
+            peticion.onsuccess = () => resolve(peticion.result);
+            peticion.onerror = () => reject(peticion.error);
+        });
+        return bd;
+    }
+
+    // Ejecuta `operacion(almacen)` en una transacción y espera a que termine
+    async function transaccion(almacen, modo, operacion) {
+        const conexion = await abrir();
+        return new Promise((resolve, reject) => {
+            const tx = conexion.transaction(almacen, modo);
+            let resultado;
+            const peticion = operacion(tx.objectStore(almacen));
+            if (peticion) peticion.onsuccess = () => { resultado = peticion.result; };
+            tx.oncomplete = () => resolve(resultado);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    // -------------------------------------------------------------------------
+    // MAZOS
+    // -------------------------------------------------------------------------
+
+    async function contarMazos(tema) {
+        const registro = await transaccion('mazos', 'readonly', almacen => almacen.get(tema));
+        return registro ? registro.mazos.length : 0;
+    }
+
+    // Saca un mazo guardado del tema (o null si no queda ninguno)
+    async function tomarMazo(tema) {
+        let mazo = null;
+        await transaccion('mazos', 'readwrite', almacen => {
+            const peticion = almacen.get(tema);
+            peticion.onsuccess = () => {
+                const registro = peticion.result;
+                if (registro && registro.mazos.length) {
+                    mazo = registro.mazos.shift();
+                    almacen.put(registro);
+                }
+            };
+        });
+        return mazo;
+    }
+
+    // Descarga mazos del tema si quedan pocos. Devuelve cuántos hay guardados.
+    async function rellenarMazos(tema) {
+        const guardados = await contarMazos(tema);
+        if (guardados >= MAZOS_MINIMOS || !navigator.onLine) return guardados;
+
+        const respuesta = await fetch('/api/mazos', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ tema: tema, cantidad: MAZOS_POR_PETICION })
+        });
+        if (!respuesta.ok) return guardados;
+        const datos = await respuesta.json();
+
+        await transaccion('mazos', 'readwrite', almacen => {
+            const peticion = almacen.get(tema);
+            peticion.onsuccess = () => {
+                const registro = peticion.result || { tema: tema, mazos: [] };
+                registro.mazos.push(...datos.mazos);
+                almacen.put(registro);
+            };
+        });
+        return guardados + datos.mazos.length;
+    }
+
+    // -------------------------------------------------------------------------
+    // RESULTADOS PENDIENTES
+    // -------------------------------------------------------------------------
+
+    function encolarResultado(tema, correctas, total, preguntas) {
+        // crypto.randomUUID() solo existe en https o localhost
+        const id = crypto.randomUUID ? crypto.randomUUID()
+            : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+        const resultado = {
+            id: id,
+            tema: tema,
+            correctas: correctas,
+            total: total,
+            preguntas: preguntas,
+            fecha: new Date().toISOString()
+        };
+        return transaccion('resultados', 'readwrite', almacen => almacen.put(resultado));
+    }
+
+    // Envía los resultados pendientes por lotes. Devuelve cuántos se confirmaron.
+    async function sincronizarResultados() {
+        const pendientes = await transaccion('resultados', 'readonly', almacen => almacen.getAll());
+        let confirmados = 0;
+        for (let i = 0; i < pendientes.length; i += TAMANO_LOTE) {
+            const respuesta = await fetch('/api/resultados/lote', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ resultados: pendientes.slice(i, i + TAMANO_LOTE) })
+            });
+            if (!respuesta.ok) break;      // Servidor ocupado o caído: otra vez será
+            const datos = await respuesta.json();
+            // Los rechazados no son válidos: reenviarlos no serviría de nada
+            const olvidar = datos.aceptados.concat(datos.rechazados.filter(id => id));
+            await transaccion('resultados', 'readwrite', almacen => {
+                olvidar.forEach(id => almacen.delete(id));
+            });
+            confirmados += datos.aceptados.length;
+        }
+        return confirmados;
+    }
+
+    return { contarMazos, tomarMazo, rellenarMazos, encolarResultado, sincronizarResultados };
+})();
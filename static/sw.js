@@ -0,0 +1,59 @@
+/*
+ * sw.js - Service worker del modo sin conexión
+ * ============================================
+ *
+ * Guarda en caché la "carcasa" de la aplicación (la página principal,
+ * offline.js y la lista de temas) para que el quiz se abra aunque no
+ * haya red. Siempre se intenta primero la red, y la copia en caché solo
+ * se usa si falla; así los cambios del servidor se ven enseguida.
+ *
+ * Las peticiones POST (jugar, responder, mazos, resultados) no pasan por
+ * la caché. Los mazos y los resultados pendientes viven en IndexedDB
+ * (ver offline.js).
+ */
+
+importScripts('/static/offline.js');
+
+const CACHE = 'quiz-carcasa-v1';
+const CARCASA = ['/', '/static/offline.js', '/api/temas'];
+
+self.addEventListener('install', evento => {
+    evento.waitUntil(
+        caches.open(CACHE)
+            .then(cache => cache.addAll(CARCASA))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', evento => {
+    // Borrar las cachés de versiones anteriores del service worker
+    evento.waitUntil(
+        caches.keys()
+            .then(nombres => Promise.all(nombres.filter(n => n !== CACHE).map(n => caches.delete(n))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', evento => {
+    const url = new URL(evento.request.url);
+    if (evento.request.method !== 'GET' || !CARCASA.includes(url.pathname)) return;
+
+    evento.respondWith(
+        fetch(evento.request)
+            .then(respuesta => {
+                if (respuesta.ok) {
+                    const copia = respuesta.clone();
+                    caches.open(CACHE).then(cache => cache.put(url.pathname, copia));
+                }
+                return respuesta;
+            })
+            .catch(() => caches.match(url.pathname))
+    );
+});
+
+// Background Sync: el navegador nos avisa cuando vuelve la conexión
+self.addEventListener('sync', evento => {
+    if (evento.tag === 'resultados') {
+        evento.waitUntil(QuizOffline.sincronizarResultados());
+    }
+});
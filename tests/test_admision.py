@@ -0,0 +1,173 @@
+"""
+test_admision.py - Orden de la cola de ControlAdmision
+======================================================
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import threading
+import time
+
+import pytest
+
+from admision import ControlAdmision
+
+CLASES = {'alta': (0, 4), 'media': (1, 1), 'baja': (2, 4)}
+
+
+def _en_cola(control):
+    return sum(datos['en_cola'] for datos in control.estado()['clases'].values())
+
+
+def _encoladas(control, clase):
+    return control.estado()['clases'][clase]['encoladas']
+
+
+def _esperar(condicion, limite=2.0):
+    fin = time.monotonic() + limite
+    while not condicion():
+        if time.monotonic() > fin:
+            raise AssertionError('No se cumplió a tiempo')
+        time.sleep(0.001)
+
+
+class Peticion(threading.Thread):
+    """Pide paso, anota el orden en que entra y espera a que la suelten."""
+
+    def __init__(self, control, clase, orden):
+        super().__init__(daemon=True)
+        self.control, self.clase, self.orden = control, clase, orden
+        self.soltar = threading.Event()
+        self.admitida = None
+
+    def run(self):
+        self.admitida = self.control.entrar(self.clase)
+        if self.admitida:
+            self.orden.append(self.name)
+            self.soltar.wait(5)
+            self.control.salir(self.clase)
+
+
+def _encolar(control, clase, orden, nombre):
+    """Lanza una petición y espera a que esté en la cola."""
+    antes = _encoladas(control, clase)
+    peticion = Peticion(control, clase, orden)
+    peticion.name = nombre
+    peticion.start()
+    _esperar(lambda: _encoladas(control, clase) == antes + 1)
+    return peticion
+
+
+def test_entra_directamente_si_hay_hueco():
+    control = ControlAdmision(clases=CLASES, max_total=2)
+    assert control.entrar('baja')
+    assert control.entrar('alta')
+    estado = control.estado()
+    assert estado['total_activas'] == 2
+    control.salir('baja')
+    control.salir('alta')
+    assert control.estado()['total_activas'] == 0
+
+
+def test_prioridad_y_orden_de_llegada():
+    control = ControlAdmision(clases=CLASES, max_total=1, max_cola=10, espera_max=5)
+    assert control.entrar('alta')
+    orden = []
+    peticiones = [
+        _encolar(control, 'baja', orden, 'baja1'),
+        _encolar(control, 'alta', orden, 'alta1'),
+        _encolar(control, 'baja', orden, 'baja2'),
+        _encolar(control, 'alta', orden, 'alta2'),
+    ]
+    control.salir('alta')
+    # Una a una: cada una deja paso a la siguiente al salir
+    esperado = ['alta1', 'alta2', 'baja1', 'baja2']
+    for i, nombre in enumerate(esperado, 1):
+        _esperar(lambda: len(orden) == i)
+        next(p for p in peticiones if p.name == nombre).soltar.set()
+    for peticion in peticiones:
+        peticion.join(2)
+    assert orden == esperado
+
+
+def test_clase_llena_no_bloquea_a_otras():
+    """Si 'media' espera por su límite, una 'baja' con hueco entra igual."""
+    control = ControlAdmision(clases=CLASES, max_total=4, max_cola=10, espera_max=5)
+    assert control.entrar('media')
+    orden = []
+    media = _encolar(control, 'media', orden, 'media2')
+    assert control.entrar('baja')
+    assert media.admitida is None          # Sigue esperando su hueco
+    control.salir('media')
+    _esperar(lambda: orden == ['media2'])
+    media.soltar.set()
+    media.join(2)
+    control.salir('baja')
+
+
+def test_cola_llena_desplaza_al_de_menos_prioridad():
+    control = ControlAdmision(clases=CLASES, max_total=1, max_cola=1, espera_max=5)
+    assert control.entrar('alta')
+    orden = []
+    baja = _encolar(control, 'baja', orden, 'baja')
+    alta = _encolar(control, 'alta', orden, 'alta')
+    baja.join(2)
+    assert baja.admitida is False           # Desplazada: 503
+    # Con la cola llena, una de prioridad igual o menor se rechaza sin esperar
+    assert control.entrar('alta') is False
+    assert control.entrar('baja') is False
+
+    control.salir('alta')
+    _esperar(lambda: orden == ['alta'])
+    alta.soltar.set()
+    alta.join(2)
+    contadores = control.estado()['clases']
+    assert contadores['baja']['desplazadas'] == 1
+    assert contadores['alta']['rechazadas'] == 1
+    assert contadores['baja']['rechazadas'] == 1
+
+
+def test_espera_maxima():
+    control = ControlAdmision(clases=CLASES, max_total=1, max_cola=10, espera_max=0.05)
+    assert control.entrar('alta')
+    assert control.entrar('baja') is False
+    estado = control.estado()
+    assert estado['clases']['baja']['expiradas'] == 1
+    assert _en_cola(control) == 0
+    control.salir('alta')
+    # El hueco liberado es para la siguiente, no para la que expiró
+    assert control.entrar('baja')
+    control.salir('baja')
+
+
+@pytest.mark.parametrize('hilos', [8, 32])
+def test_nunca_supera_los_limites(hilos):
+    control = ControlAdmision(clases=CLASES, max_total=3, max_cola=hilos, espera_max=5)
+    cerrojo = threading.Lock()
+    activas = {clase: 0 for clase in CLASES}
+    picos = {'total': 0, **{clase: 0 for clase in CLASES}}
+
+    def trabajar(clase):
+        for _ in range(20):
+            if not control.entrar(clase):
+                continue
+            with cerrojo:
+                activas[clase] += 1
+                picos[clase] = max(picos[clase], activas[clase])
+                picos['total'] = max(picos['total'], sum(activas.values()))
+            time.sleep(0.0005)
+            with cerrojo:
+                activas[clase] -= 1
+            control.salir(clase)
+
+    trabajadores = [threading.Thread(target=trabajar, args=(list(CLASES)[i % 3],))
+                    for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join(30)
+    assert picos['total'] <= 3
+    for clase, (_, limite) in CLASES.items():
+        assert picos[clase] <= limite
+    assert control.estado()['total_activas'] == 0
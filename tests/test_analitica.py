@@ -0,0 +1,194 @@
+"""
+test_analitica.py - La caché por columnas contra un cálculo ingenuo
+===================================================================
+
+Cada consulta se repite partida a partida en Python (agrupar con un dict,
+percentiles con np.percentile) y se compara con la vectorizada.
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import analitica
+from analitica import CacheAnalitica, _numerar
+
+TEMAS = ['NumPy', 'Pandas', 'SQL', 'Git']
+PERCENTILES = [0, 10, 50, 90, 100]
+
+
+class AlmacenFalso:
+    """Lo mínimo que lee CacheAnalitica de un almacén."""
+
+    centro = None
+
+    def __init__(self, filas):
+        self.filas = filas
+
+    def partidas_por_id(self, despues_de, limite):
+        return [fila for fila in self.filas if fila[0] > despues_de][:limite]
+
+    def fecha_minima(self):
+        return min(fila[1] for fila in self.filas) if self.filas else None
+
+
+def _partidas(n, semilla=0):
+    """(id, fecha, tema, correctas, total, porcentaje) entre 2024-01-01 y 2025-06-30."""
+    rng = random.Random(semilla)
+    inicio = datetime(2024, 1, 1)
+    segundos = int((datetime(2025, 7, 1) - inicio).total_seconds())
+    filas = []
+    for i in range(1, n + 1):
+        fecha = inicio + timedelta(seconds=rng.randrange(segundos))
+        total = rng.choice([5, 10])
+        correctas = rng.randint(0, total)
+        filas.append((i, fecha.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(TEMAS),
+                      correctas, total, round(correctas / total * 100, 2)))
+    return filas
+
+
+def _etiqueta(campo, fecha, tema):
+    dia = datetime.fromisoformat(fecha).date()
+    if campo == 'tema':
+        return tema
+    if campo == 'dia':
+        return dia.isoformat()
+    if campo == 'semana':
+        return (dia - timedelta(days=dia.weekday())).isoformat()
+    return dia.strftime('%Y-%m')
+
+
+def _ingenua(filas, agrupar, desde=None, hasta=None, temas=None):
+    """Grupos {(etiquetas...): [filas]} filtrando fila a fila."""
+    grupos = {}
+    for fila in filas:
+        _, fecha, tema = fila[:3]
+        if desde is not None and fecha < desde:
+            continue
+        if hasta is not None and fecha >= hasta:
+            continue
+        if temas is not None and tema not in temas:
+            continue
+        clave = tuple(_etiqueta(campo, fecha, tema) for campo in agrupar)
+        grupos.setdefault(clave, []).append(fila)
+    return grupos
+
+
+@pytest.fixture(scope='module')
+def filas():
+    return _partidas(5000)
+
+
+@pytest.fixture(scope='module')
+def cache(filas):
+    cache = CacheAnalitica(almacen=AlmacenFalso(filas))
+    cache.actualizar(forzar=True)
+    return cache
+
+
+@pytest.mark.parametrize('agrupar', [
+    [], ['tema'], ['dia'], ['semana'], ['mes'],
+    ['tema', 'semana'], ['mes', 'tema'], ['semana', 'mes', 'tema'],
+])
+@pytest.mark.parametrize('filtro', [
+    {},
+    {'desde': '2024-03-01', 'hasta': '2024-09-15'},
+    {'temas': ['SQL', 'Git', 'Desconocido']},
+])
+def test_consultar_igual_que_ingenua(cache, filas, agrupar, filtro):
+    resultado = cache.consultar(agrupar=agrupar, percentiles=PERCENTILES, **filtro)
+    esperado = _ingenua(filas, agrupar, **filtro)
+
+    assert resultado['partidas'] == sum(len(g) for g in esperado.values())
+    obtenido = {tuple(grupo[campo] for campo in agrupar): grupo for grupo in resultado['grupos']}
+    assert obtenido.keys() == esperado.keys()
+    for clave, partidas in esperado.items():
+        grupo = obtenido[clave]
+        porcentajes = [fila[5] for fila in partidas]
+        assert grupo['partidas'] == len(partidas)
+        assert grupo['correctas'] == sum(fila[3] for fila in partidas)
+        assert grupo['preguntas'] == sum(fila[4] for fila in partidas)
+        assert grupo['media'] == pytest.approx(np.mean(porcentajes), abs=0.006)
+        for q in PERCENTILES:
+            assert grupo[f'p{q}'] == pytest.approx(np.percentile(porcentajes, q), abs=0.006)
+
+
+def test_grupos_por_orden_de_clave(cache):
+    grupos = cache.consultar(agrupar=['semana', 'tema'])['grupos']
+    claves = [(g['semana'], g['tema']) for g in grupos]
+    # Las semanas en orden; dentro de cada una, los temas por orden de llegada
+    assert [s for s, _ in claves] == sorted(s for s, _ in claves)
+    assert len(set(claves)) == len(claves)
+
+
+def test_semana_empieza_en_lunes():
+    filas = [(1, '2024-12-29 23:59:59', 'SQL', 1, 1, 100.0),     # domingo
+             (2, '2024-12-30 00:00:00', 'SQL', 0, 1, 0.0),       # lunes
+             (3, '2025-01-05 12:00:00', 'SQL', 1, 2, 50.0)]      # domingo
+    cache = CacheAnalitica(almacen=AlmacenFalso(filas))
+    grupos = cache.consultar(agrupar=['semana'])['grupos']
+    assert [(g['semana'], g['partidas']) for g in grupos] == [('2024-12-23', 1), ('2024-12-30', 2)]
+
+
+def test_partidas_nuevas_y_recortadas(filas):
+    almacen = AlmacenFalso(list(filas[:1000]))
+    cache = CacheAnalitica(almacen=almacen)
+    cache.actualizar(forzar=True)
+    assert len(cache) == 1000
+
+    almacen.filas = list(filas)
+    cache.actualizar(forzar=True)
+    assert len(cache) == len(filas)
+
+    # Retención: se borran las más antiguas de la tabla
+    corte = sorted(fila[1] for fila in filas)[len(filas) // 2]
+    almacen.filas = [fila for fila in filas if fila[1] >= corte]
+    cache.actualizar(forzar=True)
+    assert cache.consultar()['partidas'] == len(almacen.filas)
+
+
+@pytest.mark.parametrize('semilla', range(5))
+def test_numerar_directo_igual_que_unique(semilla):
+    rng = np.random.default_rng(semilla)
+    posibles = int(rng.integers(1, 5000))
+    combinada = rng.integers(0, posibles, size=int(rng.integers(1, 20_000)))
+
+    directo = _numerar(combinada, posibles)
+    # Por encima de MAX_CLAVES_DIRECTAS se usa np.unique
+    ordenado = _numerar(combinada, analitica.MAX_CLAVES_DIRECTAS + 1)
+    for a, b in zip(directo, ordenado):
+        np.testing.assert_array_equal(a, b)
+
+    unicas, grupo, cuentas = directo
+    np.testing.assert_array_equal(unicas[grupo], combinada)
+    assert cuentas.sum() == len(combinada)
+
+
+def test_claves_combinadas_grandes():
+    """Muchos días x temas: la clave combinada pasa de MAX_CLAVES_DIRECTAS."""
+    filas = []
+    inicio = datetime(2000, 1, 1)
+    for i in range(1, 3001):
+        fecha = inicio + timedelta(days=7 * i, hours=i % 24)
+        filas.append((i, fecha.strftime('%Y-%m-%d %H:%M:%S'), f'tema{i % 1500}', 1, 2, 50.0))
+    cache = CacheAnalitica(almacen=AlmacenFalso(filas))
+    agrupar = ['dia', 'tema']
+    resultado = cache.consultar(agrupar=agrupar)
+    esperado = _ingenua(filas, agrupar)
+    assert {(g['dia'], g['tema']): g['partidas'] for g in resultado['grupos']} == \
+        {clave: len(partidas) for clave, partidas in esperado.items()}
+
+
+def test_agrupacion_no_valida(cache):
+    with pytest.raises(ValueError):
+        cache.consultar(agrupar=['hora'])
+    with pytest.raises(ValueError):
+        cache.consultar(agrupar=['tema', 'tema'])
+    with pytest.raises(ValueError):
+        cache.consultar(percentiles=[101])
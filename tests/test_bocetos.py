@@ -0,0 +1,126 @@
+"""
+test_bocetos.py - Histogramas de puntuación: fusión e importación
+=================================================================
+
+Los rangos percentiles se comparan con contar las partidas una a una, y la
+importación entre nodos debe poder repetirse sin contar nada dos veces.
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import random
+
+import pytest
+
+from bocetos import BocetosPuntuacion, Histograma, exportar, importar, sumar
+from database import init_db
+
+
+def _rango_ingenuo(porcentajes, porcentaje):
+    """Porcentaje de partidas con menos aciertos (redondeando a enteros)."""
+    if not porcentajes:
+        return None
+    menores = sum(round(p) < round(porcentaje) for p in porcentajes)
+    return menores / len(porcentajes) * 100
+
+
+@pytest.fixture
+def base(tmp_path):
+    def crear(nombre):
+        ruta = tmp_path / f'{nombre}.db'
+        init_db(ruta)
+        return ruta
+    return crear
+
+
+@pytest.mark.parametrize('semilla', range(4))
+def test_fusionar_igual_que_contar(semilla):
+    rng = random.Random(semilla)
+    trozos = [[rng.uniform(0, 100) for _ in range(rng.randint(0, 200))] for _ in range(5)]
+    fusionado = Histograma()
+    for trozo in trozos:
+        histograma = Histograma()
+        for porcentaje in trozo:
+            histograma.anadir(porcentaje)
+        fusionado.fusionar(histograma)
+
+    todos = [p for trozo in trozos for p in trozo]
+    assert fusionado.total == len(todos)
+    for porcentaje in (0, 0.4, 12.5, 50, 77.7, 99.6, 100):
+        assert fusionado.rango_percentil(porcentaje) == pytest.approx(_rango_ingenuo(todos, porcentaje))
+
+
+def test_histograma_vacio():
+    assert Histograma().rango_percentil(50) is None
+
+
+def test_registrar_rango_antes_de_contar(base):
+    bocetos = BocetosPuntuacion(nodo='a', ruta=base('a'))
+    assert bocetos.registrar('SQL', 50) is None
+    assert bocetos.registrar('SQL', 80) == 100.0
+    assert bocetos.registrar('SQL', 10) == 0.0
+    assert bocetos.rango_percentil('SQL', 60) == pytest.approx(200 / 3)
+    assert bocetos.rango_percentil('Git', 60) is None
+
+
+def test_guardar_y_releer(base):
+    ruta = base('a')
+    bocetos = BocetosPuntuacion(nodo='a', ruta=ruta)
+    for porcentaje in (10, 20, 30):
+        bocetos.registrar('SQL', porcentaje)
+    bocetos.guardar()
+    # Otro proceso del mismo nodo lee lo guardado
+    otro = BocetosPuntuacion(nodo='a', ruta=ruta)
+    assert otro.rango_percentil('SQL', 25) == pytest.approx(200 / 3)
+    # Guardar otra vez sin nada pendiente no suma nada
+    bocetos.guardar()
+    assert sum(fila['conteos'][20] for fila in exportar('a', ruta)) == 1
+
+
+def test_sumar_acumula(base):
+    ruta = base('a')
+    histograma = Histograma()
+    histograma.anadir(40)
+    sumar('a', [('2025-01-01', 'SQL', histograma)], ruta)
+    sumar('a', [('2025-01-01', 'SQL', histograma)], ruta)
+    [fila] = exportar('a', ruta)
+    assert fila['conteos'][40] == 2
+
+
+def test_importar_idempotente(base):
+    ruta_a, ruta_b = base('a'), base('b')
+    a = BocetosPuntuacion(nodo='a', ruta=ruta_a)
+    b = BocetosPuntuacion(nodo='b', ruta=ruta_b)
+    for porcentaje in (10, 30, 50):
+        a.registrar('SQL', porcentaje)
+    for porcentaje in (20, 40):
+        b.registrar('SQL', porcentaje)
+    a.guardar()
+    b.guardar()
+
+    filas_a = exportar('a', ruta_a)
+    assert importar(filas_a, nodo='b', ruta=ruta_b) == 1
+    assert importar(filas_a, nodo='b', ruta=ruta_b) == 0      # Repetir no cambia nada
+    assert exportar('a', ruta_b) == filas_a
+    # Las filas propias nunca se importan (ni las de b exportadas hacia b)
+    assert importar(exportar('b', ruta_b), nodo='b', ruta=ruta_b) == 0
+
+    b.guardar()
+    # b ve los dos nodos: 5 partidas; con 35 quedan por debajo 10, 20 y 30
+    assert b.rango_percentil('SQL', 35) == pytest.approx(60.0)
+
+
+def test_importar_antiguo_no_pisa(base):
+    ruta_a, ruta_b = base('a'), base('b')
+    a = BocetosPuntuacion(nodo='a', ruta=ruta_a)
+    a.registrar('SQL', 10)
+    a.guardar()
+    antiguas = exportar('a', ruta_a)
+    a.registrar('SQL', 90)
+    a.guardar()
+    recientes = exportar('a', ruta_a)
+
+    assert importar(recientes, nodo='b', ruta=ruta_b) == 1
+    assert importar(antiguas, nodo='b', ruta=ruta_b) == 0
+    assert exportar('a', ruta_b) == recientes
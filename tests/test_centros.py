@@ -0,0 +1,101 @@
+"""
+test_centros.py - LRU de centros abiertos y barrido de inactivos
+================================================================
+
+El orden de los centros abiertos se compara con un LRU ingenuo (una
+lista que se reordena en cada acceso).
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import random
+import time
+
+import pytest
+
+from centros import Centros
+
+NOMBRES = ['norte', 'sur', 'este', 'oeste', 'centro']
+
+
+@pytest.fixture
+def centros(tmp_path):
+    centros = Centros(directorio=tmp_path, max_abiertos=3, inactividad=3600)
+    for nombre in NOMBRES:
+        centros.crear(nombre)
+    yield centros
+    centros.cerrar_todos()
+
+
+@pytest.mark.parametrize('semilla', range(3))
+def test_lru_igual_que_ingenuo(centros, semilla):
+    rng = random.Random(semilla)
+    lru = []                # Del menos al más recientemente usado
+    expulsados = 0
+    vistos = {}             # nombre -> último almacén devuelto
+    for _ in range(200):
+        nombre = rng.choice(NOMBRES)
+        almacen = centros.abrir(nombre)
+        assert almacen.centro == nombre
+        if nombre in lru:
+            lru.remove(nombre)
+            assert almacen is vistos[nombre]        # Reutilizado, no reabierto
+        elif nombre in vistos:
+            assert almacen is not vistos[nombre]
+            assert vistos[nombre]._cerrado          # El expulsado se cerró
+        lru.append(nombre)
+        if len(lru) > centros.max_abiertos:
+            lru.pop(0)
+            expulsados += 1
+        vistos[nombre] = almacen
+        assert list(centros._abiertos) == lru
+    assert centros.contadores()['expulsados'] == expulsados
+
+
+def test_centro_desconocido(centros):
+    assert centros.abrir('inexistente') is None
+    assert centros.contadores()['desconocidos'] == 1
+    with pytest.raises(ValueError):
+        centros.abrir('../quiz')
+
+
+def test_barrer_inactivos(tmp_path):
+    centros = Centros(directorio=tmp_path, max_abiertos=10, inactividad=3600)
+    for nombre in NOMBRES[:3]:
+        centros.crear(nombre)
+    try:
+        norte, sur, este = (centros.abrir(nombre) for nombre in NOMBRES[:3])
+        assert centros.barrer() == 0
+        # Norte y sur llevan "una hora" sin uso; este se acaba de usar
+        ahora = time.monotonic()
+        norte.usado = sur.usado = ahora - 3601
+        assert centros.barrer() == 2
+        assert norte._cerrado and sur._cerrado and not este._cerrado
+        assert list(centros._abiertos) == ['este']
+        assert centros.contadores()['inactivos'] == 2
+        # Volver a pedir un centro barrido lo abre de nuevo
+        assert centros.abrir('norte') is not norte
+    finally:
+        centros.cerrar_todos()
+
+
+def test_barrido_en_segundo_plano(tmp_path):
+    centros = Centros(directorio=tmp_path, inactividad=0.2)
+    centros.crear('norte')
+    try:
+        almacen = centros.abrir('norte')      # Arranca el hilo de barrido
+        fin = time.monotonic() + 3
+        while not almacen._cerrado and time.monotonic() < fin:
+            time.sleep(0.02)
+        assert almacen._cerrado
+        assert centros.contadores()['abiertos'] == 0
+    finally:
+        centros.cerrar_todos()
+
+
+def test_cerrar_todos(centros):
+    abiertos = [centros.abrir(nombre) for nombre in NOMBRES[:3]]
+    centros.cerrar_todos()
+    assert all(almacen._cerrado for almacen in abiertos)
+    assert centros.contadores()['abiertos'] == 0
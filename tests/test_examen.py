@@ -0,0 +1,167 @@
+"""
+test_examen.py - Corrección de exámenes contra un cálculo ingenuo
+=================================================================
+
+calificar() se compara con las fórmulas escritas hoja a hoja y pregunta a
+pregunta (correlación de Pearson, KR-20 con varianza poblacional).
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import json
+import math
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from examen import OPCIONES, SIN_RESPONDER, calificar, leer_hojas
+
+
+def _pearson(xs, ys):
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    sxx = sum((x - mx) ** 2 for x in xs)
+    syy = sum((y - my) ** 2 for y in ys)
+    if sxx == 0 or syy == 0:
+        return None
+    return sxy / math.sqrt(sxx * syy)
+
+
+def _ingenua(clave, hojas):
+    k = len(clave)
+    aciertos = [[int(hoja[j] == clave[j]) for j in range(k)] for hoja in hojas]
+    correctas = [sum(fila) for fila in aciertos]
+    n = len(hojas)
+    media = sum(correctas) / n
+    varianza = sum((c - media) ** 2 for c in correctas) / n
+    p = [sum(fila[j] for fila in aciertos) / n for j in range(k)]
+    kr20 = None
+    if k > 1 and varianza > 0:
+        kr20 = k / (k - 1) * (1 - sum(pj * (1 - pj) for pj in p) / varianza)
+    items = []
+    for j in range(k):
+        x = [fila[j] for fila in aciertos]
+        resto = [c - xj for c, xj in zip(correctas, x)]
+        items.append({
+            'acierto': p[j],
+            'discriminacion': _pearson(x, resto),
+            'opciones': {o: sum(hoja[j] == o for hoja in hojas) for o in OPCIONES},
+            'sin_responder': sum(hoja[j] == SIN_RESPONDER for hoja in hojas),
+        })
+    return correctas, media, kr20, items
+
+
+def _hojas(n, clave, rng):
+    """Hojas donde los alumnos 'buenos' aciertan más (para que haya discriminación)."""
+    hojas = []
+    for _ in range(n):
+        nivel = rng.random()
+        hoja = ''.join(
+            c if rng.random() < nivel else rng.choice(OPCIONES + SIN_RESPONDER)
+            for c in clave)
+        hojas.append(hoja)
+    return hojas
+
+
+@pytest.mark.parametrize('semilla', range(6))
+def test_calificar_igual_que_ingenua(semilla):
+    rng = random.Random(semilla)
+    k = rng.randint(2, 25)
+    clave = ''.join(rng.choice(OPCIONES) for _ in range(k))
+    hojas = _hojas(rng.randint(2, 300), clave, rng)
+
+    resultado = calificar(clave, hojas)
+    correctas, media, kr20, items = _ingenua(clave, hojas)
+
+    assert resultado['correctas'].tolist() == correctas
+    assert resultado['media'] == pytest.approx(media)
+    if kr20 is None:
+        assert resultado['kr20'] is None
+    else:
+        assert resultado['kr20'] == pytest.approx(kr20)
+    for j, (obtenido, esperado) in enumerate(zip(resultado['items'], items)):
+        assert obtenido['numero'] == j + 1
+        assert obtenido['correcta'] == clave[j]
+        assert obtenido['acierto'] == pytest.approx(esperado['acierto'], abs=5e-5)
+        if esperado['discriminacion'] is None:
+            assert obtenido['discriminacion'] is None
+        else:
+            assert obtenido['discriminacion'] == pytest.approx(esperado['discriminacion'], abs=5e-5)
+        assert obtenido['opciones'] == esperado['opciones']
+        assert obtenido['sin_responder'] == esperado['sin_responder']
+
+
+def test_calificar_sin_varianza():
+    # Todos aciertan lo mismo: ni KR-20 ni discriminación tienen sentido
+    resultado = calificar('abc', ['abc', 'abc', 'abc'])
+    assert resultado['kr20'] is None
+    assert all(item['discriminacion'] is None for item in resultado['items'])
+    assert resultado['media'] == 3
+
+
+def test_calificar_una_pregunta():
+    resultado = calificar('a', ['a', 'b', '-'])
+    assert resultado['kr20'] is None        # k = 1
+    assert resultado['correctas'].tolist() == [1, 0, 0]
+    assert resultado['items'][0]['sin_responder'] == 1
+
+
+# =============================================================================
+# LECTURA DE LAS HOJAS
+# =============================================================================
+
+def test_leer_csv():
+    texto = ('alumno,respuestas\n'
+             'ana,BAC-B\n'
+             '\n'
+             'luis,b,a,c,,b\n'
+             'eva, bac \n'
+             'sin,bac\n'
+             ',bacab\n'
+             'mal,bacxb\n')
+    hojas, rechazadas = leer_hojas(texto, 'csv', 5)
+    assert hojas == [('ana', 'bac-b'), ('luis', 'bac-b'), ('eva', '-bac-')]
+    assert rechazadas == [
+        {'linea': 6, 'motivo': '3 respuestas (el examen tiene 5)'},
+        {'linea': 7, 'motivo': 'alumno no válido'},
+        {'linea': 8, 'motivo': 'respuesta que no es a, b, c ni -'},
+    ]
+
+
+def test_leer_csv_sin_cabecera():
+    hojas, rechazadas = leer_hojas('ana,ab\nalumno,ba\n', 'csv', 2)
+    # 'alumno' solo es cabecera en la primera línea
+    assert hojas == [('ana', 'ab'), ('alumno', 'ba')]
+    assert rechazadas == []
+
+
+def test_leer_ndjson():
+    lineas = [
+        json.dumps({'alumno': 'ana', 'respuestas': 'bac-b'}),
+        json.dumps({'alumno': ' luis ', 'respuestas': ['B', 'a', None, '', 'c']}),
+        '',
+        '{"alumno": "eva", ',
+        json.dumps(['ana', 'bac-b']),
+        json.dumps({'alumno': 'sin'}),
+        json.dumps({'alumno': 'num', 'respuestas': ['a', 1, 'b', 'c', 'a']}),
+    ]
+    hojas, rechazadas = leer_hojas('\n'.join(lineas), 'ndjson', 5)
+    assert hojas == [('ana', 'bac-b'), ('luis', 'ba--c')]
+    assert rechazadas == [
+        {'linea': 4, 'motivo': 'JSON no válido'},
+        {'linea': 5, 'motivo': 'se esperaba un objeto'},
+        {'linea': 6, 'motivo': 'faltan las respuestas'},
+        {'linea': 7, 'motivo': 'respuesta que no es a, b, c ni -'},
+    ]
+
+
+def test_leer_y_calificar():
+    """Lo que sale de leer_hojas() es lo que espera calificar()."""
+    texto = 'ana,abc\nluis,a-c\neva,cba\n'
+    hojas, _ = leer_hojas(texto, 'csv', 3)
+    resultado = calificar('abc', [hoja for _, hoja in hojas])
+    assert resultado['correctas'].tolist() == [3, 2, 1]
@@ -0,0 +1,296 @@
+"""
+trazas.py - Trazas de peticiones con "spans" muestreados
+========================================================
+
+Cuando una llamada a /api/responder va lenta no sabemos dónde se fue el
+tiempo: ¿leyendo la cookie de sesión?, ¿en SQL?, ¿convirtiendo a JSON?
+
+Este módulo cronometra las partes de cada petición ("spans") y escribe
+una línea JSON por petición (formato NDJSON) en un archivo local.
+
+¿QUÉ SE MIDE?
+-------------
+- sesion.cargar     Leer y verificar la cookie de sesión
+- sql               Cada consulta ejecutada con get_db() / get_db_lectura()
+- json              Convertir la respuesta a JSON (jsonify)
+- sesion.guardar    Firmar y escribir la cookie de sesión
+- Cualquier bloque marcado a mano con `with span('nombre'):`
+
+¿QUÉ PETICIONES SE ESCRIBEN?
+----------------------------
+Escribirlas todas sería caro, así que se MUESTREAN:
+  - Una fracción aleatoria (QUIZ_TRAZAS_MUESTREO, por defecto 1%)
+  - SIEMPRE las que tardan más de QUIZ_TRAZAS_UMBRAL_MS (por defecto 500 ms)
+
+Para poder escribir siempre las lentas, los spans se apuntan en TODAS las
+peticiones (solo es añadir una tupla a una lista) y al terminar se decide
+si se escriben o no.
+
+¿POR QUÉ UNA COLA?
+------------------
+Escribir en disco dentro de la petición la haría más lenta. La petición
+solo deja el registro en una cola en memoria (QueueHandler) y un hilo
+aparte (QueueListener) lo escribe en el archivo.
+
+CÓMO ACTIVARLO:
+---------------
+    QUIZ_TRAZAS=trazas.ndjson uv run python app.py
+
+Ejemplo de línea (formateada):
+    {"traza": "9f1c...", "metodo": "POST", "ruta": "/api/responder",
+     "estado": 200, "duracion_ms": 612.4, "motivo": "lenta",
+     "spans": [{"nombre": "sesion.cargar", "inicio_ms": 0.0, "duracion_ms": 0.4},
+               {"nombre": "sql", "inicio_ms": 1.1, "duracion_ms": 580.2,
+                "sql": "INSERT INTO estadisticas ..."}, ...]}
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+from flask.sessions import SecureCookieSessionInterface
+
+import database
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+MUESTREO_POR_DEFECTO = 0.01
+UMBRAL_MS_POR_DEFECTO = 500.0
+
+# Longitud máxima del texto SQL que se guarda en cada span
+MAX_SQL = 200
+
+_logger = logging.getLogger('quiz.trazas')
+_logger.propagate = False        # No mezclar con los logs normales
+_escuchador = None               # QueueListener que escribe en el archivo
+_manejador = None                # QueueHandler del logger (la entrada de la cola)
+_config = {'muestreo': MUESTREO_POR_DEFECTO, 'umbral_ms': UMBRAL_MS_POR_DEFECTO}
+
+
+# =============================================================================
+# TRAZA DE LA PETICIÓN ACTUAL
+# =============================================================================
+
+class Traza:
+    """Spans de una petición. Se guarda en flask.g mientras dura la petición."""
+
+    __slots__ = ('id', 'inicio', 'spans', 'estado', 'en_sesion')
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.inicio = time.perf_counter()
+        self.spans = []       # Tuplas (nombre, inicio, duracion, atributos)
+        self.estado = None
+        # La cookie de sesión también se (de)serializa con app.json: mientras
+        # estamos dentro de sesion.cargar/guardar no apuntamos spans 'json'
+        self.en_sesion = False
+
+    def apuntar(self, nombre, inicio, duracion, atributos=None):
+        self.spans.append((nombre, inicio, duracion, atributos))
+
+    def a_dict(self, duracion, motivo):
+        spans = []
+        for nombre, inicio, dur, atributos in self.spans:
+            span_dict = {
+                'nombre': nombre,
+                'inicio_ms': round((inicio - self.inicio) * 1000, 3),
+                'duracion_ms': round(dur * 1000, 3),
+            }
+            if atributos:
+                span_dict.update(atributos)
+            spans.append(span_dict)
+        return {
+            'traza': self.id,
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': self.estado,
+            'duracion_ms': round(duracion * 1000, 3),
+            'motivo': motivo,
+            'spans': spans,
+        }
+
+
+def _traza_actual(crear=False):
+    """Devuelve la traza de la petición en curso (o None fuera de peticiones)."""
+    if _escuchador is None or not has_app_context():
+        return None
+    traza = g.get('_traza')
+    if traza is None and crear:
+        traza = g._traza = Traza()
+    return traza
+
+
+@contextmanager
+def span(nombre, **atributos):
+    """
+    Cronometra un bloque de código dentro de la traza de la petición.
+
+    Ejemplo:
+        with span('mazo.elegir', tema=tema):
+            preguntas = elegir_preguntas(...)
+    """
+    traza = _traza_actual()
+    if traza is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza.apuntar(nombre, inicio, time.perf_counter() - inicio, atributos)
+
+
+# =============================================================================
+# PUNTOS DE MEDIDA
+# =============================================================================
+
+def _observar_sql(sql, inicio, duracion):
+    """Observador para database.observadores_sql."""
+    traza = _traza_actual()
+    if traza is not None:
+        texto = ' '.join(sql.split())[:MAX_SQL]
+        traza.apuntar('sql', inicio, duracion, {'sql': texto})
+
+
+class SesionTrazada(SecureCookieSessionInterface):
+    """La sesión de cookie de siempre, cronometrando carga y guardado."""
+
+    def open_session(self, app, request):
+        # Es lo primero que ocurre en la petición: aquí empieza la traza
+        traza = _traza_actual(crear=True)
+        if traza is None:
+            return super().open_session(app, request)
+        inicio = time.perf_counter()
+        traza.en_sesion = True
+        try:
+            return super().open_session(app, request)
+        finally:
+            traza.en_sesion = False
+            traza.apuntar('sesion.cargar', inicio, time.perf_counter() - inicio)
+
+    def save_session(self, app, session, response):
+        traza = _traza_actual()
+        if traza is None:
+            return super().save_session(app, session, response)
+        inicio = time.perf_counter()
+        traza.en_sesion = True
+        try:
+            return super().save_session(app, session, response)
+        finally:
+            traza.en_sesion = False
+            traza.apuntar('sesion.guardar', inicio, time.perf_counter() - inicio)
+
+
+class JSONTrazado(DefaultJSONProvider):
+    """El conversor JSON de Flask de siempre, cronometrando cada dumps()."""
+
+    def dumps(self, obj, **kwargs):
+        traza = _traza_actual()
+        if traza is None or traza.en_sesion:
+            return super().dumps(obj, **kwargs)
+        with span('json'):
+            return super().dumps(obj, **kwargs)
+
+
+def _anotar_estado(response):
+    """after_request: guarda el código de estado para el registro final."""
+    traza = _traza_actual()
+    if traza is not None:
+        traza.estado = response.status_code
+    return response
+
+
+def _cerrar_traza(_error=None):
+    """
+    teardown_request: decide si la traza se escribe y la manda a la cola.
+
+    Se ejecuta al final del todo, después de guardar la sesión.
+    """
+    traza = _traza_actual()
+    if traza is None:
+        return
+    duracion = time.perf_counter() - traza.inicio
+    if duracion * 1000 >= _config['umbral_ms']:
+        motivo = 'lenta'
+    elif random.random() < _config['muestreo']:
+        motivo = 'muestreo'
+    else:
+        return
+    _logger.info(json.dumps(traza.a_dict(duracion, motivo), ensure_ascii=False))
+
+
+# =============================================================================
+# INSTALACIÓN
+# =============================================================================
+
+def instalar(app, ruta, muestreo=MUESTREO_POR_DEFECTO, umbral_ms=UMBRAL_MS_POR_DEFECTO):
+    """
+    Activa las trazas en una aplicación Flask.
+
+    Debe llamarse antes de atender la primera petición.
+
+    Args:
+        app (Flask): La aplicación
+        ruta (str): Archivo NDJSON donde se escriben las trazas
+        muestreo (float): Fracción de peticiones normales que se escriben (0-1)
+        umbral_ms (float): Las peticiones más lentas que esto se escriben siempre
+    """
+    global _escuchador, _manejador
+
+    _config['muestreo'] = muestreo
+    _config['umbral_ms'] = umbral_ms
+
+    if _escuchador is None:
+        cola = queue.SimpleQueue()
+        archivo = logging.FileHandler(ruta, encoding='utf-8')
+        archivo.setFormatter(logging.Formatter('%(message)s'))
+        _manejador = logging.handlers.QueueHandler(cola)
+        _logger.addHandler(_manejador)
+        _logger.setLevel(logging.INFO)
+        _escuchador = logging.handlers.QueueListener(cola, archivo)
+        _escuchador.start()
+        database.observadores_sql.append(_observar_sql)
+
+    app.session_interface = SesionTrazada()
+    app.json = JSONTrazado(app)
+    app.after_request(_anotar_estado)
+    app.teardown_request(_cerrar_traza)
+
+
+def tras_fork():
+    """
+    Vuelve a arrancar el hilo escritor en un proceso hijo.
+
+    Los hilos no sobreviven a fork(): un trabajador creado a partir del
+    proceso principal hereda la cola y el archivo, pero no el hilo que
+    los vacía. El servidor de producción (servidor.py) llama a esto en
+    cada trabajador recién creado.
+    """
+    global _escuchador
+    if _escuchador is not None:
+        _escuchador = logging.handlers.QueueListener(_escuchador.queue, *_escuchador.handlers)
+        _escuchador.start()
+
+
+def detener():
+    """Vacía la cola y detiene el hilo escritor (por ejemplo, al apagar)."""
+    global _escuchador, _manejador
+    if _escuchador is not None:
+        _logger.removeHandler(_manejador)
+        _escuchador.stop()
+        for manejador in _escuchador.handlers:
+            manejador.close()
+        _escuchador = _manejador = None
+        database.observadores_sql.remove(_observar_sql)
@@ -0,0 +1,174 @@
+"""
+vuelo_unico.py - Agrupar lecturas idénticas que llegan a la vez
+===============================================================
+
+Cuando una clase de 300 alumnos abre la página al mismo tiempo, la
+portada, /api/temas y /api/estadisticas ejecutan LA MISMA consulta 300
+veces a la vez. Todas devuelven lo mismo.
+
+"Vuelo único" (single-flight) significa: si llega una petición para una
+lectura que YA se está haciendo, no lanzamos otra consulta; esperamos a
+que termine la que está "en vuelo" y compartimos su resultado.
+
+    Sin vuelo único:                Con vuelo único:
+    petición 1 ──► consulta         petición 1 ──► consulta ──┐
+    petición 2 ──► consulta         petición 2 ──► espera ────┤ mismo
+    petición 3 ──► consulta         petición 3 ──► espera ────┘ resultado
+
+OPCIONAL: "stale-while-revalidate"
+----------------------------------
+Con ventana_obsoleta > 0, un resultado que acaba de calcularse se sigue
+sirviendo durante unos segundos aunque esté un poco "viejo", y mientras
+tanto UNA sola consulta en segundo plano lo refresca. Las peticiones no
+esperan nunca a la base de datos dentro de esa ventana.
+
+    edad <= fresco                          -> se devuelve tal cual
+    fresco < edad <= fresco + ventana       -> se devuelve y se refresca detrás
+    edad > fresco + ventana (o no hay)      -> vuelo único normal
+
+¡OJO! El resultado se comparte entre peticiones: no hay que modificarlo.
+
+Quien escribe datos que cambian una lectura la invalida con invalidar(clave):
+la siguiente llamada consulta otra vez (y una consulta que ya estaba en
+vuelo no se guarda, porque pudo leer lo de antes). Como mucho se guardan
+max_guardados claves; al pasarse se olvida la guardada hace más tiempo.
+
+CÓMO USARLO:
+------------
+    lecturas = VueloUnico()
+    temas = lecturas.ejecutar('temas', leer_temas)   # leer_temas() sin argumentos
+    lecturas.invalidar('temas')                      # Tras cambiar los temas
+    lecturas.contadores()   # {'llamadas': ..., 'agrupadas': ..., ...}
+
+Autor: Profesor de SAA
+Fecha: 2025
+"""
+
+import threading
+import time
+
+MAX_GUARDADOS = 1024     # Claves con resultado guardado (una o dos por centro)
+
+
+class _Vuelo:
+    """Una consulta en curso: los que esperan se quedan en `terminado`."""
+
+    __slots__ = ('terminado', 'resultado', 'error', 'invalidado')
+
+    def __init__(self):
+        self.terminado = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.invalidado = False      # invalidar() durante el vuelo: no se guarda
+
+
+class VueloUnico:
+    """
+    Ejecuta funciones de lectura agrupando las llamadas concurrentes
+    con la misma clave.
+
+    Args:
+        fresco (float): Segundos durante los que un resultado se considera
+            actual y se devuelve sin más (0 = no se guarda)
+        ventana_obsoleta (float): Segundos adicionales durante los que se
+            sirve el resultado viejo mientras se refresca en segundo plano
+        max_guardados (int): Claves con resultado guardado como mucho
+    """
+
+    def __init__(self, fresco=0.0, ventana_obsoleta=0.0, max_guardados=MAX_GUARDADOS):
+        self.fresco = fresco
+        self.ventana_obsoleta = ventana_obsoleta
+        self.max_guardados = max_guardados
+        self._cerrojo = threading.Lock()
+        self._en_vuelo = {}      # clave -> _Vuelo
+        self._resultados = {}    # clave -> (instante, resultado), del más viejo al más nuevo
+        self._contadores = {
+            'llamadas': 0,         # Total de llamadas a ejecutar()
+            'consultas': 0,        # Veces que se ejecutó de verdad la función
+            'agrupadas': 0,        # Llamadas que esperaron a un vuelo ajeno
+            'servidas_cache': 0,   # Llamadas servidas con un resultado guardado
+            'revalidaciones': 0,   # Refrescos lanzados en segundo plano
+            'errores': 0,
+        }
+
+    def ejecutar(self, clave, funcion):
+        """
+        Devuelve funcion(), compartiendo la ejecución con otras llamadas
+        simultáneas que usen la misma clave.
+
+        Si funcion() lanza una excepción, la reciben todas las llamadas
+        que estaban esperando ese vuelo.
+        """
+        with self._cerrojo:
+            self._contadores['llamadas'] += 1
+
+            guardado = self._resultados.get(clave)
+            if guardado is not None:
+                edad = time.monotonic() - guardado[0]
+                if edad <= self.fresco + self.ventana_obsoleta:
+                    self._contadores['servidas_cache'] += 1
+                    if edad > self.fresco and clave not in self._en_vuelo:
+                        self._contadores['revalidaciones'] += 1
+                        vuelo = self._en_vuelo[clave] = _Vuelo()
+                        threading.Thread(
+                            target=self._volar, args=(clave, vuelo, funcion), daemon=True
+                        ).start()
+                    return guardado[1]
+
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+            else:
+                self._contadores['agrupadas'] += 1
+
+        if lider:
+            self._volar(clave, vuelo, funcion)
+        else:
+            vuelo.terminado.wait()
+
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    def _volar(self, clave, vuelo, funcion):
+        """Ejecuta la función de verdad y despierta a los que esperan."""
+        try:
+            vuelo.resultado = funcion()
+        except Exception as error:
+            vuelo.error = error
+        with self._cerrojo:
+            self._contadores['consultas'] += 1
+            if vuelo.error is None:
+                if (self.fresco or self.ventana_obsoleta) and not vuelo.invalidado:
+                    # Al final del dict: el primero es siempre el más viejo
+                    self._resultados.pop(clave, None)
+                    self._resultados[clave] = (time.monotonic(), vuelo.resultado)
+                    while len(self._resultados) > self.max_guardados:
+                        del self._resultados[next(iter(self._resultados))]
+            else:
+                self._contadores['errores'] += 1
+            del self._en_vuelo[clave]
+        vuelo.terminado.set()
+
+    def invalidar(self, clave=None):
+        """Olvida el resultado guardado de una clave (o de todas)."""
+        with self._cerrojo:
+            if clave is None:
+                self._resultados.clear()
+                vuelos = self._en_vuelo.values()
+            else:
+                self._resultados.pop(clave, None)
+                vuelos = [self._en_vuelo[clave]] if clave in self._en_vuelo else []
+            for vuelo in vuelos:
+                vuelo.invalidado = True
+
+    def guardados(self):
+        """Copia de los resultados guardados: {clave: (instante, resultado)}."""
+        with self._cerrojo:
+            return dict(self._resultados)
+
+    def contadores(self):
+        """Devuelve una copia de los contadores."""
+        with self._cerrojo:
+            return dict(self._contadores)